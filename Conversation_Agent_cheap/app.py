@@ -1,14 +1,32 @@
 # voice_assistant/main.py
 
+import asyncio
 import logging
 import time
 from colorama import Fore, init
-from voice_assistant.audio import record_audio, play_audio
+from voice_assistant.audio import record_audio, record_audio_buffer, play_audio
+from voice_assistant.audio_formats import CONTAINER_FORMATS, negotiate_speech_format
 from voice_assistant.transcription import transcribe_audio
+from voice_assistant.vad import record_utterance
+from voice_assistant.barge_in import BargeInMonitor
+from voice_assistant.tracing import get_tracer
 from voice_assistant.response_generation import generate_response
-from voice_assistant.text_to_speech import text_to_speech
+from voice_assistant.text_to_speech import text_to_speech, synthesize_speech
+from voice_assistant.pipeline import run_streaming_turn, speak_text
+from voice_assistant.async_pipeline import run_voice_loop_async
 from voice_assistant.utils import delete_file
 from voice_assistant.config import Config
+from voice_assistant.clients import get_client_stats, close_clients
+from voice_assistant.hedging import hedged_transcribe, get_hedge_stats
+from voice_assistant.speculation import SpeculativeResponder, get_speculation_stats
+from voice_assistant.chat_history import ChatHistory
+from voice_assistant.knowledge_base import answer_locally
+from voice_assistant.prompts import SYSTEM_PROMPT
+from voice_assistant.local_llm import get_generation_speed_stats
+from voice_assistant.prewarm import prewarm_in_background, get_prewarm_stats
+from voice_assistant.parallel_tts import get_rate_limit_stats
+from voice_assistant.providers import resolve_auto_providers
+from voice_assistant.resilience import ProviderUnavailableError, backoff_delay, get_resilience_stats
 from voice_assistant.api_key_manager import get_transcription_api_key, get_response_api_key, get_tts_api_key
 
 # Configure logging
@@ -19,77 +37,69 @@ init(autoreset=True)
 
 import threading
 
-SYSTEM_PROMPT = """## Objective
-You are Rafa, a helpful and polite voice assistant for Dubai Constructions Company. You assist users by answering their questions about inventory, equipment, safety gear, and spare parts.
-
-## Knowledge Base
-Inventory Overview:
-- Raw Materials:
-  - Cement (OPC 53 Grade): 12,000 bags in stock; reorder level at 3,000 bags.
-  - Steel Rebars (TMT Fe500): 820 tons in stock; reorder level at 200 tons.
-  - River Sand: 2,500 m³ in stock.
-  - Aggregates (20mm): 3,200 m³ in stock.
-  - Ready Mix Concrete (M25): 400 m³ in stock.
-
-- Construction Equipment:
-  - Tower Crane (TC-90): 4 units (3 active, 1 under maintenance).
-  - Concrete Mixer (500L): 8 units (6 active, 2 idle).
-  - Excavator (CAT 320D): 5 units (all active).
-  - Vibrator (Needle): 20 units (18 active, 2 damaged).
-
-- Tools & Consumables:
-  - Binding Wire: 1,500 kg from Emirates Metals (next restock due: 25-Apr-2025).
-  - Nails (4 inch): 75,000 pieces from Al Noor Hardware.
-  - Cutting Blades: 250 pieces from Sharjah Tools Co.
-  - Sealant (Polyurethane): 400 liters.
-
-- Safety Gear:
-  - Safety Helmets: 500 units (380 currently in use); expiry: Dec-2026.
-  - Reflective Vests: 600 units (400 in use).
-  - Safety Boots: 450 pairs (370 in use).
-  - Gloves (Nitrile): 5,000 units.
-
-- Spare Parts:
-  - Hydraulic Pump: 3 units available for Excavators.
-  - Mixer Belt: Available for Concrete Mixers.
-
-## Purchase or Special Requests
-For purchase inquiries or special inventory requests, please redirect the user to contact:
-
-**Inventory Manager:** Fahad Al Marzouqi  
-**Email:** fahad.m@dubaiconstructions.ae  
-**Phone:** +971-4-234-5678  
-**Location:** Warehouse 3, Industrial Area 15, Dubai
-
-## Response Style
-- Always answer factually and politely.
-- If a user asks something outside the known information, respond with: "I currently don't have that information."
-- Be warm and professional in tone, reflecting the Dubai Constructions Company brand.
-"""
-
 
 def main():
     """
     Main function to run the voice assistant.
     """
-    chat_history = [
-        {"role": "system", "content": SYSTEM_PROMPT}
-    ]
+    # Keeps the system prompt as a stable prefix and summarizes older turns to stay within a token budget
+    chat_history = ChatHistory(SYSTEM_PROMPT, Config.RESPONSE_MODEL, get_response_api_key())
+    barge_in_enabled = Config.BARGE_IN and Config.VAD_ENDPOINTING and Config.PERSISTENT_AUDIO_OUTPUT
+    speculation_enabled = Config.SPECULATIVE_RESPONSE and Config.VAD_ENDPOINTING and Config.STREAMING_PIPELINE
+    speculator = None
+    # Speech captured by barge-in detection that the next recording should continue from
+    pending_endpointer = None
+    tracer = get_tracer()
+    # Unexpected errors in a row, for backing off the loop
+    consecutive_errors = 0
+    if Config.PREWARM:
+        # Import the SDKs, open connections and load local models while the first utterance is recorded
+        prewarm_in_background(SYSTEM_PROMPT)
 
     while True:
         try:
-            # Record audio from the microphone and save it as 'test.wav'
-            record_audio(Config.INPUT_AUDIO)
+            trace = tracer.start_turn()
+            trace.mark("record_start")
+            if Config.VAD_ENDPOINTING:
+                if speculation_enabled:
+                    # Start generating the reply during pauses, before the utterance is over
+                    speculator = SpeculativeResponder(chat_history.messages(), Config.TRANSCRIPTION_MODEL,
+                                                      get_transcription_api_key(), Config.RESPONSE_MODEL,
+                                                      get_response_api_key(), Config.LOCAL_MODEL_PATH)
+                # Capture the next utterance from the always-open microphone, ending as soon as speech stops
+                input_audio = record_utterance(endpointer=pending_endpointer,
+                                               on_pause=speculator.on_pause if speculator else None)
+                pending_endpointer = None
+                if input_audio is None:
+                    if speculator is not None:
+                        speculator.cancel()
+                    continue
+            elif Config.IN_MEMORY_AUDIO:
+                # Record audio from the microphone into an in-memory WAV buffer
+                input_audio = record_audio_buffer()
+                if input_audio is None:
+                    continue
+            else:
+                # Record audio from the microphone and save it to Config.INPUT_AUDIO
+                record_audio(Config.INPUT_AUDIO)
+                input_audio = Config.INPUT_AUDIO
+            trace.mark("record_end")
 
             # Get the API key for transcription
             transcription_api_key = get_transcription_api_key()
             
-            # Transcribe the audio file
-            user_input = transcribe_audio(Config.TRANSCRIPTION_MODEL, transcription_api_key, Config.INPUT_AUDIO, Config.LOCAL_MODEL_PATH)
+            # Transcribe the audio
+            with trace.span("stt"):
+                if Config.HEDGING:
+                    user_input = hedged_transcribe(input_audio, Config.LOCAL_MODEL_PATH, trace)
+                else:
+                    user_input = transcribe_audio(Config.TRANSCRIPTION_MODEL, transcription_api_key, input_audio, Config.LOCAL_MODEL_PATH)
 
             # Check if the transcription is empty and restart the recording if it is. This check will avoid empty requests if vad_filter is used in the fastwhisperapi.
             if not user_input:
                 logging.info("No transcription was returned. Starting recording again.")
+                if speculator is not None:
+                    speculator.cancel()
                 continue
             logging.info(Fore.GREEN + "You said: " + user_input + Fore.RESET)
 
@@ -98,43 +108,108 @@ def main():
                 break
 
             # Append the user's input to the chat history
-            chat_history.append({"role": "user", "content": user_input})
+            chat_history.add_user(user_input)
 
             # Get the API key for response generation
             response_api_key = get_response_api_key()
 
-            # Generate a response
-            response_text = generate_response(Config.RESPONSE_MODEL, response_api_key, chat_history, Config.LOCAL_MODEL_PATH)
-            logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
-
-            # Append the assistant's response to the chat history
-            chat_history.append({"role": "assistant", "content": response_text})
-
-            # Determine the output file format based on the TTS model
-            if Config.TTS_MODEL == 'openai' or Config.TTS_MODEL == 'elevenlabs' or Config.TTS_MODEL == 'melotts' or Config.TTS_MODEL == 'cartesia':
-                output_file = 'output.mp3'
+            # Answer direct inventory lookups from the local knowledge base without the LLM round trip
+            local_answer = answer_locally(user_input) if Config.LOCAL_KNOWLEDGE_BASE else None
+            if local_answer is not None:
+                trace.providers["RESPONSE_MODEL"] = "knowledge_base"
+                if speculator is not None:
+                    speculator.cancel()
+
+            if Config.STREAMING_PIPELINE:
+                # Generate, synthesize and play the response sentence by sentence
+                barge_in = BargeInMonitor() if barge_in_enabled else None
+                if local_answer is not None:
+                    deltas = iter([local_answer])
+                else:
+                    # Speak the reply speculated during the user's pauses if it was for what they ended up saying
+                    deltas = speculator.resolve(user_input) if speculator is not None else None
+                response_text = run_streaming_turn(chat_history.messages(), Config.RESPONSE_MODEL, response_api_key,
+                                                   Config.TTS_MODEL, get_tts_api_key(), Config.LOCAL_MODEL_PATH,
+                                                   barge_in=barge_in, trace=trace, deltas=deltas)
+                if barge_in is not None and barge_in.triggered.is_set():
+                    pending_endpointer = barge_in.endpointer
+                logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
+                if response_text:
+                    chat_history.add_assistant(response_text)
             else:
-                output_file = 'output.wav'
-
-            # Get the API key for TTS
-            tts_api_key = get_tts_api_key()
-
-            # Convert the response text to speech and save it to the appropriate file
-            text_to_speech(Config.TTS_MODEL, tts_api_key, response_text, output_file, Config.LOCAL_MODEL_PATH)
-
-            # Play the generated speech audio
-            play_audio(output_file)
-            
-            # Clean up audio files
-            # delete_file(Config.INPUT_AUDIO)
-            # delete_file(output_file)
+                # Generate a response
+                with trace.span("llm"):
+                    response_text = local_answer or generate_response(Config.RESPONSE_MODEL, response_api_key, chat_history.messages(), Config.LOCAL_MODEL_PATH)
+                logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
+
+                # Append the assistant's response to the chat history
+                chat_history.add_assistant(response_text)
+
+                # Get the API key for TTS
+                tts_api_key = get_tts_api_key()
+
+                if Config.PARALLEL_TTS:
+                    # Synthesize the sentences concurrently and play each as soon as it and the ones before it are ready
+                    speak_text(response_text, Config.TTS_MODEL, tts_api_key, Config.LOCAL_MODEL_PATH, trace=trace)
+                elif Config.IN_MEMORY_AUDIO:
+                    # Synthesize the response and play it straight from memory
+                    with trace.span("tts"):
+                        response_audio = synthesize_speech(Config.TTS_MODEL, tts_api_key, response_text, Config.LOCAL_MODEL_PATH)
+                    with trace.span("playback"):
+                        play_audio(response_audio)
+                else:
+                    # Name the output file after the format text_to_speech will request from the TTS model
+                    output_file = f"output.{negotiate_speech_format(Config.TTS_MODEL, CONTAINER_FORMATS)}"
+
+                    # Convert the response text to speech and save it to the appropriate file
+                    with trace.span("tts"):
+                        text_to_speech(Config.TTS_MODEL, tts_api_key, response_text, output_file, Config.LOCAL_MODEL_PATH)
+
+                    # Play the generated speech audio
+                    with trace.span("playback"):
+                        play_audio(output_file)
+
+                    # Clean up audio files
+                    # delete_file(Config.INPUT_AUDIO)
+                    # delete_file(output_file)
+
+            tracer.finish_turn(trace)
+            consecutive_errors = 0
 
         except Exception as e:
-            logging.error(Fore.RED + f"An error occurred: {e}" + Fore.RESET)
-            delete_file(Config.INPUT_AUDIO)
+            if speculator is not None:
+                speculator.cancel()
+            if not (Config.IN_MEMORY_AUDIO or Config.VAD_ENDPOINTING):
+                delete_file(Config.INPUT_AUDIO)
             if 'output_file' in locals():
                 delete_file(output_file)
-            time.sleep(1)
+            if isinstance(e, ProviderUnavailableError):
+                # Already retried and failed over, and the open breakers make the next turn fail fast; just listen again
+                logging.error(Fore.RED + f"Turn failed: {e}" + Fore.RESET)
+                continue
+            logging.error(Fore.RED + f"An error occurred: {e}" + Fore.RESET)
+            # Back off on repeated errors (e.g. a missing microphone) instead of retrying in a tight loop
+            time.sleep(backoff_delay(consecutive_errors, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY))
+            consecutive_errors += 1
+
+    logging.info(f"Provider connection stats: {get_client_stats()}")
+    if Config.PREWARM:
+        logging.info(f"Pre-warm stats: {get_prewarm_stats()}")
+    if Config.PARALLEL_TTS:
+        logging.info(f"TTS rate limit stats: {get_rate_limit_stats()}")
+    if Config.RESILIENCE:
+        logging.info(f"Circuit breaker stats: {get_resilience_stats()}")
+    if Config.HEDGING:
+        logging.info(f"Hedging stats: {get_hedge_stats()}")
+    if speculation_enabled:
+        logging.info(f"Speculation stats: {get_speculation_stats()}")
+    if Config.RESPONSE_MODEL in ('local', 'ollama'):
+        logging.info(f"Generation speed: {get_generation_speed_stats()}")
+    close_clients()
 
 if __name__ == "__main__":
-    main()
+    resolve_auto_providers()
+    if Config.ASYNC_CORE:
+        asyncio.run(run_voice_loop_async(SYSTEM_PROMPT))
+    else:
+        main()
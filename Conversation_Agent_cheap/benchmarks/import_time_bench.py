@@ -0,0 +1,140 @@
+# benchmarks/import_time_bench.py
+
+"""
+Import-time benchmark for the voice assistant's startup.
+
+Imports each module in a fresh interpreter under `python -X importtime` and
+reports the median wall time, the slowest imports by self time, and any
+provider SDK (see voice_assistant/providers.py) that was imported eagerly;
+startup should pay for no SDK until a provider is loaded. It then measures
+what loading each installed provider's SDK costs on its own.
+
+Run from the Conversation_Agent_cheap directory:
+
+    python -m benchmarks.import_time_bench
+    python -m benchmarks.import_time_bench --modules app,gateway_server --runs 7 --json results.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from voice_assistant.providers import PROVIDERS
+
+DEFAULT_MODULES = [
+    "app",
+    "voice_assistant.transcription",
+    "voice_assistant.response_generation",
+    "voice_assistant.text_to_speech",
+    "voice_assistant.pipeline",
+    "voice_assistant.async_pipeline",
+]
+
+
+def measure_import(module, runs):
+    """
+    Import a module in fresh interpreters.
+
+    Args:
+    module (str): The module to import.
+    runs (int): Interpreters to start; the median is reported.
+
+    Returns:
+    dict: wall_ms (median), cumulative_ms and self_ms per imported module from the last run, or error.
+    """
+    wall_times = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True)
+        wall_times.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+            return {"module": module, "error": error}
+    timings = parse_importtime(result.stderr)
+    return {
+        "module": module,
+        "wall_ms": statistics.median(wall_times),
+        "cumulative_ms": timings.get(module, (0.0, 0.0))[1],
+        "timings": timings,
+    }
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into {module: (self_ms, cumulative_ms)}.
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return timings
+
+
+def provider_roots():
+    """
+    Return the top-level SDK module names of every provider, with the providers that use each.
+    """
+    roots = {}
+    for service, providers in PROVIDERS.items():
+        for name, provider in providers.items():
+            for module in provider.modules:
+                roots.setdefault(module.split(".")[0], []).append(f"{service}:{name}")
+    return roots
+
+
+def run(modules, runs, top):
+    roots = provider_roots()
+    results = {"modules": [], "providers": []}
+    print(f"{'module':<40} {'wall ms':>9} {'import ms':>10}  eager provider SDKs")
+    for module in modules:
+        result = measure_import(module, runs)
+        if "error" in result:
+            print(f"{module:<40} {'-':>9} {'-':>10}  error: {result['error']}")
+            results["modules"].append(result)
+            continue
+        timings = result.pop("timings")
+        eager = sorted(root for root in roots if root in timings)
+        slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        result["eager_provider_sdks"] = eager
+        result["slowest"] = [{"module": name, "self_ms": self_ms} for name, (self_ms, _) in slowest]
+        results["modules"].append(result)
+        print(f"{module:<40} {result['wall_ms']:>9.1f} {result['cumulative_ms']:>10.1f}  {', '.join(eager) or 'none'}")
+        for entry in result["slowest"]:
+            print(f"    {entry['module']:<48} {entry['self_ms']:>8.1f} ms self")
+
+    print(f"\n{'provider SDK':<40} {'wall ms':>9} {'import ms':>10}  used by")
+    for root, users in sorted(roots.items()):
+        result = measure_import(root, runs)
+        result["used_by"] = users
+        result.pop("timings", None)
+        results["providers"].append(result)
+        if "error" in result:
+            print(f"{root:<40} {'-':>9} {'-':>10}  {', '.join(users)} (not installed)")
+        else:
+            print(f"{root:<40} {result['wall_ms']:>9.1f} {result['cumulative_ms']:>10.1f}  {', '.join(users)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports listed per module")
+    parser.add_argument("--json", help="Write the results to this path")
+    args = parser.parse_args()
+
+    results = run([module for module in args.modules.split(",") if module], args.runs, args.top)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
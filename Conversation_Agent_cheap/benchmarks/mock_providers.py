@@ -0,0 +1,223 @@
+# benchmarks/mock_providers.py
+
+"""
+Local stand-in HTTP servers emulating the latency and streaming behaviour of the voice providers.
+
+One ThreadingHTTPServer answers every emulated API on its own port:
+
+- OpenAI / Groq: /v1/audio/transcriptions, /v1/chat/completions (JSON or SSE
+  streaming), /v1/audio/speech (chunked). Groq's /openai/v1/... paths are accepted too.
+- Ollama: /api/chat (NDJSON streaming).
+- FastWhisperAPI: /info, /v1/transcriptions.
+- MeloTTS: /generate-audio-bytes/, /generate-audio-stream/.
+- Piper: /synthesize/, /synthesize/stream.
+
+Latency is driven by a LatencyProfile per server, so several servers with
+different profiles can stand in for different providers in one run.
+"""
+
+import json
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TTS_SAMPLE_RATE = 22050
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Timing of one emulated provider, in seconds.
+
+    Attributes:
+        first_byte (float): Delay before any response bytes are sent.
+        stt_realtime_factor (float): Transcription time per second of input audio.
+        token_interval (float): Delay between streamed LLM tokens.
+        tts_chunk_interval (float): Delay between streamed TTS chunks.
+        tts_chars_per_chunk (int): Characters of text covered by each TTS chunk.
+    """
+    first_byte: float = 0.1
+    stt_realtime_factor: float = 0.05
+    token_interval: float = 0.01
+    tts_chunk_interval: float = 0.03
+    tts_chars_per_chunk: int = 20
+
+    def scaled(self, factor):
+        return LatencyProfile(self.first_byte * factor, self.stt_realtime_factor * factor,
+                              self.token_interval * factor, self.tts_chunk_interval * factor,
+                              self.tts_chars_per_chunk)
+
+
+def wav_header(data_size, sample_rate=TTS_SAMPLE_RATE):
+    return (b"RIFF" + struct.pack("<I", min(data_size + 36, 0xFFFFFFFF)) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+
+class MockProviderServer:
+    """
+    A mock provider server running in a background thread.
+
+    Transcripts are looked up by fingerprint: register each fixture's audio
+    with its transcript, and any upload containing that audio is answered
+    with the transcript.
+
+    Attributes:
+        profile (LatencyProfile): The emulated timing.
+        reply (str): The text every chat completion returns.
+        url (str): Base URL of the server, e.g. 'http://127.0.0.1:54321'.
+    """
+
+    def __init__(self, profile, reply):
+        self.profile = profile
+        self.reply = reply
+        self._transcripts = []
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def register_transcript(self, audio, transcript):
+        # Skip the 44-byte WAV header, which is identical across fixtures
+        self._transcripts.append((bytes(audio[44:108]), transcript))
+
+    def transcript_for(self, body):
+        for fingerprint, transcript in self._transcripts:
+            if fingerprint in body:
+                return transcript
+        return ""
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/info":
+            self._send_json({"status": "ok"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        body = self._body()
+        path = self.path.split("?")[0].rstrip("/")
+        profile = self.mock.profile
+        if path.endswith("/audio/transcriptions") or path.endswith("/v1/transcriptions"):
+            self._transcribe(body, profile)
+        elif path.endswith("/chat/completions"):
+            self._chat_completion(json.loads(body), profile)
+        elif path == "/api/chat":
+            self._ollama_chat(json.loads(body), profile)
+        elif path.endswith("/audio/speech"):
+            self._speech(json.loads(body)["input"], profile, wav=False)
+        elif path in ("/synthesize", "/generate-audio-bytes"):
+            self._speech(json.loads(body)["text"], profile, wav=True, stream=False)
+        elif path in ("/synthesize/stream", "/generate-audio-stream"):
+            self._speech(json.loads(body)["text"], profile, wav=True)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _transcribe(self, body, profile):
+        # Roughly 32 kB per second of 16 kHz PCM16 audio
+        audio_seconds = len(body) / 32000
+        time.sleep(profile.first_byte + audio_seconds * profile.stt_realtime_factor)
+        self._send_json({"text": self.mock.transcript_for(body)})
+
+    def _tokens(self):
+        words = self.mock.reply.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _chat_completion(self, request, profile):
+        time.sleep(profile.first_byte)
+        if not request.get("stream"):
+            time.sleep(profile.token_interval * len(self._tokens()))
+            self._send_json({
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.mock.reply}}],
+            })
+            return
+        self._start_chunked("text/event-stream")
+        for token in self._tokens():
+            chunk = {
+                "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": request["model"],
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(profile.token_interval)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _ollama_chat(self, request, profile):
+        time.sleep(profile.first_byte)
+        self._start_chunked("application/x-ndjson")
+        for token in self._tokens():
+            line = {"model": request["model"], "message": {"role": "assistant", "content": token}, "done": False}
+            self._write_chunk((json.dumps(line) + "\n").encode())
+            time.sleep(profile.token_interval)
+        done = {"model": request["model"], "message": {"role": "assistant", "content": ""}, "done": True}
+        self._write_chunk((json.dumps(done) + "\n").encode())
+        self._end_chunked()
+
+    def _speech(self, text, profile, wav, stream=True):
+        time.sleep(profile.first_byte)
+        chunk_count = max(1, len(text) // profile.tts_chars_per_chunk)
+        # About 70 ms of audio per character of text
+        chunk_bytes = int(len(text) * 0.07 * TTS_SAMPLE_RATE * 2 / chunk_count)
+        if not stream:
+            time.sleep(profile.tts_chunk_interval * chunk_count)
+            audio = bytes(chunk_bytes * chunk_count)
+            body = wav_header(len(audio)) + audio
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._start_chunked("audio/wav" if wav else "audio/mpeg")
+        if wav:
+            self._write_chunk(wav_header(0xFFFFFFFF - 36))
+        for _ in range(chunk_count):
+            self._write_chunk(bytes(chunk_bytes))
+            time.sleep(profile.tts_chunk_interval)
+        self._end_chunked()
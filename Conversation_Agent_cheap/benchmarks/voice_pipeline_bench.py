@@ -0,0 +1,341 @@
+# benchmarks/voice_pipeline_bench.py
+
+"""
+Offline benchmark of STT -> LLM -> TTS provider combinations.
+
+Replays a corpus of WAV utterances through transcribe_audio, stream_response
+and stream_speech against local mock providers (see mock_providers.py), so it
+runs headless with no network and no API keys. For each configuration it
+reports throughput, per-stage latency percentiles, time to first audio and
+the estimated provider cost per turn. Turns where a provider fails are counted
+separately and left out of the latency and cost figures.
+
+Run from the Conversation_Agent_cheap directory:
+
+    python -m benchmarks.voice_pipeline_bench
+    python -m benchmarks.voice_pipeline_bench --corpus path/to/wavs --concurrency 4 \\
+        --configs groq:groq:piper,openai:openai:openai --json results.json
+
+A corpus is a directory of .wav files with optional same-named .txt
+transcripts; without one, synthetic utterances are generated.
+"""
+
+import argparse
+import glob
+import io
+import json
+import logging
+import math
+import os
+import queue
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_providers import LatencyProfile, MockProviderServer
+
+# Providers the mock servers can stand in for, with a typical latency profile for each
+PROFILES = {
+    "openai": LatencyProfile(first_byte=0.35, stt_realtime_factor=0.08, token_interval=0.012, tts_chunk_interval=0.04),
+    "groq": LatencyProfile(first_byte=0.15, stt_realtime_factor=0.02, token_interval=0.004),
+    "ollama": LatencyProfile(first_byte=0.25, token_interval=0.03),
+    "fastwhisperapi": LatencyProfile(first_byte=0.05, stt_realtime_factor=0.15),
+    "melotts": LatencyProfile(first_byte=0.2, tts_chunk_interval=0.08),
+    "piper": LatencyProfile(first_byte=0.05, tts_chunk_interval=0.02),
+}
+
+DEFAULT_CONFIGS = [
+    ("groq", "groq", "piper"),
+    ("groq", "groq", "openai"),
+    ("openai", "openai", "openai"),
+    ("fastwhisperapi", "ollama", "melotts"),
+    ("fastwhisperapi", "groq", "piper"),
+]
+
+MOCK_REPLY = ("We currently have 12,000 bags of OPC 53 Grade cement in stock, and the reorder level is 3,000 bags. "
+              "If you need more, please contact our Inventory Manager, Fahad Al Marzouqi, at fahad.m@dubaiconstructions.ae. "
+              "Is there anything else I can help you with?")
+
+SYNTHETIC_TRANSCRIPTS = [
+    "How many bags of cement are in stock?",
+    "Which tower cranes are under maintenance?",
+    "Do we have hydraulic pumps for the excavators?",
+    "When is the next binding wire restock due?",
+    "Who do I contact to buy more safety helmets?",
+    "How many reflective vests are in use right now?",
+]
+
+STAGES_REPORTED = ("stt", "llm_ttft", "tts_ttfb", "time_to_first_audio", "turn")
+
+SAMPLE_RATE = 16000
+
+
+def load_system_prompt():
+    """
+    Return the assistant's system prompt, built from the inventory data like app.py's.
+    """
+    from voice_assistant.prompts import SYSTEM_PROMPT
+
+    return SYSTEM_PROMPT
+
+
+def synthetic_utterance(index):
+    """
+    Generate a deterministic 16 kHz PCM16 WAV of a few seconds of modulated tone.
+    """
+    seconds = 1.5 + (index % 4) * 0.75
+    frequency = 180 + index * 17
+    frames = bytearray()
+    for n in range(int(seconds * SAMPLE_RATE)):
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 3 * n / SAMPLE_RATE)
+        sample = int(8000 * envelope * math.sin(2 * math.pi * frequency * n / SAMPLE_RATE) + index)
+        frames += struct.pack("<h", max(-32768, min(32767, sample)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def load_corpus(corpus_dir, count):
+    """
+    Return a list of (wav bytes, transcript, audio seconds) fixtures.
+    """
+    fixtures = []
+    if corpus_dir:
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "*.wav"))):
+            with open(path, "rb") as f:
+                audio = f.read()
+            transcript_path = os.path.splitext(path)[0] + ".txt"
+            if os.path.exists(transcript_path):
+                with open(transcript_path) as f:
+                    transcript = f.read().strip()
+            else:
+                transcript = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+            with wave.open(io.BytesIO(audio)) as wav_file:
+                seconds = wav_file.getnframes() / wav_file.getframerate()
+            fixtures.append((audio, transcript, seconds))
+    else:
+        for index in range(count):
+            audio = synthetic_utterance(index)
+            fixtures.append((audio, SYNTHETIC_TRANSCRIPTS[index % len(SYNTHETIC_TRANSCRIPTS)],
+                             (len(audio) - 44) / (2 * SAMPLE_RATE)))
+    return fixtures
+
+
+def start_mock_servers(latency_scale):
+    servers = {
+        provider: MockProviderServer(profile.scaled(latency_scale), MOCK_REPLY).start()
+        for provider, profile in PROFILES.items()
+    }
+    return servers
+
+
+def point_config_at_mocks(servers):
+    """
+    Redirect every provider endpoint to its mock server. Must run before the voice_assistant stage modules are imported.
+    """
+    from voice_assistant.config import Config
+
+    Config.OPENAI_BASE_URL = f"{servers['openai'].url}/v1"
+    Config.GROQ_BASE_URL = servers["groq"].url
+    Config.FASTWHISPERAPI_URL = servers["fastwhisperapi"].url
+    Config.PIPER_SERVER_URL = servers["piper"].url
+    Config.TTS_PORT_LOCAL = int(servers["melotts"].url.rsplit(":", 1)[1])
+    # Measure the providers, not the cache or the failover backends
+    Config.TTS_CACHE = False
+    Config.RESILIENCE = False
+    # The ollama package reads its host when it is imported
+    os.environ["OLLAMA_HOST"] = servers["ollama"].url
+
+
+def estimate_cost(config, audio_seconds, prompt_chars, reply_chars):
+    from voice_assistant.hedging import llm_cost, stt_cost, tts_cost
+
+    stt, llm, tts = config
+    return {
+        "stt": stt_cost(stt, audio_seconds),
+        "llm": llm_cost(llm, prompt_chars, reply_chars),
+        "tts": tts_cost(tts, reply_chars),
+    }
+
+
+def run_turn(config, fixture, system_prompt, tracer):
+    """
+    Run one utterance through STT, streamed LLM and per-chunk streamed TTS, overlapping LLM and TTS as the pipeline does.
+
+    Audio is not played; the first TTS byte received stands in for playback start.
+
+    Returns:
+    dict: The turn's transcript, reply and audio sizes and cost, or {"error": ...} if a provider failed.
+    """
+    from voice_assistant.response_generation import stream_response_deltas
+    from voice_assistant.text_chunking import SentenceChunker
+    from voice_assistant.text_to_speech import stream_speech
+    from voice_assistant.transcription import transcribe_audio
+
+    stt, llm, tts = config
+    audio, _, audio_seconds = fixture
+    trace = tracer.start_turn()
+    trace.providers = {"TRANSCRIPTION_MODEL": stt, "RESPONSE_MODEL": llm, "TTS_MODEL": tts}
+    trace.mark("record_end")
+
+    buffer = io.BytesIO(audio)
+    buffer.name = "input.wav"
+    try:
+        with trace.span("stt"):
+            user_input = transcribe_audio(stt, "bench-key", buffer)
+    except Exception as e:
+        return {"error": f"stt: {e}"}
+    chat_history = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_input}]
+
+    chunks = queue.Queue()
+    audio_bytes = [0]
+    tts_errors = []
+
+    def synthesize_chunks():
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if tts_errors:
+                continue
+            trace.mark("tts_start")
+            try:
+                for audio_chunk in stream_speech(tts, "bench-key", chunk):
+                    trace.mark("tts_first_chunk")
+                    trace.mark("playback_start")
+                    audio_bytes[0] += len(audio_chunk)
+            except Exception as e:
+                tts_errors.append(f"tts: {e}")
+            trace.mark("tts_end")
+        trace.mark("playback_end")
+
+    tts_thread = threading.Thread(target=synthesize_chunks, daemon=True)
+    tts_thread.start()
+    chunker = SentenceChunker()
+    reply_parts = []
+    trace.mark("llm_start")
+    try:
+        # The raising variant, so a failed request isn't scored as a reply made of its error message
+        for delta in stream_response_deltas(llm, "bench-key", chat_history):
+            trace.mark("llm_first_token")
+            reply_parts.append(delta)
+            for chunk in chunker.feed(delta):
+                chunks.put(chunk)
+        for chunk in chunker.flush():
+            chunks.put(chunk)
+    except Exception as e:
+        return {"error": f"llm: {e}"}
+    finally:
+        trace.mark("llm_end")
+        chunks.put(None)
+        tts_thread.join()
+    if tts_errors:
+        return {"error": tts_errors[0]}
+
+    tracer.finish_turn(trace)
+    reply = "".join(reply_parts)
+    cost = estimate_cost(config, audio_seconds, len(system_prompt) + len(user_input), len(reply))
+    return {"transcript": user_input, "reply_chars": len(reply), "audio_bytes": audio_bytes[0], "cost": cost}
+
+
+def benchmark_config(config, fixtures, system_prompt, concurrency, repeats):
+    from voice_assistant.tracing import Tracer
+
+    tracer = Tracer(jsonl_path="", prometheus_path="")
+    work = [fixture for _ in range(repeats) for fixture in fixtures]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda fixture: run_turn(config, fixture, system_prompt, tracer), work))
+    elapsed = time.monotonic() - start
+    failures = [r["error"] for r in results if "error" in r]
+    for error in sorted(set(failures)):
+        logging.warning(f"{':'.join(config)}: {failures.count(error)} turn(s) failed: {error}")
+    results = [r for r in results if "error" not in r]
+
+    provider_for_stage = {"stt": config[0], "llm_ttft": config[1], "tts_ttfb": config[2]}
+    latencies = {
+        stage: {f"p{int(q * 100)}": seconds for q, seconds in
+                tracer.percentiles(stage, provider_for_stage.get(stage, "")).items()}
+        for stage in STAGES_REPORTED
+    }
+    turns = len(results)
+    cost = {stage: sum(r["cost"][stage] for r in results) / turns if turns else 0.0 for stage in ("stt", "llm", "tts")}
+    return {
+        "config": {"stt": config[0], "llm": config[1], "tts": config[2]},
+        "turns": turns,
+        "failures": len(failures),
+        "throughput_turns_per_second": turns / elapsed,
+        "latency_seconds": latencies,
+        "cost_per_turn_usd": dict(cost, total=sum(cost.values())),
+        "empty_transcripts": sum(1 for r in results if not r["transcript"]),
+    }
+
+
+def print_report(reports):
+    header = f"{'stt:llm:tts':<34}{'turns/s':>8}{'failed':>8}" + "".join(f"{stage + ' p50/p95':>26}" for stage in STAGES_REPORTED) + f"{'$/turn':>11}"
+    print(header)
+    print("-" * len(header))
+    for report in reports:
+        config = report["config"]
+        row = f"{config['stt'] + ':' + config['llm'] + ':' + config['tts']:<34}{report['throughput_turns_per_second']:>8.2f}{report['failures']:>8}"
+        for stage in STAGES_REPORTED:
+            latency = report["latency_seconds"][stage]
+            cell = f"{latency.get('p50', 0) * 1000:.0f}/{latency.get('p95', 0) * 1000:.0f} ms" if latency else "n/a"
+            row += f"{cell:>26}"
+        row += f"{report['cost_per_turn_usd']['total']:>11.5f}"
+        print(row)
+
+
+def parse_configs(value):
+    configs = []
+    for item in value.split(","):
+        parts = tuple(part.strip() for part in item.split(":"))
+        if len(parts) != 3:
+            raise argparse.ArgumentTypeError(f"Configuration '{item}' must be stt:llm:tts")
+        configs.append(parts)
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline voice pipeline benchmark against mock providers.")
+    parser.add_argument("--corpus", help="Directory of .wav utterances with optional .txt transcripts.")
+    parser.add_argument("--utterances", type=int, default=6, help="Synthetic utterances to generate without a corpus.")
+    parser.add_argument("--configs", type=parse_configs, default=DEFAULT_CONFIGS,
+                        help="Comma-separated stt:llm:tts provider combinations.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Turns run in parallel.")
+    parser.add_argument("--repeats", type=int, default=1, help="Times the corpus is replayed per configuration.")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for all emulated latencies.")
+    parser.add_argument("--json", help="Write the full results to this file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    servers = start_mock_servers(args.latency_scale)
+    point_config_at_mocks(servers)
+
+    fixtures = load_corpus(args.corpus, args.utterances)
+    for server in servers.values():
+        for audio, transcript, _ in fixtures:
+            server.register_transcript(audio, transcript)
+    system_prompt = load_system_prompt()
+
+    try:
+        reports = [benchmark_config(config, fixtures, system_prompt, args.concurrency, args.repeats)
+                   for config in args.configs]
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
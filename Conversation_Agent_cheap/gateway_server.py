@@ -0,0 +1,310 @@
+# gateway_server.py
+
+"""
+Multi-session WebSocket gateway for the voice assistant.
+
+Each client connects to /ws and streams its microphone as binary messages of
+PCM16 mono audio at Config.VAD_SAMPLE_RATE. The server endpoints each
+session's speech, runs transcription -> response -> TTS with the session's
+own chat history, and streams the reply back:
+
+    {"type": "transcript", "text": ...}          what the user said
+    {"type": "audio_start", "format": "opus"}    one per sentence, followed by
+    <binary audio chunks>                        that sentence's encoded audio
+    {"type": "response", "text": ...}            the full reply, after its audio
+    {"type": "error", "message": ...}
+
+The reply's format is negotiated per TTS model from the formats the client
+accepts, given as /ws?formats=opus,pcm&sample_rate=24000 (defaults:
+Config.GATEWAY_AUDIO_FORMATS and Config.GATEWAY_AUDIO_SAMPLE_RATE). 'pcm'
+arrives as e.g. "pcm_24000": raw PCM16 mono at that rate; 'opus' is Ogg/Opus.
+
+Clients may send {"type": "end_of_utterance"} to end an utterance themselves
+(e.g. push-to-talk) and {"type": "reset"} to clear the conversation.
+
+Run with: python gateway_server.py
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from voice_assistant.api_key_manager import get_response_api_key, get_transcription_api_key, get_tts_api_key
+from voice_assistant.async_pipeline import run_streaming_turn_async
+from voice_assistant.chat_history import ChatHistory
+from voice_assistant.clients import close_async_clients, get_client_stats
+from voice_assistant.config import Config
+from voice_assistant.knowledge_base import answer_locally
+from voice_assistant.local_llm import get_generation_speed_stats
+from voice_assistant.parallel_tts import get_rate_limit_stats
+from voice_assistant.prewarm import get_prewarm_stats, prewarm
+from voice_assistant.prompts import SYSTEM_PROMPT
+from voice_assistant.providers import resolve_auto_providers
+from voice_assistant.resilience import get_resilience_stats
+from voice_assistant.tracing import get_tracer
+from voice_assistant.transcription import transcribe_audio_async
+from voice_assistant.vad import Endpointer, VoiceActivityDetector, pcm_to_wav
+
+app = FastAPI()
+
+_session_ids = itertools.count(1)
+_sessions = {}
+# Turns running at once across all sessions; the rest wait their turn
+_turn_slots = asyncio.Semaphore(Config.GATEWAY_MAX_CONCURRENT_TURNS)
+_stats = {"sessions_rejected": 0, "turns": 0, "turns_waiting": 0, "utterances_dropped": 0}
+
+
+class WebSocketAudioSink:
+    """
+    Audio sink for run_streaming_turn_async that streams speech to the session's client.
+
+    Chunks go through the session's bounded outbound queue, so a client that
+    reads slowly holds up synthesis of its own reply and no one else's.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.accepted_formats = session.audio_formats
+        self.sample_rate = session.audio_sample_rate
+
+    async def play(self, speech_format, chunks):
+        await self.session.send({"type": "audio_start", "format": speech_format})
+        async for chunk in chunks:
+            await self.session.send(chunk)
+
+    async def finish(self, trace):
+        # Wait until the client has taken every queued message
+        await self.session.outbound.join()
+        if self.session.first_audio_sent_at is not None:
+            trace.mark("playback_start", self.session.first_audio_sent_at)
+        trace.mark("playback_end")
+
+
+class VoiceSession:
+    """
+    One connected client: its endpointer, chat history and outbound audio queue.
+
+    Attributes:
+        session_id (int): Sequence number of the session.
+        history (ChatHistory): The session's own conversation.
+        outbound (asyncio.Queue): Messages waiting to be sent to the client.
+    """
+
+    def __init__(self, session_id, websocket, audio_formats, audio_sample_rate):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.history = ChatHistory(SYSTEM_PROMPT, Config.RESPONSE_MODEL, get_response_api_key())
+        # Each session adapts its own noise floor
+        self.endpointer = Endpointer(VoiceActivityDetector(), Config.VAD_FRAME_MS)
+        self.frame_bytes = Config.VAD_SAMPLE_RATE * Config.VAD_FRAME_MS // 1000 * 2
+        self.utterances = asyncio.Queue(maxsize=Config.GATEWAY_MAX_PENDING_UTTERANCES)
+        self.outbound = asyncio.Queue(maxsize=Config.GATEWAY_SEND_QUEUE_SIZE)
+        self.first_audio_sent_at = None
+        self._pending_audio = b""
+        self.audio_formats = audio_formats
+        self.audio_sample_rate = audio_sample_rate
+
+    async def send(self, message):
+        """
+        Queue a JSON-serializable dict or a bytes chunk for the client, waiting while the queue is full.
+        """
+        await self.outbound.put(message)
+
+    async def sender(self):
+        """
+        Send queued messages to the client in order until the session ends.
+        """
+        while True:
+            message = await self.outbound.get()
+            try:
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                    if self.first_audio_sent_at is None:
+                        self.first_audio_sent_at = time.monotonic()
+                else:
+                    await self.websocket.send_text(json.dumps(message))
+            finally:
+                self.outbound.task_done()
+
+    async def handle_control(self, text):
+        """
+        Act on a JSON control message, answering malformed ones with an error frame.
+        """
+        try:
+            control = json.loads(text)
+        except ValueError:
+            control = None
+        if not isinstance(control, dict):
+            await self.send({"type": "error", "message": "Control messages must be JSON objects."})
+            return
+        if control.get("type") == "end_of_utterance":
+            self.end_utterance()
+        elif control.get("type") == "reset":
+            self.history = ChatHistory(SYSTEM_PROMPT, Config.RESPONSE_MODEL, get_response_api_key())
+
+    def feed_audio(self, data):
+        """
+        Split incoming PCM into VAD frames and queue each utterance the endpointer completes.
+        """
+        data = self._pending_audio + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending_audio = data[usable:]
+        for offset in range(0, usable, self.frame_bytes):
+            utterance = self.endpointer.process(data[offset:offset + self.frame_bytes])
+            if utterance is not None:
+                self.queue_utterance(utterance)
+
+    def end_utterance(self):
+        """
+        End the current utterance on the client's request, without waiting for silence.
+        """
+        if self.endpointer.in_speech:
+            utterance = self.endpointer.partial_utterance()
+            self.endpointer.reset()
+            self.queue_utterance(utterance)
+
+    def queue_utterance(self, pcm):
+        try:
+            self.utterances.put_nowait(pcm)
+        except asyncio.QueueFull:
+            # The user is talking faster than replies are produced; keep the backlog bounded
+            _stats["utterances_dropped"] += 1
+            logging.warning(f"Session {self.session_id}: dropping an utterance, too many are pending")
+
+    async def turn_worker(self):
+        while True:
+            pcm = await self.utterances.get()
+            _stats["turns_waiting"] += 1
+            try:
+                async with _turn_slots:
+                    _stats["turns_waiting"] -= 1
+                    await self.run_turn(pcm)
+            except Exception as e:
+                logging.error(f"Session {self.session_id}: turn failed: {e}")
+                await self.send({"type": "error", "message": "Sorry, something went wrong with that request."})
+
+    async def run_turn(self, pcm):
+        tracer = get_tracer()
+        trace = tracer.start_turn()
+        trace.mark("record_end")
+        self.first_audio_sent_at = None
+        with trace.span("stt"):
+            user_input = await transcribe_audio_async(Config.TRANSCRIPTION_MODEL, get_transcription_api_key(),
+                                                      pcm_to_wav(pcm, Config.VAD_SAMPLE_RATE), Config.LOCAL_MODEL_PATH)
+        if not user_input:
+            return
+        await self.send({"type": "transcript", "text": user_input})
+
+        self.history.add_user(user_input)
+        local_answer = answer_locally(user_input) if Config.LOCAL_KNOWLEDGE_BASE else None
+        deltas = None
+        if local_answer is not None:
+            trace.providers["RESPONSE_MODEL"] = "knowledge_base"
+            deltas = _single_delta(local_answer)
+        response_text = await run_streaming_turn_async(
+            self.history.messages(), Config.RESPONSE_MODEL, get_response_api_key(), Config.TTS_MODEL,
+            get_tts_api_key(), Config.LOCAL_MODEL_PATH, audio_sink=WebSocketAudioSink(self), trace=trace,
+            deltas=deltas
+        )
+        if response_text:
+            self.history.add_assistant(response_text)
+        await self.send({"type": "response", "text": response_text})
+        _stats["turns"] += 1
+        tracer.finish_turn(trace)
+
+
+async def _single_delta(text):
+    yield text
+
+
+def _audio_params(websocket):
+    """
+    Read the reply formats and PCM sample rate the client asked for in its query string.
+
+    Returns:
+        tuple: (formats, sample_rate).
+
+    Raises:
+        ValueError: If sample_rate is not a positive integer.
+    """
+    formats = websocket.query_params.get("formats")
+    sample_rate = int(websocket.query_params.get("sample_rate") or Config.GATEWAY_AUDIO_SAMPLE_RATE)
+    if sample_rate <= 0:
+        raise ValueError(f"sample_rate must be positive, got {sample_rate}")
+    return (formats.split(",") if formats else Config.GATEWAY_AUDIO_FORMATS), sample_rate
+
+
+@app.websocket("/ws")
+async def voice_session(websocket: WebSocket):
+    if len(_sessions) >= Config.GATEWAY_MAX_SESSIONS:
+        _stats["sessions_rejected"] += 1
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+    try:
+        audio_formats, audio_sample_rate = _audio_params(websocket)
+    except ValueError as e:
+        logging.warning(f"Rejecting session: {e}")
+        # 1008: policy violation, the request itself is invalid
+        await websocket.close(code=1008, reason="invalid sample_rate")
+        return
+    await websocket.accept()
+    session = VoiceSession(next(_session_ids), websocket, audio_formats, audio_sample_rate)
+    _sessions[session.session_id] = session
+    logging.info(f"Session {session.session_id} connected ({len(_sessions)} active)")
+    tasks = [asyncio.create_task(session.sender()), asyncio.create_task(session.turn_worker())]
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                session.feed_audio(message["bytes"])
+            elif message.get("text"):
+                await session.handle_control(message["text"])
+    except WebSocketDisconnect as e:
+        logging.info(f"Session {session.session_id} ended: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let the turn release its slot and providers before the session is dropped
+        await asyncio.gather(*tasks, return_exceptions=True)
+        del _sessions[session.session_id]
+        logging.info(f"Session {session.session_id} disconnected ({len(_sessions)} active)")
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "active_sessions": len(_sessions),
+        "max_sessions": Config.GATEWAY_MAX_SESSIONS,
+        "max_concurrent_turns": Config.GATEWAY_MAX_CONCURRENT_TURNS,
+        "pending_utterances": sum(session.utterances.qsize() for session in _sessions.values()),
+        **_stats,
+        "providers": get_client_stats(),
+        "generation_speed": get_generation_speed_stats(),
+        "prewarm": get_prewarm_stats(),
+        "tts_rate_limits": get_rate_limit_stats(),
+        "resilience": get_resilience_stats(),
+    }
+
+
+@app.on_event("startup")
+async def warm_up():
+    resolve_auto_providers()
+    if Config.PREWARM:
+        # Accept sessions only once the providers are ready
+        await asyncio.to_thread(prewarm, SYSTEM_PROMPT)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_async_clients()
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=Config.GATEWAY_PORT)
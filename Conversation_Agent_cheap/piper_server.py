@@ -1,46 +1,301 @@
+import json
+import logging
+import os
+import queue
+import selectors
+import struct
 import subprocess
+import threading
+import time
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from fastapi.responses import FileResponse
-import os
+from fastapi.responses import Response, StreamingResponse
 
 app = FastAPI()
 
+PIPER_EXECUTABLE = os.getenv("PIPER_EXECUTABLE", "./piper/piper")  #path to the piper binary
+MODEL_PATH = os.getenv("PIPER_MODEL_PATH", "en_US-lessac-medium.onnx")  #path to the .onnx file
+POOL_SIZE = int(os.getenv("PIPER_POOL_SIZE", "2"))  #number of persistent piper processes
+MAX_QUEUE = int(os.getenv("PIPER_MAX_QUEUE", "16"))  #requests allowed to wait for a free process
+SYNTHESIS_TIMEOUT = float(os.getenv("PIPER_TIMEOUT", "30"))  #seconds without output before a process is considered hung
+
+# Piper logs this to stderr once it has written all audio for a line to stdout
+UTTERANCE_DONE_MARKER = b"Real-time factor"
+
 
 class SynthesisRequest(BaseModel):
     text: str
 
+
+def read_sample_rate(model_path):
+    """Read the output sample rate from the model's .onnx.json config."""
+    try:
+        with open(f"{model_path}.json") as f:
+            return json.load(f)["audio"]["sample_rate"]
+    except (OSError, KeyError, ValueError):
+        return 22050
+
+
+class PiperWorker:
+    """
+    A persistent piper process with the model loaded once.
+
+    Each request is written to stdin as one line; piper streams the raw PCM16
+    audio to stdout (--output-raw) and then logs its real-time factor to
+    stderr, which marks the end of that utterance.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [PIPER_EXECUTABLE, "--model", MODEL_PATH, "--output-raw"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+        )
+        self._stdout = self.process.stdout.fileno()
+        self._stderr = self.process.stderr.fileno()
+        os.set_blocking(self._stdout, False)
+        os.set_blocking(self._stderr, False)
+        self._stderr_buffer = b""
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def synthesize(self, text):
+        """
+        Synthesize one utterance, yielding raw PCM16 chunks as piper produces them.
+
+        The generator must be consumed to the end; abandoning it leaves audio in
+        the pipe, so callers must discard the worker in that case.
+        """
+        line = " ".join(text.split()) + "\n"
+        self.process.stdin.write(line.encode())
+        self.process.stdin.flush()
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._stdout, selectors.EVENT_READ)
+            selector.register(self._stderr, selectors.EVENT_READ)
+            while True:
+                events = selector.select(timeout=SYNTHESIS_TIMEOUT)
+                if not events:
+                    raise TimeoutError("Piper produced no output before the timeout")
+                for key, _ in events:
+                    if key.fd == self._stdout:
+                        data = os.read(self._stdout, 65536)
+                        if not data:
+                            raise RuntimeError("Piper process exited")
+                        yield data
+                    else:
+                        data = os.read(self._stderr, 4096)
+                        if not data:
+                            raise RuntimeError("Piper process exited")
+                        self._stderr_buffer += data
+                        if self._utterance_done():
+                            # All audio was written before the marker was logged, so whatever
+                            # remains in the stdout pipe completes this utterance
+                            yield from self._drain_stdout()
+                            return
+
+    def _utterance_done(self):
+        *lines, self._stderr_buffer = self._stderr_buffer.split(b"\n")
+        return any(UTTERANCE_DONE_MARKER in line for line in lines)
+
+    def _drain_stdout(self):
+        while True:
+            try:
+                data = os.read(self._stdout, 65536)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class PiperPool:
+    """
+    Fixed-size pool of PiperWorker processes with a bounded wait queue.
+    """
+
+    def __init__(self, size, max_queue):
+        self.size = size
+        self.max_queue = max_queue
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.stats = {"served": 0, "failed": 0, "rejected": 0, "restarts": 0, "restart_failures": 0,
+                      "max_queue_depth": 0, "wait_seconds": 0.0}
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        worker = PiperWorker()
+        # Load the model and run the first inference before any request arrives
+        for _ in worker.synthesize("Warming up."):
+            pass
+        return worker
+
+    def _replace_worker(self):
+        """
+        Start a worker for a slot whose process died.
+
+        Returns:
+            PiperWorker or None: The new worker, or None if it could not be started. None goes back into
+            the pool as a placeholder, so the slot is retried by the next acquire instead of being lost.
+        """
+        with self._lock:
+            self.stats["restarts"] += 1
+        try:
+            return self._start_worker()
+        except Exception as e:
+            logging.error(f"Failed to restart a Piper worker: {e}")
+            with self._lock:
+                self.stats["restart_failures"] += 1
+            return None
+
+    def check_capacity(self):
+        """Raise a 503 if the wait queue is full; acquire does this too, but only once it is called."""
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise HTTPException(status_code=503, detail="Piper queue is full")
+
+    def acquire(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise HTTPException(status_code=503, detail="Piper queue is full")
+            self._waiting += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._waiting)
+        start = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=SYNTHESIS_TIMEOUT)
+        except queue.Empty:
+            raise HTTPException(status_code=503, detail="No Piper worker became available")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                self.stats["wait_seconds"] += time.monotonic() - start
+        if worker is None:
+            worker = self._replace_worker()
+            if worker is None:
+                self._idle.put(None)
+                raise HTTPException(status_code=503, detail="Piper worker could not be started")
+        return worker
+
+    def release(self, worker, healthy):
+        with self._lock:
+            self.stats["served" if healthy else "failed"] += 1
+        if not healthy or not worker.is_alive():
+            worker.close()
+            worker = self._replace_worker()
+        self._idle.put(worker)
+
+    def run(self, worker, text):
+        """
+        Synthesize text on an acquired worker, yielding raw PCM16 chunks and releasing the worker when done.
+        """
+        healthy = False
+        try:
+            yield from worker.synthesize(text)
+            healthy = True
+        finally:
+            self.release(worker, healthy)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self.stats)
+            metrics.update({
+                "pool_size": self.size,
+                "idle_workers": self._idle.qsize(),
+                "queue_depth": self._waiting,
+                "max_queue": self.max_queue,
+            })
+        return metrics
+
+
+pool = None
+sample_rate = read_sample_rate(MODEL_PATH)
+
+
+def get_pool():
+    if pool is None:
+        raise HTTPException(status_code=500, detail="Piper worker pool is not running; check the server logs.")
+    return pool
+
+
+def check_text(text):
+    # Piper would get a bare newline and produce nothing until the timeout
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text to synthesize is empty.")
+
+
+def wav_header(data_size=0xFFFFFFFF):
+    """WAV header for PCM16 mono audio; the default sizes describe a stream of unknown length."""
+    riff_size = 0xFFFFFFFF if data_size == 0xFFFFFFFF else data_size + 36
+    return (b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+
+@app.on_event("startup")
+def start_pool():
+    global pool
+    if not os.path.isfile(PIPER_EXECUTABLE) or not os.access(PIPER_EXECUTABLE, os.X_OK):
+        logging.error("Piper binary not found or not executable!")
+        return
+    if not os.path.exists(MODEL_PATH):
+        logging.error("Piper model file not found!")
+        return
+    pool = PiperPool(POOL_SIZE, MAX_QUEUE)
+    logging.info(f"Started {POOL_SIZE} Piper workers")
+
+
 @app.post("/synthesize/")
 def synthesize(request: SynthesisRequest):
-    output_file = "output.wav"
-    piper_executable = "./piper/piper"  #path to the piper binary 
-    model_path = "en_US-lessac-medium.onnx" #path to the .onnx file
+    check_text(request.text)
+    worker_pool = get_pool()
+    worker = worker_pool.acquire()
+    try:
+        pcm = b"".join(worker_pool.run(worker, request.text))
+    except (TimeoutError, RuntimeError) as e:
+        raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {e}")
+    if not pcm:
+        raise HTTPException(status_code=500, detail="Piper did not generate any audio.")
+    return Response(content=wav_header(len(pcm)) + pcm, media_type="audio/wav")
 
-    
-    if not os.path.isfile(piper_executable) or not os.access(piper_executable, os.X_OK):
-        raise HTTPException(status_code=500, detail="Piper binary not found or not executable!")
 
-    
-    if not os.path.exists(model_path):
-        raise HTTPException(status_code=500, detail="Piper model file not found!")
+@app.post("/synthesize/stream")
+def synthesize_stream(request: SynthesisRequest):
+    check_text(request.text)
+    # Check before responding so a full queue still gets a proper 503
+    worker_pool = get_pool()
+    worker_pool.check_capacity()
 
+    def stream():
+        # The worker is acquired and released inside the body, so a client that disconnects
+        # before the body starts never holds one
+        worker = worker_pool.acquire()
+        # Abandoning the stream mid-utterance leaves audio in the pipe, so only then is the worker replaced
+        healthy = True
+        try:
+            yield wav_header()
+            healthy = False
+            yield from worker.synthesize(request.text)
+            healthy = True
+        except (TimeoutError, RuntimeError) as e:
+            logging.error(f"Speech synthesis failed mid-stream: {e}")
+        finally:
+            worker_pool.release(worker, healthy)
 
-    command = [piper_executable, "--model", model_path, "--output_file", output_file]
+    return StreamingResponse(stream(), media_type="audio/wav")
 
-    try:
-        
-        process = subprocess.run(command, input=request.text.encode(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-
-        
-        if os.path.exists(output_file):
-            return FileResponse(output_file, media_type="audio/wav")
-        else:
-            raise HTTPException(status_code=500, detail="Piper did not generate an audio file.")
-    
-    except subprocess.CalledProcessError as e:
-        error_message = e.stderr.decode() if e.stderr else "Unknown error"
-        raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {error_message}")
+
+@app.get("/metrics")
+def metrics():
+    return get_pool().metrics()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,47 @@
+# tests/test_chat_history.py
+
+import pytest
+
+from voice_assistant.chat_history import ChatHistory
+from voice_assistant.config import Config
+
+# About 25 tokens per message
+LONG = "x" * 100
+
+
+@pytest.fixture(autouse=True)
+def small_budget(monkeypatch):
+    monkeypatch.setattr(Config, "HISTORY_MAX_TOKENS", 200)
+    monkeypatch.setattr(Config, "HISTORY_COMPACT_TO", 0.5)
+    monkeypatch.setattr(Config, "HISTORY_MIN_RECENT_TURNS", 2)
+    # Fold by dropping, so compaction happens synchronously
+    monkeypatch.setattr(Config, "HISTORY_SUMMARIZE", False)
+
+
+def _roles(history):
+    return [message["role"] for message in history.turns]
+
+
+def test_prefix_is_stable_and_old_exchanges_are_folded():
+    history = ChatHistory("You are Rafa.")
+    for _ in range(10):
+        history.add_user(LONG)
+        history.add_assistant(LONG)
+    assert history.messages()[0] == {"role": "system", "content": "You are Rafa."}
+    assert history.token_count() <= Config.HISTORY_MAX_TOKENS
+    assert _roles(history) == ["user", "assistant"] * 2
+
+
+def test_folding_respects_turns_without_a_reply():
+    history = ChatHistory("You are Rafa.")
+    # A barge-in or failed turn leaves a user message without an assistant reply
+    history.add_user(f"{LONG} interrupted question")
+    for index in range(8):
+        history.add_user(f"{LONG} question {index}")
+        history.add_assistant(LONG)
+        assert history.turns[0]["role"] == "user"
+        # Every kept assistant reply still follows the question it answers
+        for previous, message in zip(history.turns, history.turns[1:]):
+            if message["role"] == "assistant":
+                assert previous["role"] == "user"
+    assert history.turns[-2] == {"role": "user", "content": f"{LONG} question 7"}
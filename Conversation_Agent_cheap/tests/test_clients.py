@@ -0,0 +1,52 @@
+# tests/test_clients.py
+
+import threading
+
+import pytest
+import requests
+
+from voice_assistant import clients
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    created = []
+    release = threading.Event()
+
+    def create(api_key):
+        # Built outside the lock, so request accounting goes on during a slow SDK import
+        assert not clients._lock.locked()
+        release.wait(1)
+        created.append(object())
+        return created[-1]
+
+    monkeypatch.setitem(clients._CLIENT_FACTORIES, "test-sdk", create)
+    yield created, release
+    clients._clients.pop(("test-sdk", "key"), None)
+
+
+def test_client_is_built_outside_the_lock_and_stored_once(factory):
+    created, release = factory
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(clients.get_client("test-sdk", "key")))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results[0] is results[1]
+    assert clients.get_client("test-sdk", "key") is results[0]
+
+
+def test_transport_errors_are_counted():
+    session = clients.get_session("test-unreachable")
+    with pytest.raises(requests.ConnectionError):
+        # Nothing listens on the discard port
+        session.get("http://127.0.0.1:9/", timeout=1)
+    http_client = clients._http_client("test-unreachable-httpx")
+    with pytest.raises(Exception):
+        http_client.get("http://127.0.0.1:9/")
+    stats = clients.get_client_stats()
+    assert stats["test-unreachable"]["errors"] == 1
+    assert stats["test-unreachable-httpx"]["errors"] == 1
@@ -0,0 +1,29 @@
+# tests/test_gateway_server.py
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import gateway_server
+
+
+def test_malformed_control_message_gets_error_frame_and_session_continues():
+    client = TestClient(gateway_server.app)
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_text("[1]")
+        assert ws.receive_json()["type"] == "error"
+        # Still connected: valid control messages are accepted after the bad ones
+        ws.send_text('{"type": "reset"}')
+        ws.send_text("{")
+        assert ws.receive_json()["type"] == "error"
+
+
+@pytest.mark.parametrize("sample_rate", ["abc", "0"])
+def test_invalid_sample_rate_is_rejected_before_accept(sample_rate):
+    client = TestClient(gateway_server.app)
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect(f"/ws?sample_rate={sample_rate}") as ws:
+            ws.receive_text()
+    assert excinfo.value.code == 1008
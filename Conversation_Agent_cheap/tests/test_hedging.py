@@ -0,0 +1,87 @@
+# tests/test_hedging.py
+
+import threading
+import time
+
+import pytest
+
+from voice_assistant import hedging
+from voice_assistant.config import Config
+
+
+class Attempts:
+    """Scripted provider behaviour: each provider sleeps, then returns its name or raises."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.started = []
+        self.discarded = []
+        self.discard_done = threading.Event()
+
+    def attempt(self, provider):
+        self.started.append(provider)
+        delay, error = self.behaviour[provider]
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return f"{provider} result"
+
+    def discard(self, provider, result):
+        self.discarded.append((provider, result))
+        self.discard_done.set()
+
+
+@pytest.fixture(autouse=True)
+def providers(monkeypatch):
+    monkeypatch.setattr(hedging, "hedge_providers", lambda service: ["primary", "backup"])
+    monkeypatch.setitem(Config.HEDGE_DEFAULT_DEADLINES, "tts", 0.1)
+    hedging._latencies.clear()
+    hedging._stats.clear()
+
+
+def test_fast_primary_wins_without_a_hedge():
+    attempts = Attempts(primary=(0.0, None), backup=(0.0, None))
+    assert hedging._hedged_call("tts", attempts.attempt, attempts.discard) == ("primary", "primary result")
+    assert attempts.started == ["primary"]
+    assert hedging.get_hedge_stats()["tts"]["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_and_its_late_result_discarded():
+    attempts = Attempts(primary=(0.4, None), backup=(0.0, None))
+    start = time.monotonic()
+    assert hedging._hedged_call("tts", attempts.attempt, attempts.discard) == ("backup", "backup result")
+    assert time.monotonic() - start < 0.3
+    assert attempts.discard_done.wait(2)
+    assert attempts.discarded == [("primary", "primary result")]
+    stats = hedging.get_hedge_stats()["tts"]
+    assert (stats["hedges"], stats["wins"]) == (1, {"backup": 1})
+
+
+def test_failed_primary_fails_over_before_its_deadline():
+    attempts = Attempts(primary=(0.0, ConnectionError("refused")), backup=(0.0, None))
+    start = time.monotonic()
+    assert hedging._hedged_call("tts", attempts.attempt, attempts.discard) == ("backup", "backup result")
+    assert time.monotonic() - start < 0.1
+    assert hedging.get_hedge_stats()["tts"]["failovers"] == 1
+
+
+def test_last_error_is_raised_when_every_provider_fails():
+    attempts = Attempts(primary=(0.0, ConnectionError("refused")), backup=(0.0, TimeoutError("slow")))
+    with pytest.raises(TimeoutError):
+        hedging._hedged_call("tts", attempts.attempt, attempts.discard)
+    assert hedging.get_hedge_stats()["tts"]["failures"] == 1
+
+
+def test_race_starts_both_providers_at_once():
+    attempts = Attempts(primary=(0.05, None), backup=(0.2, None))
+    assert hedging._hedged_call("tts", attempts.attempt, attempts.discard, race=True)[0] == "primary"
+    assert sorted(attempts.started) == ["backup", "primary"]
+    assert attempts.discard_done.wait(2)
+
+
+def test_deadline_follows_observed_latency_once_there_are_enough_samples(monkeypatch):
+    monkeypatch.setattr(Config, "HEDGE_MIN_SAMPLES", 5)
+    hedging._latencies[("tts", "primary")].extend([0.3] * 4)
+    assert hedging.hedge_deadline("tts", "primary") == 0.1
+    hedging._latencies[("tts", "primary")].append(0.3)
+    assert hedging.hedge_deadline("tts", "primary") == pytest.approx(0.3)
@@ -0,0 +1,53 @@
+# tests/test_knowledge_base.py
+
+import pytest
+
+from voice_assistant.knowledge_base import get_knowledge_base
+
+
+@pytest.fixture(scope="module")
+def knowledge_base():
+    return get_knowledge_base()
+
+
+def test_stock_lookup_is_answered_from_the_data(knowledge_base):
+    assert "12,000 bags" in knowledge_base.answer("How many bags of cement are in stock?")
+
+
+@pytest.mark.parametrize("question", [
+    "How much cement is left after I take 10 bags?",
+    "If I use two tower cranes, how many are still free?",
+    "We need 500 bags of cement, how many would remain?",
+])
+def test_arithmetic_and_hypotheticals_go_to_the_llm(knowledge_base, question):
+    assert knowledge_base.answer(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "Do we have any cement trucks?",
+    "How many bags of cement did we have last month?",
+    "Is steel available in Dubai market?",
+    "How many cranes are there in Abu Dhabi?",
+    "How many vests are damaged?",
+])
+def test_qualified_questions_go_to_the_llm(knowledge_base, question):
+    assert knowledge_base.answer(question) is None
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Which tower cranes are under maintenance?", "1 is under maintenance"),
+    ("How many reflective vests are in use right now?", "400 of our 600 reflective vests"),
+    ("When is the next binding wire restock due?", "25 April 2025"),
+    ("Who do I contact to buy more safety helmets?", "Fahad Al Marzouqi"),
+])
+def test_plain_lookups_are_answered_locally(knowledge_base, question, expected):
+    assert expected in knowledge_base.answer(question)
+
+
+def test_system_prompt_lists_the_inventory_data(knowledge_base):
+    from voice_assistant.prompts import SYSTEM_PROMPT
+
+    for item in knowledge_base.items.values():
+        assert item["name"][1:] in SYSTEM_PROMPT
+    assert "12,000 bags in stock; reorder level at 3,000 bags" in SYSTEM_PROMPT
+    assert knowledge_base.contact["email"] in SYSTEM_PROMPT
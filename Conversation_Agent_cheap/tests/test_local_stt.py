@@ -0,0 +1,24 @@
+# tests/test_local_stt.py
+
+import numpy as np
+
+from voice_assistant.local_stt import SAMPLE_RATE, speech_windows
+
+
+def _syllables(seconds):
+    # Voiced 150 Hz tone, four syllables a second with quieter gaps between them
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 4 * t) > 0) * 0.9 + 0.1
+    return (np.sin(2 * np.pi * 150 * t) * 8000 * envelope).astype(np.int16)
+
+
+def _seconds(windows):
+    return sum(len(window) for window in windows) / SAMPLE_RATE
+
+
+def test_clip_starting_with_speech_keeps_its_speech():
+    assert _seconds(speech_windows(_syllables(3.1))) > 2.5
+
+
+def test_silence_is_dropped():
+    assert speech_windows(np.zeros(SAMPLE_RATE, dtype=np.int16)) == []
@@ -0,0 +1,62 @@
+# tests/test_parallel_tts.py
+
+import threading
+import time
+
+from voice_assistant.parallel_tts import RateLimiter, get_rate_limit_stats
+
+
+def test_concurrency_is_capped():
+    limiter = RateLimiter("test-concurrency", max_concurrent=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def request():
+        with limiter:
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+
+def test_waiting_requests_are_admitted_in_arrival_order():
+    limiter = RateLimiter("test-order", max_concurrent=1)
+    order = []
+    threads = []
+
+    def request(index):
+        with limiter:
+            order.append(index)
+
+    with limiter:
+        for index in range(4):
+            thread = threading.Thread(target=request, args=(index,))
+            thread.start()
+            threads.append(thread)
+            # Let each thread take its ticket before the next one arrives
+            time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2, 3]
+
+
+def test_requests_start_at_least_the_interval_apart():
+    limiter = RateLimiter("test-rate", max_concurrent=4, requests_per_minute=600)
+    starts = []
+    for _ in range(3):
+        with limiter:
+            starts.append(time.monotonic())
+    assert starts[2] - starts[0] >= 0.19
+    stats = get_rate_limit_stats()["test-rate"]
+    assert stats["requests"] == 3
+    assert stats["throttled"] == 2
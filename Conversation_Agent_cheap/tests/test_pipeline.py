@@ -0,0 +1,104 @@
+# tests/test_pipeline.py
+
+import threading
+
+import pytest
+
+from voice_assistant import pipeline
+from voice_assistant.config import Config
+from voice_assistant.playback import PlaybackStream, _JitterBuffer
+
+SENTENCES = ["We have twelve thousand bags of cement in stock.",
+             "The reorder level is three thousand bags.",
+             "Anything else I can help with?"]
+
+
+class FakeOutputEngine:
+    """
+    AudioOutputEngine without a device: the test plays audio by reading the buffer.
+    """
+
+    def __init__(self):
+        self.sample_rate = 24000
+        self.buffer = _JitterBuffer(0)
+        self.playback_started_at = None
+        self.first_audio_at = None
+
+    def start_turn(self):
+        self.first_audio_at = None
+
+    def open_stream(self, input_format=None):
+        return PlaybackStream(self, input_format)
+
+    def play_all(self):
+        while self.buffer._data:
+            self.buffer.read(480)
+
+    def drain(self, timeout=None):
+        self.play_all()
+        return True
+
+    def stop(self):
+        self.buffer.clear()
+
+
+class FakeBargeIn:
+    def __init__(self):
+        self.triggered = threading.Event()
+        self.endpointer = None
+        self.interrupt = None
+
+    def start(self, on_barge_in):
+        self.interrupt = on_barge_in
+
+    def stop(self):
+        pass
+
+
+def _sentence_audio(sentence):
+    # One second of PCM per sentence at the fake engine's rate
+    return bytes(48000)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = FakeOutputEngine()
+    monkeypatch.setattr(pipeline, "get_output_engine", lambda: engine)
+    monkeypatch.setattr(Config, "PERSISTENT_AUDIO_OUTPUT", True)
+    monkeypatch.setattr(Config, "PARALLEL_TTS", False)
+    monkeypatch.setattr(Config, "HEDGING", False)
+    return engine
+
+
+def _interrupting_stream_speech(engine, barge_in, heard_bytes):
+    """
+    stream_speech that plays heard_bytes of the turn and then barges in when the third sentence is requested.
+    """
+    def stream_speech(model, api_key, text, local_model_path=None, speech_format=None):
+        if text == SENTENCES[2]:
+            engine.buffer.read(heard_bytes)
+            barge_in.interrupt()
+        yield _sentence_audio(text)
+    return stream_speech
+
+
+def _run_turn(engine, barge_in=None):
+    return pipeline.run_streaming_turn(None, None, None, "piper", None, barge_in=barge_in,
+                                       deltas=iter([" ".join(SENTENCES)]))
+
+
+def test_spoken_prefix_is_turn_relative_after_earlier_turns(engine, monkeypatch):
+    monkeypatch.setattr(pipeline, "get_speech_format", lambda model: "pcm_24000")
+    monkeypatch.setattr(pipeline, "stream_speech", lambda *args, **kwargs: iter([bytes(48000)]))
+
+    # A first turn that plays to the end, and one interrupted early whose unplayed audio is dropped
+    assert _run_turn(engine) == " ".join(SENTENCES)
+    first_barge_in = FakeBargeIn()
+    monkeypatch.setattr(pipeline, "stream_speech", _interrupting_stream_speech(engine, first_barge_in, 4800))
+    assert _run_turn(engine, first_barge_in) == ""
+
+    # The user hears all of the first sentence and a fifth of the second
+    barge_in = FakeBargeIn()
+    monkeypatch.setattr(pipeline, "stream_speech", _interrupting_stream_speech(engine, barge_in, 48000 + 9600))
+    second_words = SENTENCES[1].split()
+    assert _run_turn(engine, barge_in) == f"{SENTENCES[0]} {second_words[0]}..."
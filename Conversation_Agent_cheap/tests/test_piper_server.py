@@ -0,0 +1,52 @@
+# tests/test_piper_server.py
+
+import pytest
+from fastapi import HTTPException
+
+import piper_server
+
+
+class FakeWorker:
+    def __init__(self):
+        self.alive = True
+
+    def synthesize(self, text):
+        yield b"\x00\x00"
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.alive = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(piper_server, "PiperWorker", FakeWorker)
+    return piper_server.PiperPool(1, 4)
+
+
+def test_failed_restart_keeps_the_slot_and_is_retried_on_acquire(pool, monkeypatch):
+    worker = pool.acquire()
+
+    def fail_to_start():
+        raise OSError("piper binary missing")
+
+    start_worker = pool._start_worker
+    monkeypatch.setattr(pool, "_start_worker", fail_to_start)
+    pool.release(worker, healthy=False)
+    assert pool.metrics()["idle_workers"] == 1
+    assert pool.stats["restart_failures"] == 1
+
+    # Still failing: the request gets a 503 at once instead of waiting, and the slot stays in the pool
+    with pytest.raises(HTTPException) as excinfo:
+        pool.acquire()
+    assert excinfo.value.status_code == 503
+    assert pool.metrics()["idle_workers"] == 1
+
+    monkeypatch.setattr(pool, "_start_worker", start_worker)
+    worker = pool.acquire()
+    assert isinstance(worker, FakeWorker)
+    assert b"".join(pool.run(worker, "Hello")) == b"\x00\x00"
+    assert pool.metrics()["idle_workers"] == 1
+    assert pool.stats["restarts"] == 3
@@ -0,0 +1,42 @@
+# tests/test_playback.py
+
+import itertools
+
+from voice_assistant import playback
+from voice_assistant.playback import AudioOutputEngine, _JitterBuffer
+
+
+def _engine_without_device():
+    # The device callback is driven by hand, so skip opening a sounddevice stream
+    engine = AudioOutputEngine.__new__(AudioOutputEngine)
+    engine.sample_rate = 24000
+    engine.buffer = _JitterBuffer(480)
+    engine.playback_started_at = None
+    engine.first_audio_at = None
+    engine._playing = False
+    return engine
+
+
+def _play_block(engine):
+    outdata = bytearray(480)
+    engine._callback(outdata, 240, None, None)
+
+
+def test_first_audio_survives_gaps_between_sentences(monkeypatch):
+    monkeypatch.setattr(playback.time, "monotonic", itertools.count().__next__)
+    engine = _engine_without_device()
+    engine.start_turn()
+    engine.buffer.write(bytes(480))
+    _play_block(engine)
+    first_audio_at = engine.first_audio_at
+
+    # An underrun between sentences, then the next sentence resumes playback
+    for _ in range(3):
+        _play_block(engine)
+    engine.buffer.write(bytes(480))
+    _play_block(engine)
+    assert engine.playback_started_at > first_audio_at
+    assert engine.first_audio_at == first_audio_at
+
+    engine.start_turn()
+    assert engine.first_audio_at is None
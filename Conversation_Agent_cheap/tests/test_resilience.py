@@ -0,0 +1,188 @@
+# tests/test_resilience.py
+
+import asyncio
+import http.server
+import threading
+import time
+import types
+
+import pytest
+import requests
+
+from voice_assistant import resilience
+from voice_assistant.clients import get_session
+from voice_assistant.config import Config
+from voice_assistant.resilience import ProviderUnavailableError, call_with_failover, call_with_failover_async
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(Config, "RESILIENCE", True)
+    monkeypatch.setattr(Config, "RETRY_BASE_DELAY", 0.0)
+    resilience._breakers.clear()
+    yield
+    resilience._breakers.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(Config, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(Config, "BREAKER_COOLDOWN", 10.0)
+    monkeypatch.setattr(Config, "BREAKER_MAX_COOLDOWN", 30.0)
+    monkeypatch.setattr(Config, "BREAKER_JITTER", 0.0)
+    return now
+
+
+def _trip(breaker):
+    for _ in range(Config.BREAKER_FAILURE_THRESHOLD):
+        breaker.record_failure(StatusError(503))
+
+
+def test_breaker_opens_after_consecutive_failures_and_rejects(clock):
+    breaker = resilience.CircuitBreaker("response", "groq")
+    breaker.record_failure(StatusError(503))
+    breaker.record_failure(StatusError(503))
+    breaker.record_success()
+    breaker.record_failure(StatusError(503))
+    breaker.record_failure(StatusError(503))
+    # A success in between resets the count
+    assert breaker.state == resilience.CLOSED and breaker.allow()
+    breaker.record_failure(StatusError(503))
+    assert breaker.state == resilience.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+    assert breaker.snapshot()["retry_in_seconds"] == 10.0
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock):
+    breaker = resilience.CircuitBreaker("response", "groq")
+    _trip(breaker)
+    clock[0] += 9.9
+    assert not breaker.allow()
+    clock[0] += 0.1
+    assert breaker.allow()
+    assert breaker.state == resilience.HALF_OPEN
+    # Only the probe goes through until it reports back
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_for_twice_as_long_up_to_the_cap(clock):
+    breaker = resilience.CircuitBreaker("response", "groq")
+    _trip(breaker)
+    for cooldown in (20.0, 30.0, 30.0):
+        clock[0] += 100
+        assert breaker.allow()
+        breaker.record_failure(StatusError(503))
+        assert breaker.state == resilience.OPEN
+        assert breaker.snapshot()["retry_in_seconds"] == cooldown
+    clock[0] += 100
+    assert breaker.allow()
+    breaker.record_success()
+    # Recovery resets the cooldown
+    _trip(breaker)
+    assert breaker.snapshot()["retry_in_seconds"] == 10.0
+
+
+def test_open_breaker_sends_requests_straight_to_the_failover_provider(clock, monkeypatch):
+    monkeypatch.setattr(resilience, "failover_chain", lambda service, provider, *args: [provider, "ollama"])
+    monkeypatch.setattr(resilience, "get_api_key", lambda service, provider: None)
+    _trip(resilience.get_breaker("response", "groq"))
+    calls = []
+
+    def attempt(provider, api_key):
+        calls.append(provider)
+        return "reply"
+
+    assert call_with_failover("response", "groq", "key", attempt) == ("ollama", "reply")
+    assert calls == ["ollama"]
+
+
+def _failing(error, calls):
+    def attempt(provider, api_key):
+        calls.append(provider)
+        raise error
+    return attempt
+
+
+def test_client_errors_are_raised_at_once_without_tripping_the_breaker():
+    calls = []
+    with pytest.raises(StatusError):
+        call_with_failover("response", "groq", "key", _failing(StatusError(401), calls), failover=False)
+    assert calls == ["groq"]
+    assert resilience.get_breaker("response", "groq").snapshot()["failures"] == 0
+
+
+def test_server_errors_are_retried_and_counted_against_the_breaker():
+    calls = []
+    with pytest.raises(ProviderUnavailableError):
+        call_with_failover("response", "groq", "key", _failing(StatusError(503), calls), failover=False)
+    assert len(calls) == Config.RETRY_MAX_ATTEMPTS
+    assert resilience.get_breaker("response", "groq").snapshot()["failures"] == Config.RETRY_MAX_ATTEMPTS
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (StatusError(429), True),
+    (StatusError(500), True),
+    (StatusError(400), False),
+    (requests.ConnectionError("refused"), True),
+    (TimeoutError(), True),
+    (ValueError("bad argument"), False),
+])
+def test_is_retryable(error, retryable):
+    assert resilience.is_retryable(error) is retryable
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(1.0)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+
+def test_attempts_time_out_at_the_deadline(monkeypatch, slow_server):
+    monkeypatch.setitem(Config.RETRY_DEADLINES, "tts", 0.2)
+    calls = []
+
+    def attempt(provider, api_key):
+        calls.append(provider)
+        return get_session("test-slow").get(slow_server, timeout=Config.HTTP_TIMEOUT)
+
+    start = time.monotonic()
+    with pytest.raises(ProviderUnavailableError):
+        call_with_failover("tts", "piper", None, attempt, failover=False)
+    assert time.monotonic() - start < 0.8
+    assert calls == ["piper"]
+
+
+def test_async_attempts_are_cancelled_at_the_deadline(monkeypatch):
+    monkeypatch.setitem(Config.RETRY_DEADLINES, "tts", 0.2)
+
+    async def attempt(provider, api_key):
+        await asyncio.sleep(5)
+
+    start = time.monotonic()
+    with pytest.raises(ProviderUnavailableError):
+        asyncio.run(call_with_failover_async("tts", "piper", None, attempt, failover=False))
+    assert time.monotonic() - start < 1.0
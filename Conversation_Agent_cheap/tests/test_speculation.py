@@ -0,0 +1,76 @@
+# tests/test_speculation.py
+
+import threading
+import time
+
+import pytest
+
+from voice_assistant import speculation
+from voice_assistant.config import Config
+from voice_assistant.speculation import SpeculativeResponder, transcript_distance
+
+SAMPLE_RATE = 16000
+TRANSCRIPT = "how many bags of cement are in stock"
+
+
+def _speech(ms):
+    return bytes(2 * SAMPLE_RATE * ms // 1000)
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def transcriptions(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculation, "transcribe_audio", lambda *args: calls.append(args) or TRANSCRIPT)
+    monkeypatch.setattr(Config, "SPECULATION_MAX_PER_UTTERANCE", 2)
+    monkeypatch.setattr(Config, "SPECULATION_MIN_NEW_SPEECH_MS", 700)
+    return calls
+
+
+def _responder():
+    return SpeculativeResponder([], "groq", None, "groq", None)
+
+
+def test_transcript_distance_ignores_case_and_punctuation():
+    assert transcript_distance("How many bags?", "how many bags") == 0.0
+    assert transcript_distance("how many bags", "how many cranes") == pytest.approx(1 / 3)
+
+
+def test_pauses_need_new_speech_and_are_capped_per_utterance(transcriptions, monkeypatch):
+    monkeypatch.setattr(speculation, "stream_response_deltas", lambda *args: iter(["We have"]))
+    responder = _responder()
+    # Too short, enough, too little new speech, enough, over the cap
+    for ms in (300, 800, 1000, 1600, 2400):
+        responder.on_pause(_speech(ms), SAMPLE_RATE)
+    _wait_for(lambda: len(transcriptions) == 2)
+    time.sleep(0.05)
+    assert len(transcriptions) == 2
+    responder.cancel()
+
+
+def test_accepted_speculation_that_fails_is_generated_again(transcriptions, monkeypatch):
+    fail = threading.Event()
+
+    def failing_deltas(*args):
+        fail.wait(2)
+        raise ConnectionError("stream dropped")
+        yield
+
+    regenerated = []
+    monkeypatch.setattr(speculation, "stream_response_deltas", failing_deltas)
+    monkeypatch.setattr(speculation, "stream_response",
+                        lambda model, api_key, messages, local_model_path: regenerated.append(messages) or
+                        iter(["We have 12,000 bags."]))
+    responder = _responder()
+    responder.on_pause(_speech(1000), SAMPLE_RATE)
+    _wait_for(lambda: responder._speculation is not None)
+
+    deltas = responder.resolve(TRANSCRIPT)
+    fail.set()
+    assert list(deltas) == ["We have 12,000 bags."]
+    assert regenerated[0][-1] == {"role": "user", "content": TRANSCRIPT}
@@ -0,0 +1,66 @@
+# tests/test_text_chunking.py
+
+import pytest
+
+from voice_assistant.text_chunking import SentenceChunker, iter_speakable_chunks
+
+
+@pytest.fixture
+def chunker():
+    return SentenceChunker(min_chars=12, first_clause_min_chars=24, clause_min_chars=80, max_chars=60)
+
+
+def test_short_sentences_are_merged_with_the_next(chunker):
+    assert chunker.feed("Hi. How are you today? Good.") == ["Hi. How are you today?"]
+    assert chunker.flush() == ["Good."]
+
+
+def test_boundary_waits_for_the_following_character(chunker):
+    # "5." could still become "5.5", so a terminal at the end of the buffer is not a boundary yet
+    assert chunker.feed("We have 25 bags of cement.") == []
+    assert chunker.feed(" More") == ["We have 25 bags of cement."]
+    assert chunker.feed(" arrives at 5.5 tonnes today. ") == ["More arrives at 5.5 tonnes today."]
+
+
+def test_abbreviations_and_initials_do_not_end_a_sentence(chunker):
+    assert chunker.feed("Call Dr. Khan or J. Smith at the site office. Then") == [
+        "Call Dr. Khan or J. Smith at the site office."
+    ]
+
+
+def test_first_chunk_may_end_at_a_clause_but_later_ones_need_more_text(chunker):
+    text = "Sure, the cement delivery is scheduled, and it arrives at noon, weather permitting, at gate two. "
+    chunks = chunker.feed(text)
+    # "Sure," is too short for the first clause break; later chunks ignore short clauses entirely
+    assert chunks == ["Sure, the cement delivery is scheduled,",
+                      "and it arrives at noon, weather permitting, at gate two."]
+
+
+def test_newline_ends_a_chunk(chunker):
+    assert chunker.feed("Steel rebar: 120 tonnes\nCement") == ["Steel rebar: 120 tonnes"]
+
+
+def test_text_without_boundaries_is_split_at_a_word_before_max_chars(chunker):
+    words = " ".join(f"word{index}" for index in range(40))
+    chunks = chunker.feed(words) + chunker.flush()
+    assert " ".join(chunks) == words
+    assert all(len(chunk) <= chunker.max_chars for chunk in chunks)
+    assert all(chunk.split()[-1].startswith("word") for chunk in chunks)
+
+
+def test_an_unbreakable_word_is_cut_at_max_chars(chunker):
+    chunks = chunker.feed("x" * 130) + chunker.flush()
+    assert chunks == ["x" * 60, "x" * 60, "x" * 10]
+
+
+def test_streamed_deltas_chunk_like_the_whole_text():
+    text = "Hello there. Our stock of cement is 40 bags, sand is 12 tonnes. Anything else?"
+    whole = list(iter_speakable_chunks([text]))
+    streamed = list(iter_speakable_chunks(iter(text)))
+    assert streamed == whole
+    assert " ".join(whole) == text
+
+
+def test_flush_of_empty_buffer_returns_nothing(chunker):
+    chunker.feed("   ")
+    assert chunker.flush() == []
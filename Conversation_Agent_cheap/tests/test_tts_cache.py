@@ -0,0 +1,73 @@
+# tests/test_tts_cache.py
+
+import os
+
+import pytest
+
+from voice_assistant import tts_cache
+from voice_assistant.tts_cache import TTSCache, cache_key, cached_synthesize_speech
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSCache(str(tmp_path), max_disk_bytes=250, max_memory_entries=2)
+
+
+def test_cache_key_ignores_case_and_spacing_but_not_punctuation():
+    key = cache_key("openai", "alloy", "mp3", "Hello  there")
+    assert cache_key("openai", "alloy", "mp3", " hello there ") == key
+    assert cache_key("openai", "alloy", "mp3", "Hello there?") != key
+    assert cache_key("openai", "nova", "mp3", "Hello there") != key
+    assert cache_key("openai", "alloy", "wav", "Hello there") != key
+
+
+def test_memory_keeps_the_most_recently_used_entries(cache):
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.get("a")
+    cache.put("c", b"3")
+    for key in "abc":
+        os.remove(os.path.join(cache.cache_dir, key))
+    # With the files gone only memory can serve; "b" was least recently used and has been evicted
+    assert cache.get("a") == b"1"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"3"
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_disk_entries_outlive_memory_and_are_read_back(cache):
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.put("c", b"3")
+    assert cache.get("a") == b"1"
+    assert TTSCache(cache.cache_dir).get("b") == b"2"
+
+
+def test_disk_is_trimmed_least_recently_used_first(cache):
+    cache.put("old", b"x" * 100)
+    cache.put("recent", b"y" * 100)
+    os.utime(os.path.join(cache.cache_dir, "old"), (1000, 1000))
+    os.utime(os.path.join(cache.cache_dir, "recent"), (2000, 2000))
+    cache.put("new", b"z" * 100)
+    assert sorted(os.listdir(cache.cache_dir)) == ["new", "recent"]
+    assert cache._disk_bytes == 200
+
+
+def test_empty_audio_is_not_cached(cache):
+    cache.put("a", b"")
+    assert cache.get("a") is None
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_audio_is_stored_under_the_model_that_produced_it(cache, monkeypatch):
+    monkeypatch.setattr(tts_cache, "get_tts_cache", lambda: cache)
+    calls = []
+
+    def synthesize(model, api_key, text, local_model_path):
+        calls.append(model)
+        # The requested provider failed over to piper
+        return "piper", b"speech"
+
+    assert cached_synthesize_speech(synthesize, "openai", "key", "Hello", "wav") == b"speech"
+    assert cached_synthesize_speech(synthesize, "piper", "key", "hello", "wav") == b"speech"
+    assert calls == ["openai"]
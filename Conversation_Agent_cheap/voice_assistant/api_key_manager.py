@@ -1,33 +1,19 @@
 # voice_assistant/api_key_manager.py
 
 from voice_assistant.config import Config
-
-API_KEY_MAPPING= {
-    "transcription":{
-        "openai": Config.OPENAI_API_KEY,
-        "groq": Config.GROQ_API_KEY,
-        "deepgram": Config.DEEPGRAM_API_KEY
-    },
-    "response":{
-        "openai":Config.OPENAI_API_KEY,
-        "groq": Config.GROQ_API_KEY
-    },
-    "tts": {
-        "openai": Config.OPENAI_API_KEY,
-        "deepgram":Config.DEEPGRAM_API_KEY,
-        "elevenlabs": Config.ELEVENLABS_API_KEY,
-        "cartesia": Config.CARTESIA_API_KEY
-    }
-}
+from voice_assistant.providers import PROVIDERS
 
 def get_api_key(service, model):
     """
     Select the API key for the specified service and model
     
     Returns:
-    str: The API key for the transcription, response or tts service.
+    str: The API key for the transcription, response or tts service, or None if the model needs none.
     """
-    return API_KEY_MAPPING.get(service, {}).get(model)
+    provider = PROVIDERS.get(service, {}).get(model)
+    if provider is None or provider.api_key is None:
+        return None
+    return getattr(Config, provider.api_key)
 
 def get_transcription_api_key():
     """
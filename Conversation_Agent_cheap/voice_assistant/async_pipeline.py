@@ -0,0 +1,240 @@
+# voice_assistant/async_pipeline.py
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from colorama import Fore
+
+from voice_assistant.api_key_manager import get_response_api_key, get_transcription_api_key, get_tts_api_key
+from voice_assistant.audio import record_audio_buffer
+from voice_assistant.audio_formats import negotiate_speech_format
+from voice_assistant.chat_history import ChatHistory
+from voice_assistant.clients import close_async_clients
+from voice_assistant.config import Config
+from voice_assistant.knowledge_base import answer_locally
+from voice_assistant.parallel_tts import ParallelSpeechSynthesizer, SentenceSpeech
+from voice_assistant.playback import get_output_engine
+from voice_assistant.prewarm import prewarm_in_background
+from voice_assistant.resilience import ProviderUnavailableError, backoff_delay
+from voice_assistant.response_generation import stream_response_async
+from voice_assistant.text_chunking import SentenceChunker
+from voice_assistant.text_to_speech import stream_speech_async
+from voice_assistant.tracing import TurnTrace, get_tracer
+from voice_assistant.transcription import transcribe_audio_async
+from voice_assistant.utils import iterate_in_thread
+from voice_assistant.vad import record_utterance
+
+# Marks the end of the reply on the queue feeding the TTS task
+_END_OF_STREAM = None
+
+# Microphone and speaker I/O runs on its own threads so it never waits behind network calls
+_audio_executor = ThreadPoolExecutor(max_workers=Config.ASYNC_AUDIO_THREADS, thread_name_prefix="audio-io")
+
+
+async def run_in_audio_thread(func, *args, **kwargs):
+    """
+    Run a blocking audio I/O call on the dedicated audio threads.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_audio_executor, functools.partial(func, *args, **kwargs))
+
+
+class LocalAudioSink:
+    """
+    Plays a turn's audio on this machine's persistent output engine.
+
+    An audio sink receives each sentence's speech as it is synthesized, and
+    is told when the turn ends; other sinks (e.g. a network connection) let
+    one process serve several sessions with the same turn logic.
+    """
+
+    def __init__(self):
+        self.engine = get_output_engine()
+        self.engine.start_turn()
+        # Format kinds the sink accepts, most preferred first, and its sample rate; used to negotiate with the TTS model
+        self.accepted_formats = Config.PLAYBACK_FORMATS
+        self.sample_rate = self.engine.sample_rate
+        self._cpu_seconds = 0.0
+
+    async def play(self, speech_format, chunks):
+        """
+        Play one sentence's speech.
+
+        Args:
+        speech_format (str): The format of the chunks, as returned by negotiate_speech_format.
+        chunks (async iterator): The encoded audio chunks.
+        """
+        stream = await run_in_audio_thread(self.engine.open_stream, speech_format)
+        try:
+            async for chunk in chunks:
+                await run_in_audio_thread(stream.write, chunk)
+        finally:
+            await run_in_audio_thread(stream.close)
+            self._cpu_seconds += stream.cpu_seconds
+
+    async def finish(self, trace):
+        """
+        Wait for the turn's audio to finish playing and mark the playback stage.
+        """
+        trace.add_cpu_time("audio_decode", self._cpu_seconds)
+        self._cpu_seconds = 0.0
+        await run_in_audio_thread(self.engine.drain)
+        # When the turn's first audio played; playback_started_at moves on every resumption after a gap
+        if self.engine.first_audio_at is not None:
+            trace.mark("playback_start", self.engine.first_audio_at)
+        trace.mark("playback_end")
+
+
+async def _speak_sentences(sentences, audio_sink, tts_model, tts_api_key, local_model_path, trace):
+    while True:
+        sentence = await sentences.get()
+        if sentence is _END_OF_STREAM:
+            break
+        trace.mark("tts_start")
+        if isinstance(sentence, SentenceSpeech):
+            # Already being synthesized on the parallel TTS workers
+            speech_format = sentence.speech_format
+            speech = iterate_in_thread(sentence.chunks())
+        else:
+            speech_format = negotiate_speech_format(tts_model, audio_sink.accepted_formats, audio_sink.sample_rate)
+            speech = stream_speech_async(tts_model, tts_api_key, sentence, local_model_path, speech_format)
+
+        async def chunks():
+            async for chunk in speech:
+                trace.mark("tts_first_chunk")
+                yield chunk
+
+        try:
+            await audio_sink.play(speech_format, chunks())
+        except Exception as e:
+            logging.error(f"Failed to convert sentence to speech: {e}")
+        trace.mark("tts_end")
+    await audio_sink.finish(trace)
+
+
+async def run_streaming_turn_async(chat_history, response_model, response_api_key, tts_model, tts_api_key,
+                                   local_model_path=None, audio_sink=None, trace=None, deltas=None):
+    """
+    Generate and speak a reply on the event loop, with generation, synthesis and playback overlapping.
+
+    The async counterpart of pipeline.run_streaming_turn: LLM deltas are split
+    into speakable chunks, and a separate task synthesizes each chunk and
+    hands its audio to the sink while generation continues.
+
+    Args:
+    chat_history (list): The chat history as a list of messages.
+    response_model (str): The model to use for response generation.
+    response_api_key (str): The API key for the response generation service.
+    tts_model (str): The model to use for text-to-speech.
+    tts_api_key (str): The API key for the TTS service.
+    local_model_path (str): The path to the local model (if applicable).
+    audio_sink (object): Where the speech goes; defaults to a LocalAudioSink.
+    trace (TurnTrace): Trace to mark the LLM, TTS and playback stage boundaries on.
+    deltas (async iterator): An already started response stream to speak instead of generating one.
+
+    Returns:
+    str: The full response text.
+    """
+    trace = trace or TurnTrace(0)
+    audio_sink = audio_sink or LocalAudioSink()
+    sentences = asyncio.Queue()
+    if Config.PARALLEL_TTS:
+        # Each chunk starts synthesizing as soon as it is complete; the TTS task plays them in order
+        speech_format = negotiate_speech_format(tts_model, audio_sink.accepted_formats, audio_sink.sample_rate)
+        speak = ParallelSpeechSynthesizer(tts_model, tts_api_key, local_model_path, speech_format, trace=trace).submit
+    else:
+        speak = lambda sentence: sentence
+    tts_task = asyncio.create_task(
+        _speak_sentences(sentences, audio_sink, tts_model, tts_api_key, local_model_path, trace)
+    )
+
+    response_parts = []
+    chunker = SentenceChunker()
+    trace.mark("llm_start")
+    if deltas is None:
+        deltas = stream_response_async(response_model, response_api_key, chat_history, local_model_path)
+    try:
+        async for delta in deltas:
+            trace.mark("llm_first_token")
+            response_parts.append(delta)
+            for chunk in chunker.feed(delta):
+                sentences.put_nowait(speak(chunk))
+        for chunk in chunker.flush():
+            sentences.put_nowait(speak(chunk))
+    except Exception as e:
+        logging.error(Fore.RED + f"Streaming response generation failed: {e}" + Fore.RESET)
+    finally:
+        if hasattr(deltas, "aclose"):
+            await deltas.aclose()
+        trace.mark("llm_end")
+        sentences.put_nowait(_END_OF_STREAM)
+    await tts_task
+    return "".join(response_parts)
+
+
+async def _single_delta(text):
+    yield text
+
+
+async def run_voice_loop_async(system_prompt):
+    """
+    Run the voice assistant on an asyncio event loop.
+
+    Recording and playback run on the dedicated audio threads, and the
+    network stages use async clients, so the loop stays free to overlap them
+    (and to serve other sessions). Hedging, speculation and barge-in are only
+    available in the threaded loop in app.py.
+
+    Args:
+    system_prompt (str): The assistant's system prompt.
+    """
+    chat_history = ChatHistory(system_prompt, Config.RESPONSE_MODEL, get_response_api_key())
+    tracer = get_tracer()
+    consecutive_errors = 0
+    if Config.PREWARM:
+        prewarm_in_background(system_prompt)
+    while True:
+        try:
+            trace = tracer.start_turn()
+            trace.mark("record_start")
+            if Config.VAD_ENDPOINTING:
+                input_audio = await run_in_audio_thread(record_utterance)
+            else:
+                input_audio = await run_in_audio_thread(record_audio_buffer)
+            if input_audio is None:
+                continue
+            trace.mark("record_end")
+
+            with trace.span("stt"):
+                user_input = await transcribe_audio_async(Config.TRANSCRIPTION_MODEL, get_transcription_api_key(),
+                                                          input_audio, Config.LOCAL_MODEL_PATH)
+            if not user_input:
+                logging.info("No transcription was returned. Starting recording again.")
+                continue
+            logging.info(Fore.GREEN + "You said: " + user_input + Fore.RESET)
+            if "goodbye" in user_input.lower() or "arrivederci" in user_input.lower():
+                break
+
+            chat_history.add_user(user_input)
+            local_answer = answer_locally(user_input) if Config.LOCAL_KNOWLEDGE_BASE else None
+            if local_answer is not None:
+                trace.providers["RESPONSE_MODEL"] = "knowledge_base"
+            response_text = await run_streaming_turn_async(
+                chat_history.messages(), Config.RESPONSE_MODEL, get_response_api_key(), Config.TTS_MODEL,
+                get_tts_api_key(), Config.LOCAL_MODEL_PATH, trace=trace,
+                deltas=_single_delta(local_answer) if local_answer is not None else None
+            )
+            logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
+            if response_text:
+                chat_history.add_assistant(response_text)
+            tracer.finish_turn(trace)
+            consecutive_errors = 0
+        except ProviderUnavailableError as e:
+            # Already retried and failed over; the open breakers make the next turn fail fast
+            logging.error(Fore.RED + f"Turn failed: {e}" + Fore.RESET)
+        except Exception as e:
+            logging.error(Fore.RED + f"An error occurred: {e}" + Fore.RESET)
+            await asyncio.sleep(backoff_delay(consecutive_errors, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY))
+            consecutive_errors += 1
+    await close_async_clients()
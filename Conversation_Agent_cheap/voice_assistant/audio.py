@@ -1,14 +1,13 @@
 # voice_assistant/audio.py
 
-import speech_recognition as sr
-import pygame
 import time
 import logging
-import pydub
 from io import BytesIO
-from pydub import AudioSegment
 from functools import lru_cache
 
+from voice_assistant.config import Config
+from voice_assistant.playback import get_output_engine
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -17,25 +16,20 @@ def get_recognizer():
     """
     Return a cached speech recognizer instance
     """
+    import speech_recognition as sr
+
     return sr.Recognizer()
 
-def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energy_threshold=2000, 
-                 pause_threshold=0.8, phrase_threshold=0.1, dynamic_energy_threshold=True, 
-                 calibration_duration=0.1):
+def _listen(timeout, phrase_time_limit, retries, energy_threshold, pause_threshold, phrase_threshold,
+            dynamic_energy_threshold, calibration_duration):
     """
-    Record audio from the microphone and save it as an MP3 file.
-    
-    Args:
-    file_path (str): The path to save the recorded audio file.
-    timeout (int): Maximum time to wait for a phrase to start (in seconds).
-    phrase_time_limit (int): Maximum time for the phrase to be recorded (in seconds).
-    retries (int): Number of retries if recording fails.
-    energy_threshold (int): Energy threshold for considering whether a given chunk of audio is speech or not.
-    pause_threshold (float): How much silence the recognizer interprets as the end of a phrase (in seconds).
-    phrase_threshold (float): Minimum length of a phrase to consider for recording (in seconds).
-    dynamic_energy_threshold (bool): Whether to enable dynamic energy threshold adjustment.
-    calibration_duration (float): Duration of the ambient noise calibration (in seconds).
+    Listen on the microphone for a single phrase.
+
+    Returns:
+    sr.AudioData: The recorded phrase, or None if every attempt timed out.
     """
+    import speech_recognition as sr
+
     recognizer = get_recognizer()
     recognizer.energy_threshold = energy_threshold
     recognizer.pause_threshold = pause_threshold
@@ -51,12 +45,7 @@ def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energ
                 # Listen for the first phrase and extract it into audio data
                 audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
                 logging.info("Recording complete")
-
-                # Convert the recorded audio data to an MP3 file
-                wav_data = audio_data.get_wav_data()
-                audio_segment = pydub.AudioSegment.from_wav(BytesIO(wav_data))
-                mp3_data = audio_segment.export(file_path, format="mp3", bitrate="128k", parameters=["-ar", "22050", "-ac", "1"])
-                return
+                return audio_data
         except sr.WaitTimeoutError:
             logging.warning(f"Listening timed out, retrying... ({attempt + 1}/{retries})")
         except Exception as e:
@@ -65,14 +54,98 @@ def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energ
                 raise
         
     logging.error("Recording failed after all retries")
+    return None
+
+def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energy_threshold=2000, 
+                 pause_threshold=0.8, phrase_threshold=0.1, dynamic_energy_threshold=True, 
+                 calibration_duration=0.1):
+    """
+    Record audio from the microphone and save it as a WAV file, or as MP3 if file_path ends in '.mp3'.
+    
+    Args:
+    file_path (str): The path to save the recorded audio file.
+    timeout (int): Maximum time to wait for a phrase to start (in seconds).
+    phrase_time_limit (int): Maximum time for the phrase to be recorded (in seconds).
+    retries (int): Number of retries if recording fails.
+    energy_threshold (int): Energy threshold for considering whether a given chunk of audio is speech or not.
+    pause_threshold (float): How much silence the recognizer interprets as the end of a phrase (in seconds).
+    phrase_threshold (float): Minimum length of a phrase to consider for recording (in seconds).
+    dynamic_energy_threshold (bool): Whether to enable dynamic energy threshold adjustment.
+    calibration_duration (float): Duration of the ambient noise calibration (in seconds).
+    """
+    audio_data = _listen(timeout, phrase_time_limit, retries, energy_threshold, pause_threshold,
+                         phrase_threshold, dynamic_energy_threshold, calibration_duration)
+    if audio_data is None:
+        return
+
+    wav_data = audio_data.get_wav_data()
+    if not file_path.lower().endswith(".mp3"):
+        # Transcription providers accept WAV, so skip the lossy encode
+        with open(file_path, "wb") as f:
+            f.write(wav_data)
+        return
+
+    import pydub
+
+    audio_segment = pydub.AudioSegment.from_wav(BytesIO(wav_data))
+    audio_segment.export(file_path, format="mp3", bitrate="128k", parameters=["-ar", "22050", "-ac", "1"])
+
+def record_audio_buffer(timeout=10, phrase_time_limit=None, retries=3, energy_threshold=2000,
+                        pause_threshold=0.8, phrase_threshold=0.1, dynamic_energy_threshold=True,
+                        calibration_duration=0.1, sample_rate=16000):
+    """
+    Record audio from the microphone into an in-memory WAV buffer.
+
+    Unlike record_audio, nothing is written to disk and no MP3 encoding takes
+    place; the 16-bit PCM WAV bytes can be passed straight to transcribe_audio.
+
+    Args:
+    timeout, phrase_time_limit, retries, energy_threshold, pause_threshold, phrase_threshold,
+    dynamic_energy_threshold, calibration_duration: As for record_audio.
+    sample_rate (int): Sample rate of the returned WAV data. 16 kHz matches what Whisper-style models decode.
+
+    Returns:
+    BytesIO: The recorded WAV audio, named 'input.wav', or None if nothing was recorded.
+    """
+    audio_data = _listen(timeout, phrase_time_limit, retries, energy_threshold, pause_threshold,
+                         phrase_threshold, dynamic_energy_threshold, calibration_duration)
+    if audio_data is None:
+        return None
+
+    buffer = BytesIO(audio_data.get_wav_data(convert_rate=sample_rate, convert_width=2))
+    buffer.name = "input.wav"
+    return buffer
 
 def play_audio(file_path):
     """
-    Play an audio file using pygame.
+    Play an audio file or in-memory audio and wait for it to finish.
+
+    Uses the persistent output engine when Config.PERSISTENT_AUDIO_OUTPUT is
+    set, otherwise pygame.
     
     Args:
-    file_path (str): The path to the audio file to play.
+    file_path (str | bytes | BytesIO): The path to the audio file to play, or the encoded audio itself.
     """
+    if Config.PERSISTENT_AUDIO_OUTPUT:
+        try:
+            if isinstance(file_path, str):
+                with open(file_path, "rb") as f:
+                    audio = f.read()
+            elif isinstance(file_path, BytesIO):
+                audio = file_path.getvalue()
+            else:
+                audio = bytes(file_path)
+            engine = get_output_engine()
+            engine.play(audio)
+            engine.drain()
+        except Exception as e:
+            logging.error(f"Failed to play audio: {e}")
+        return
+
+    import pygame
+
+    if isinstance(file_path, (bytes, bytearray, memoryview)):
+        file_path = BytesIO(file_path)
     try:
         pygame.mixer.init()
         pygame.mixer.music.load(file_path)
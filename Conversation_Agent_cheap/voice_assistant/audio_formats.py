@@ -0,0 +1,261 @@
+# voice_assistant/audio_formats.py
+
+import logging
+import struct
+
+import numpy as np
+
+from voice_assistant.config import Config
+from voice_assistant.providers import PROVIDERS
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+# TTS providers declare the formats they return (Provider.formats) as format kinds:
+#   'pcm'   raw PCM16 mono, negotiated as 'pcm_<sample rate>'
+#   'wav'   PCM16 in a WAV container
+#   'opus'  Opus in an Ogg container
+#   'mp3'
+
+# Self-describing formats, for audio that is saved or played without being told its format
+CONTAINER_FORMATS = ('wav', 'mp3')
+
+
+def negotiate_speech_format(model, accepted=None, sample_rate=None):
+    """
+    Pick the cheapest format a TTS model returns that the consumer of its audio accepts.
+
+    Args:
+    model (str): The TTS model name.
+    accepted (list): Format kinds the consumer accepts, most preferred first; defaults to Config.PLAYBACK_FORMATS.
+    sample_rate (int): The consumer's sample rate, used to pick the raw PCM rate; defaults to
+        Config.AUDIO_OUTPUT_SAMPLE_RATE.
+
+    Returns:
+    str: 'pcm_<rate>', 'wav', 'opus' or 'mp3'. If nothing is in common, the model's
+        first container format, which the playback engine can always decode.
+    """
+    accepted = Config.PLAYBACK_FORMATS if accepted is None else accepted
+    sample_rate = sample_rate or Config.AUDIO_OUTPUT_SAMPLE_RATE
+    provider = PROVIDERS['tts'].get(model)
+    offered = provider.formats if provider else ('wav',)
+    for kind in accepted:
+        if kind not in offered:
+            continue
+        if kind == 'pcm':
+            return f"pcm_{closest_sample_rate(provider.pcm_sample_rates, sample_rate)}"
+        return kind
+    return next(kind for kind in offered if kind != 'pcm')
+
+
+def closest_sample_rate(rates, sample_rate):
+    """
+    Return sample_rate if it is one of rates (or rates is None), else the nearest rate at or above it, else the highest.
+    """
+    if rates is None or sample_rate in rates:
+        return sample_rate
+    higher = [rate for rate in rates if rate > sample_rate]
+    return min(higher) if higher else max(rates)
+
+
+def pcm_sample_rate(speech_format):
+    """
+    Return the sample rate of a 'pcm_<rate>' format, or None for other formats.
+    """
+    if speech_format and speech_format.startswith("pcm_"):
+        return int(speech_format[4:])
+    return None
+
+
+class Resampler:
+    """
+    Streaming PCM16 mono sample rate converter.
+
+    Uses soxr when it is installed and falls back to linear interpolation in
+    numpy, which is cheaper but lets some aliasing through when
+    downsampling. State carries across chunks, so a stream can be converted
+    piece by piece as it arrives.
+
+    Args:
+    from_rate (int): Input sample rate in Hz.
+    to_rate (int): Output sample rate in Hz.
+    """
+
+    def __init__(self, from_rate, to_rate):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self._stream = soxr.ResampleStream(from_rate, to_rate, 1, dtype="int16") if soxr else None
+        self._step = from_rate / to_rate
+        self._position = 0.0
+        self._last = None
+
+    def process(self, samples, last=False):
+        """
+        Convert the next chunk of samples.
+
+        Args:
+        samples (np.ndarray): int16 samples at from_rate.
+        last (bool): Whether this is the end of the stream.
+
+        Returns:
+        np.ndarray: int16 samples at to_rate.
+        """
+        if self.from_rate == self.to_rate:
+            return samples
+        if self._stream is not None:
+            return self._stream.resample_chunk(samples, last=last)
+        if samples.size == 0:
+            return samples
+        values = samples.astype(np.float32)
+        if self._last is not None:
+            values = np.concatenate(([self._last], values))
+        # Output positions in input samples; each needs the input sample after it to interpolate
+        positions = np.arange(self._position, len(values) - 1, self._step)
+        output = np.interp(positions, np.arange(len(values)), values)
+        next_position = positions[-1] + self._step if positions.size else self._position
+        # The last input sample becomes index 0 of the next chunk
+        self._position = next_position - (len(values) - 1)
+        self._last = values[-1]
+        return np.round(output).astype(np.int16)
+
+
+class WavStreamParser:
+    """
+    Incremental WAV reader that yields PCM16 mono samples as data arrives.
+
+    Handles streamed WAVs whose size fields are unknown (see
+    local_tts_api.streaming_wav_header) and any extra chunks before 'data'.
+
+    Attributes:
+        sample_rate (int): The WAV's sample rate, once the header has been read.
+        supported (bool): False if the audio is not a 16-bit PCM WAV; None until the header has been read.
+        header (bytes): The bytes fed before the header was read, to hand to another decoder if unsupported.
+    """
+
+    def __init__(self):
+        self.sample_rate = None
+        self.supported = None
+        self.channels = 1
+        self._header = bytearray()
+        self._remainder = b""
+
+    def feed(self, data):
+        """
+        Feed bytes of the WAV stream.
+
+        Returns:
+        np.ndarray: The int16 mono samples completed by this data; empty while the header is incomplete.
+        """
+        if self.supported is None:
+            self._header.extend(data)
+            data = self._parse_header()
+            if data is None:
+                return np.zeros(0, dtype=np.int16)
+        data = self._remainder + data
+        frame_bytes = 2 * self.channels
+        usable = len(data) - len(data) % frame_bytes
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=np.int16)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1).astype(np.int16)
+        return samples
+
+    @property
+    def header(self):
+        return bytes(self._header)
+
+    def _parse_header(self):
+        header = bytes(self._header)
+        if len(header) < 12:
+            return None
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            self.supported = False
+            return b""
+        offset = 12
+        while len(header) >= offset + 8:
+            chunk_id, size = header[offset:offset + 4], struct.unpack("<I", header[offset + 4:offset + 8])[0]
+            if chunk_id == b"data":
+                self.supported = self.sample_rate is not None
+                return header[offset + 8:]
+            if len(header) < offset + 8 + size:
+                return None
+            if chunk_id == b"fmt ":
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", header[offset + 8:offset + 24])
+                if audio_format not in (1, 0xFFFE) or bits != 16:
+                    logging.warning(f"WAV audio is not 16-bit PCM (format {audio_format}, {bits} bits)")
+                    self.supported = False
+                    return b""
+                self.channels = channels
+                self.sample_rate = sample_rate
+            offset += 8 + size + size % 2
+        return None
+
+
+def source_speech_format(model, speech_format):
+    """
+    Return the format to request from a TTS model so its audio can be delivered as speech_format.
+
+    That is speech_format itself if the model returns it, or WAV for a raw
+    PCM format the model can't produce at that rate (see PcmConverter).
+
+    Args:
+    model (str): The TTS model name.
+    speech_format (str): The format the audio's consumer expects, from negotiate_speech_format.
+
+    Returns:
+    str: The format to request, or None if the model can't serve speech_format.
+    """
+    provider = PROVIDERS['tts'].get(model)
+    offered = provider.formats if provider else ('wav',)
+    sample_rate = pcm_sample_rate(speech_format)
+    if sample_rate is None:
+        return speech_format if speech_format in offered else None
+    if 'pcm' in offered and closest_sample_rate(provider.pcm_sample_rates, sample_rate) == sample_rate:
+        return speech_format
+    return 'wav' if 'wav' in offered else None
+
+
+class PcmConverter:
+    """
+    Streaming converter from a PCM16 WAV to raw PCM16 mono at a given sample rate.
+
+    Lets a TTS model that only returns WAV stand in for one whose raw PCM the
+    consumer was already told to expect.
+
+    Args:
+    sample_rate (int): The output sample rate in Hz.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self._wav = WavStreamParser()
+        self._resampler = None
+
+    def feed(self, data):
+        """
+        Convert the next bytes of the WAV.
+
+        Returns:
+        bytes: The raw PCM completed by this data.
+
+        Raises:
+        ValueError: If the audio is not a 16-bit PCM WAV.
+        """
+        samples = self._wav.feed(data)
+        if self._wav.supported is False:
+            raise ValueError("Only 16-bit PCM WAV audio can be converted to raw PCM")
+        if not self._wav.supported:
+            return b""
+        if self._resampler is None:
+            self._resampler = Resampler(self._wav.sample_rate, self.sample_rate)
+        return self._resampler.process(samples).tobytes()
+
+    def flush(self):
+        """
+        Return the PCM still held by the resampler at the end of the stream.
+        """
+        if self._resampler is None:
+            return b""
+        return self._resampler.process(np.zeros(0, dtype=np.int16), last=True).tobytes()
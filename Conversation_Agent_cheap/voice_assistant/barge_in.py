@@ -0,0 +1,96 @@
+# voice_assistant/barge_in.py
+
+import logging
+import threading
+
+from voice_assistant.config import Config
+from voice_assistant.vad import Endpointer, VoiceActivityDetector, get_microphone_stream, get_voice_activity_detector
+
+
+class BargeInMonitor:
+    """
+    Watch the open microphone while the assistant speaks and fire a callback when the user talks over it.
+
+    Detection uses a stricter margin and a longer minimum speech run than
+    normal endpointing, because the microphone also hears the assistant's own
+    playback (a headset avoids most of that echo). Once triggered, the monitor
+    stops reading so the rest of the user's utterance stays queued on the
+    microphone, and endpointer holds the speech captured so far; pass it to
+    record_utterance to continue the same utterance.
+
+    Attributes:
+        triggered (threading.Event): Set once barge-in has been detected.
+        endpointer (Endpointer): The endpointer that detected the user's speech.
+    """
+
+    def __init__(self):
+        self.triggered = threading.Event()
+        self.endpointer = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, on_barge_in):
+        """
+        Start monitoring in a background thread.
+
+        Args:
+        on_barge_in (callable): Called once, from the monitor thread, when the user starts speaking.
+        """
+        microphone = get_microphone_stream()
+        detector = VoiceActivityDetector(margin_db=Config.BARGE_IN_MARGIN_DB)
+        detector.noise_floor_db = get_voice_activity_detector().noise_floor_db
+        self.endpointer = Endpointer(detector, microphone.frame_ms, start_ms=Config.BARGE_IN_MIN_SPEECH_MS)
+        self.triggered.clear()
+        self._stopped.clear()
+        microphone.clear()
+        self._thread = threading.Thread(target=self._run, args=(microphone, on_barge_in), daemon=True)
+        self._thread.start()
+
+    def _run(self, microphone, on_barge_in):
+        while not self._stopped.is_set():
+            frame = microphone.read(timeout=0.1)
+            if frame is None:
+                continue
+            self.endpointer.process(frame)
+            if self.endpointer.in_speech:
+                logging.info("Barge-in detected; interrupting playback")
+                # Hand the rest of the utterance to normal endpointing
+                self.endpointer.detector = get_voice_activity_detector()
+                self.triggered.set()
+                on_barge_in()
+                return
+
+    def stop(self):
+        """
+        Stop monitoring and wait for the monitor thread to exit.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def spoken_prefix(segments, played_bytes):
+    """
+    Reconstruct the text the user actually heard before an interruption.
+
+    Args:
+    segments (list): (text, start_offset, end_offset) for each chunk written to the
+        output engine, with offsets in bytes of PCM written to its buffer since the turn started.
+    played_bytes (int): Bytes of PCM the engine had played since the turn started when it was stopped.
+
+    Returns:
+    str: Fully played chunks, plus the words of the interrupted chunk in proportion to how much of it played.
+    """
+    spoken = []
+    for text, start, end in segments:
+        if played_bytes >= end:
+            spoken.append(text)
+            continue
+        if played_bytes > start and end > start:
+            words = text.split()
+            heard = int(len(words) * (played_bytes - start) / (end - start))
+            if heard:
+                spoken.append(" ".join(words[:heard]) + "...")
+        break
+    return " ".join(spoken)
@@ -0,0 +1,136 @@
+# voice_assistant/chat_history.py
+
+import logging
+import threading
+
+from voice_assistant.config import Config
+from voice_assistant.response_generation import stream_response_deltas
+
+SUMMARY_PROMPT = (
+    "You maintain the memory of a voice assistant's conversation. Merge the earlier summary and the new "
+    "exchanges below into one short factual summary of what the user asked, what was answered and any "
+    "details they gave (names, quantities, items). Reply with the summary only."
+)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count of a text; about four characters per token for English.
+    """
+    return len(text) // 4 + 1
+
+
+class ChatHistory:
+    """
+    Token-budgeted chat history with rolling summarization of older turns.
+
+    The messages sent to the LLM are laid out so their prefix stays identical
+    from turn to turn, letting provider-side prompt caching (OpenAI, Groq) and
+    Ollama's KV cache reuse it:
+
+        system prompt | summary of older turns (if any) | recent turns verbatim
+
+    When the turns after the system prompt exceed Config.HISTORY_MAX_TOKENS, the
+    oldest ones are folded into the summary in the background until the
+    history is down to Config.HISTORY_COMPACT_TO of the budget. Compacting in
+    one batch rather than a turn at a time means the summary, and with it the
+    cached prefix, changes only every few turns. If summarization fails, the
+    oldest turns are dropped instead.
+
+    Args:
+    system_prompt (str): The system prompt, sent unchanged at the start of every request.
+    summary_model (str): The model used for summarization; defaults to Config.RESPONSE_MODEL.
+    summary_api_key (str): The API key for the summary model.
+    """
+
+    def __init__(self, system_prompt, summary_model=None, summary_api_key=None):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.summary_model = summary_model or Config.RESPONSE_MODEL
+        self.summary_api_key = summary_api_key
+        self.summary = ""
+        self.turns = []
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    def messages(self):
+        """
+        Return the messages to send to the LLM.
+
+        Returns:
+        list: The chat history as a list of messages.
+        """
+        with self._lock:
+            messages = [self.system_message]
+            if self.summary:
+                messages.append({"role": "system", "content": f"Summary of the conversation so far: {self.summary}"})
+            return messages + list(self.turns)
+
+    def add_user(self, text):
+        with self._lock:
+            self.turns.append({"role": "user", "content": text})
+
+    def add_assistant(self, text):
+        """
+        Record the assistant's reply, completing a turn, and compact the history if it is over budget.
+        """
+        with self._lock:
+            self.turns.append({"role": "assistant", "content": text})
+        self._maybe_compact()
+
+    def token_count(self):
+        """
+        Estimated tokens of the summary and turns, excluding the system prompt.
+        """
+        with self._lock:
+            return self._token_count(self.turns)
+
+    def _token_count(self, turns):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(message["content"]) for message in turns)
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compacting or self._token_count(self.turns) <= Config.HISTORY_MAX_TOKENS:
+                return
+            target = Config.HISTORY_MAX_TOKENS * Config.HISTORY_COMPACT_TO
+            # Fold whole exchanges, oldest first. An exchange starts at a user message; turns don't strictly
+            # alternate (a barge-in or a failed turn leaves no assistant reply), so the split is moved from one
+            # user message to the next rather than by two positions
+            starts = [index for index, message in enumerate(self.turns) if message["role"] == "user"]
+            split = 0
+            for position, start in enumerate(starts):
+                if start == 0:
+                    continue
+                if (len(starts) - position < Config.HISTORY_MIN_RECENT_TURNS
+                        or self._token_count(self.turns[split:]) <= target):
+                    break
+                split = start
+            if split == 0:
+                return
+            old_turns = self.turns[:split]
+            self._compacting = True
+        if Config.HISTORY_SUMMARIZE:
+            threading.Thread(target=self._compact, args=(old_turns,), daemon=True).start()
+        else:
+            self._apply_compaction(old_turns, self.summary)
+
+    def _compact(self, old_turns):
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in old_turns)
+        request = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Earlier summary: {self.summary or '(none)'}\n\nNew exchanges:\n{transcript}"},
+        ]
+        try:
+            summary = "".join(stream_response_deltas(self.summary_model, self.summary_api_key, request)).strip()
+        except Exception as e:
+            logging.warning(f"Failed to summarize chat history, dropping the oldest turns instead: {e}")
+            summary = self.summary
+        self._apply_compaction(old_turns, summary)
+
+    def _apply_compaction(self, old_turns, summary):
+        with self._lock:
+            # Turns were only appended since the compaction started, so the old ones are still at the front
+            del self.turns[:len(old_turns)]
+            self.summary = summary
+            self._compacting = False
+            tokens = self._token_count(self.turns)
+        logging.info(f"Compacted {len(old_turns)} chat messages; history is now about {tokens} tokens")
@@ -0,0 +1,444 @@
+# voice_assistant/clients.py
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import httpx
+import requests
+
+from voice_assistant.config import Config
+
+# One client per (provider, api_key), shared by transcription, response generation and TTS
+_clients = {}
+_sessions = {}
+_async_clients = {}
+_async_sessions = {}
+_transports = {}
+_lock = threading.Lock()
+
+_stats = defaultdict(lambda: {
+    "clients_created": 0,
+    "client_reuses": 0,
+    "requests": 0,
+    "errors": 0,
+    "request_seconds": 0.0,
+})
+
+
+# time.monotonic() by which the current request must finish, set by voice_assistant.resilience per attempt
+_request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(deadline):
+    """
+    Cap the timeout of every request the pooled clients send in this context (thread or task) at a deadline.
+
+    The cap is applied when a request is sent, to the connect timeout and to
+    each read, so a stream that has started may run past the deadline as long
+    as it keeps producing data.
+
+    Args:
+    deadline (float): A time.monotonic() value, or None for no cap.
+    """
+    token = _request_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def _remaining_time():
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    # Never 0, which httpx and requests would reject or treat as 'no timeout'
+    return max(0.001, deadline - time.monotonic())
+
+
+def _cap_httpx_timeout(request):
+    remaining = _remaining_time()
+    if remaining is not None:
+        timeout = request.extensions.get("timeout", {})
+        request.extensions["timeout"] = {
+            kind: remaining if timeout.get(kind) is None else min(timeout[kind], remaining)
+            for kind in ("connect", "read", "write", "pool")
+        }
+
+
+class _DeadlineAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter that counts requests under a provider and caps their timeout at the request_deadline of their context.
+    """
+
+    def __init__(self, provider, **kwargs):
+        self.provider = provider
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        remaining = _remaining_time()
+        if remaining is not None:
+            if timeout is None:
+                timeout = remaining
+            elif isinstance(timeout, tuple):
+                timeout = tuple(remaining if part is None else min(part, remaining) for part in timeout)
+            else:
+                timeout = min(timeout, remaining)
+        start = time.monotonic()
+        try:
+            response = super().send(request, timeout=timeout, **kwargs)
+        except Exception:
+            # Connection errors and timeouts count as failed requests too
+            _record_request(self.provider, time.monotonic() - start, True)
+            raise
+        _record_request(self.provider, time.monotonic() - start, response.status_code >= 400)
+        return response
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=Config.HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.HTTP_POOL_MAX_CONNECTIONS,
+        keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class _PooledTransport(httpx.BaseTransport):
+    """
+    Keep-alive httpx transport whose requests are counted under a provider and capped at the request_deadline.
+
+    Counting here rather than in event hooks also catches requests that fail
+    without a response (connection errors, timeouts). Closing it is a no-op
+    so it can be handed to SDKs that build a client per request and close it
+    afterwards (Deepgram); close_clients closes the connection pool.
+
+    Args:
+    provider (str): The provider its requests are counted under.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._transport = httpx.HTTPTransport(limits=_pool_limits())
+
+    def handle_request(self, request):
+        _cap_httpx_timeout(request)
+        start = time.monotonic()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            _record_request(self.provider, time.monotonic() - start, True)
+            raise
+        _record_request(self.provider, time.monotonic() - start, response.status_code >= 400)
+        return response
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        self._transport.close()
+
+
+class _AsyncPooledTransport(httpx.AsyncBaseTransport):
+    """
+    Async counterpart of _PooledTransport.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._transport = httpx.AsyncHTTPTransport(limits=_pool_limits())
+
+    async def handle_async_request(self, request):
+        _cap_httpx_timeout(request)
+        start = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            _record_request(self.provider, time.monotonic() - start, True)
+            raise
+        _record_request(self.provider, time.monotonic() - start, response.status_code >= 400)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _record_request(provider, elapsed, failed):
+    # Event hooks run on every thread that makes a request
+    with _lock:
+        stats = _stats[provider]
+        stats["requests"] += 1
+        stats["request_seconds"] += elapsed
+        if failed:
+            stats["errors"] += 1
+
+
+def get_transport(provider):
+    """
+    Return the process-wide keep-alive httpx transport of a provider, creating it on first use.
+
+    Pass it to SDKs that take a transport rather than a client (Deepgram's
+    transport= keyword), so their requests reuse connections and are counted.
+
+    Args:
+    provider (str): The provider its requests are counted under.
+
+    Returns:
+    httpx.BaseTransport: The shared transport.
+    """
+    with _lock:
+        transport = _transports.get(provider)
+        if transport is None:
+            transport = _transports[provider] = _PooledTransport(provider)
+        return transport
+
+
+def _http_client(provider):
+    """
+    Build a keep-alive httpx client whose requests are counted under the given provider.
+    """
+    return httpx.Client(transport=get_transport(provider), timeout=httpx.Timeout(Config.HTTP_TIMEOUT, connect=5.0))
+
+
+def _async_http_client(provider):
+    """
+    Build a keep-alive httpx async client whose requests are counted under the given provider.
+    """
+    return httpx.AsyncClient(transport=_AsyncPooledTransport(provider),
+                             timeout=httpx.Timeout(Config.HTTP_TIMEOUT, connect=5.0))
+
+
+def _create_openai(api_key):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=Config.OPENAI_BASE_URL, http_client=_http_client("openai"))
+
+
+def _create_groq(api_key):
+    from groq import Groq
+    return Groq(api_key=api_key, base_url=Config.GROQ_BASE_URL, http_client=_http_client("groq"))
+
+
+def _create_deepgram(api_key):
+    # The SDK builds an httpx client per request; callers pass get_transport('deepgram') to pool and count them
+    from deepgram import DeepgramClient
+    return DeepgramClient(api_key)
+
+
+def _create_elevenlabs(api_key):
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=api_key, httpx_client=_http_client("elevenlabs"))
+
+
+def _create_cartesia(api_key):
+    from cartesia import Cartesia
+    http_client = _http_client("cartesia")
+    try:
+        return Cartesia(api_key=api_key, http_client=http_client)
+    except TypeError:
+        # cartesia < 3 calls it httpx_client
+        return Cartesia(api_key=api_key, httpx_client=http_client)
+
+
+def _create_ollama(api_key):
+    from ollama import Client
+    # Extra arguments go to the underlying httpx client
+    return Client(transport=get_transport("ollama"))
+
+
+_CLIENT_FACTORIES = {
+    "openai": _create_openai,
+    "groq": _create_groq,
+    "deepgram": _create_deepgram,
+    "elevenlabs": _create_elevenlabs,
+    "cartesia": _create_cartesia,
+    "ollama": _create_ollama,
+}
+
+
+def _create_async_openai(api_key):
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, base_url=Config.OPENAI_BASE_URL, http_client=_async_http_client("openai"))
+
+
+def _create_async_groq(api_key):
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=api_key, base_url=Config.GROQ_BASE_URL, http_client=_async_http_client("groq"))
+
+
+def _create_async_ollama(api_key):
+    from ollama import AsyncClient
+    return AsyncClient(transport=_AsyncPooledTransport("ollama"))
+
+
+_ASYNC_CLIENT_FACTORIES = {
+    "openai": _create_async_openai,
+    "groq": _create_async_groq,
+    "ollama": _create_async_ollama,
+}
+
+
+def get_client(provider, api_key):
+    """
+    Return the process-wide SDK client for a provider and API key, creating it on first use.
+
+    Args:
+    provider (str): The provider name ('openai', 'groq', 'deepgram', 'elevenlabs', 'cartesia', 'ollama').
+    api_key (str): The API key the client authenticates with.
+
+    Returns:
+    object: The provider's SDK client.
+    """
+    if provider not in _CLIENT_FACTORIES:
+        raise ValueError(f"No client factory for provider '{provider}'")
+    return _get_or_create(_clients, (provider, api_key), lambda: _CLIENT_FACTORIES[provider](api_key), "")
+
+
+def _get_or_create(clients, key, create, kind):
+    """
+    Return clients[key], creating it with create() on first use.
+
+    The client is built outside _lock, since a first use imports the SDK and
+    the request counters take the same lock; if another thread stored one in
+    the meantime, that one is kept.
+    """
+    provider = key[0]
+    with _lock:
+        client = clients.get(key)
+        if client is not None:
+            _stats[provider]["client_reuses"] += 1
+            return client
+    client = create()
+    with _lock:
+        existing = clients.get(key)
+        if existing is None:
+            clients[key] = client
+            _stats[provider]["clients_created"] += 1
+        else:
+            _stats[provider]["client_reuses"] += 1
+    if existing is not None:
+        # The spare is dropped unused; it has not opened any connections
+        return existing
+    logging.info(f"Created pooled {kind}{provider} client")
+    return client
+
+
+def get_session(provider):
+    """
+    Return a keep-alive requests session for a plain HTTP backend (fastwhisperapi, melotts, piper).
+
+    Args:
+    provider (str): The backend name used to key the session and its stats.
+
+    Returns:
+    requests.Session: The shared session.
+    """
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = _DeadlineAdapter(provider, pool_maxsize=Config.HTTP_POOL_MAX_CONNECTIONS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[provider] = session
+            _stats[provider]["clients_created"] += 1
+        else:
+            _stats[provider]["client_reuses"] += 1
+    return session
+
+
+def get_async_client(provider, api_key):
+    """
+    Return the process-wide async SDK client for a provider and API key, creating it on first use.
+
+    Async clients share the connection statistics of their synchronous counterparts.
+
+    Args:
+    provider (str): The provider name ('openai', 'groq', 'ollama').
+    api_key (str): The API key the client authenticates with.
+
+    Returns:
+    object: The provider's async SDK client.
+    """
+    if provider not in _ASYNC_CLIENT_FACTORIES:
+        raise ValueError(f"No async client factory for provider '{provider}'")
+    return _get_or_create(_async_clients, (provider, api_key), lambda: _ASYNC_CLIENT_FACTORIES[provider](api_key),
+                          "async ")
+
+
+def get_async_session(provider):
+    """
+    Return a keep-alive httpx async client for a plain HTTP backend (fastwhisperapi, melotts, piper).
+
+    Args:
+    provider (str): The backend name used to key the client and its stats.
+
+    Returns:
+    httpx.AsyncClient: The shared client.
+    """
+    with _lock:
+        session = _async_sessions.get(provider)
+        if session is None:
+            session = _async_http_client(provider)
+            _async_sessions[provider] = session
+            _stats[provider]["clients_created"] += 1
+        else:
+            _stats[provider]["client_reuses"] += 1
+    return session
+
+
+def get_client_stats():
+    """
+    Return per-provider connection statistics.
+
+    Returns:
+    dict: Provider name mapped to counts of clients created and reused, requests,
+    errors (HTTP status >= 400, connection errors and timeouts), and the mean request latency in seconds.
+    """
+    with _lock:
+        snapshot = {}
+        for provider, stats in _stats.items():
+            snapshot[provider] = dict(stats)
+            requests_made = stats["requests"]
+            snapshot[provider]["mean_request_seconds"] = (
+                stats["request_seconds"] / requests_made if requests_made else 0.0
+            )
+        return snapshot
+
+
+def close_clients():
+    """
+    Close all pooled clients and sessions.
+    """
+    with _lock:
+        for client in list(_clients.values()) + list(_sessions.values()):
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logging.warning(f"Failed to close client: {e}")
+        for transport in _transports.values():
+            transport.close_pool()
+        _clients.clear()
+        _sessions.clear()
+        _transports.clear()
+
+
+async def close_async_clients():
+    """
+    Close all pooled async clients and sessions.
+    """
+    with _lock:
+        clients = list(_async_clients.values()) + list(_async_sessions.values())
+        _async_clients.clear()
+        _async_sessions.clear()
+    for client in clients:
+        close = getattr(client, "aclose", None) or getattr(client, "close", None)
+        if callable(close):
+            try:
+                await close()
+            except Exception as e:
+                logging.warning(f"Failed to close async client: {e}")
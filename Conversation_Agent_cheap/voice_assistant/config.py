@@ -19,11 +19,165 @@ class Config:
         DEEPGRAM_API_KEY (str): API key for Deepgram services.
         ELEVENLABS_API_KEY (str): API key for ElevenLabs services.
         LOCAL_MODEL_PATH (str): Path to the local model.
+        STREAMING_PIPELINE (bool): Whether to overlap response generation, TTS and playback.
+        IN_MEMORY_AUDIO (bool): Whether to keep recorded and synthesized audio in memory instead of temp files.
     """
-    # Model selection
-    TRANSCRIPTION_MODEL = 'groq'  # possible values: openai, groq, deepgram, fastwhisperapi
-    RESPONSE_MODEL = 'groq'  # possible values: openai, groq, ollama
-    TTS_MODEL = 'cartesia'  # possible values: openai, deepgram, elevenlabs, melotts, cartesia, piper
+    # Model selection; the providers and their capabilities are registered in voice_assistant/providers.py.
+    # 'auto' picks the fastest provider whose API key (or server URL) is set and whose SDK is installed
+    TRANSCRIPTION_MODEL = 'groq'  # possible values: openai, groq, deepgram, fastwhisperapi, local, auto
+    RESPONSE_MODEL = 'groq'  # possible values: openai, groq, ollama, local, auto
+    TTS_MODEL = 'cartesia'  # possible values: openai, deepgram, elevenlabs, melotts, cartesia, piper, auto
+
+    # Stream LLM tokens sentence by sentence into TTS and playback instead of
+    # running each stage to completion before starting the next
+    STREAMING_PIPELINE = True
+
+    # Run the assistant on an asyncio event loop with async provider clients (see voice_assistant/async_pipeline.py).
+    # Plays through the persistent audio output engine
+    ASYNC_CORE = False
+    ASYNC_AUDIO_THREADS = 2  # dedicated threads for microphone and speaker I/O
+
+    # Multi-session WebSocket gateway (gateway_server.py)
+    GATEWAY_PORT = 8765
+    GATEWAY_MAX_SESSIONS = 50  # further connections are refused with close code 1013
+    GATEWAY_MAX_CONCURRENT_TURNS = 16  # turns processed at once across all sessions
+    GATEWAY_SEND_QUEUE_SIZE = 32  # messages buffered per session before its synthesis waits for the client
+    GATEWAY_MAX_PENDING_UTTERANCES = 2  # per session; further utterances are dropped until a turn finishes
+    GATEWAY_AUDIO_FORMATS = ['opus', 'pcm', 'mp3', 'wav']  # default for clients that don't say; Opus is smallest on the wire
+    GATEWAY_AUDIO_SAMPLE_RATE = 24000
+
+    # Pass recorded and synthesized audio between stages as in-memory buffers
+    # instead of the INPUT_AUDIO / output.mp3 temp files
+    IN_MEMORY_AUDIO = True
+
+    # Client-side voice activity detection and endpointing (see voice_assistant/vad.py)
+    VAD_ENDPOINTING = True
+    VAD_SAMPLE_RATE = 16000
+    VAD_FRAME_MS = 20
+    VAD_MARGIN_DB = 12  # level above the noise floor that counts as speech
+    VAD_MIN_SPEECH_DB = 35  # absolute level (PCM16 dB) below which nothing is speech
+    VAD_MAX_ZCR = 0.35
+    VAD_NOISE_ADAPT_RATE = 0.05
+    VAD_START_MS = 60  # consecutive speech needed to start an utterance
+    VAD_END_SILENCE_MS = 400  # silence that ends an utterance
+    VAD_PREROLL_MS = 200
+    VAD_MAX_UTTERANCE_MS = 30000
+
+    # Speculative response generation (see voice_assistant/speculation.py): once the user pauses for
+    # SPECULATION_PAUSE_MS the speech so far is transcribed and the LLM starts on it. The reply is kept
+    # if the final transcript differs by at most SPECULATION_MAX_EDIT_DISTANCE (fraction of words changed).
+    # Needs VAD_ENDPOINTING and STREAMING_PIPELINE; each speculation costs one extra (paid) transcription,
+    # so pauses are only transcribed after enough new speech and at most a few times per utterance
+    SPECULATIVE_RESPONSE = True
+    SPECULATION_PAUSE_MS = 150  # must be shorter than VAD_END_SILENCE_MS
+    SPECULATION_MAX_EDIT_DISTANCE = 0.1
+    SPECULATION_MAX_PER_UTTERANCE = 2  # partial transcriptions per utterance
+    SPECULATION_MIN_NEW_SPEECH_MS = 700  # speech since the last partial transcription (or the start) before another
+
+    # Barge-in: interrupt playback when the user talks over the assistant (see voice_assistant/barge_in.py).
+    # Needs VAD_ENDPOINTING and PERSISTENT_AUDIO_OUTPUT; works best with a headset since there is no echo cancellation
+    BARGE_IN = True
+    BARGE_IN_MARGIN_DB = 20
+    BARGE_IN_MIN_SPEECH_MS = 200
+
+    # Persistent streaming audio output (see voice_assistant/playback.py)
+    PERSISTENT_AUDIO_OUTPUT = True
+    AUDIO_OUTPUT_SAMPLE_RATE = 24000
+    AUDIO_OUTPUT_BLOCKSIZE = 480  # frames per device callback (20 ms at 24 kHz)
+    AUDIO_PREBUFFER_MS = 150  # audio to buffer before playback starts
+    # Formats requested from TTS models for playback, cheapest to handle first (see voice_assistant/audio_formats.py).
+    # Raw PCM at the output rate goes straight to the device; WAV and other PCM rates are resampled in-process
+    # (with soxr if installed); Opus and MP3 need an ffmpeg decoder
+    PLAYBACK_FORMATS = ['pcm', 'wav', 'opus', 'mp3']
+
+    # Voice used by each TTS model
+    TTS_VOICES = {
+        'openai': 'nova',
+        'deepgram': 'aura-arcas-en',
+        'elevenlabs': 'Paul J.',
+        'cartesia': 'a0e99841-438c-4a64-b679-ae501e7d6091',
+        'melotts': 'EN-US',
+        'piper': 'en_US-lessac-medium',
+    }
+
+    # Synthesize the sentences of a reply concurrently and play them in order as each is ready
+    # (see voice_assistant/parallel_tts.py); long replies then take about as long as their longest sentences
+    PARALLEL_TTS = True
+    TTS_WORKERS = 4  # sentences synthesized at once, across all turns and sessions
+    # Per-provider limits below the worker count; providers' own max_concurrency (voice_assistant/providers.py) also applies
+    TTS_CONCURRENCY_LIMITS = {'elevenlabs': 2}
+    TTS_REQUESTS_PER_MINUTE = {'openai': 50}
+
+    # Content-addressed cache of synthesized speech (see voice_assistant/tts_cache.py)
+    TTS_CACHE = True
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+    TTS_CACHE_MAX_DISK_BYTES = 200 * 1024 * 1024
+    TTS_CACHE_MAX_MEMORY_ENTRIES = 256
+
+    # Token-budgeted chat history (see voice_assistant/chat_history.py)
+    HISTORY_MAX_TOKENS = 2000  # budget for the summary and recent turns; the system prompt is not counted
+    HISTORY_COMPACT_TO = 0.5  # fraction of the budget left after older turns are folded into the summary
+    HISTORY_MIN_RECENT_TURNS = 2  # exchanges always kept verbatim
+    HISTORY_SUMMARIZE = True  # summarize folded turns with the response model; if False they are dropped
+
+    # Answer direct inventory lookups from a local data file instead of the LLM (see voice_assistant/knowledge_base.py).
+    # The same data is written into the system prompt (see voice_assistant/prompts.py) for the LLM's open-ended answers
+    LOCAL_KNOWLEDGE_BASE = True
+    INVENTORY_DATA_PATH = os.getenv(
+        "INVENTORY_DATA_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "inventory.json"))
+
+    # Speakable chunk sizes for streamed responses (see voice_assistant/text_chunking.py)
+    CHUNK_MIN_CHARS = 12
+    CHUNK_FIRST_CLAUSE_MIN_CHARS = 24
+    CHUNK_CLAUSE_MIN_CHARS = 80
+    CHUNK_MAX_CHARS = 220
+
+    # Pooled HTTP clients shared by all stages (see voice_assistant/clients.py)
+    HTTP_POOL_MAX_CONNECTIONS = 10
+    HTTP_KEEPALIVE_EXPIRY = 120  # seconds an idle connection is kept open
+    HTTP_TIMEOUT = 30  # seconds
+
+    # Hedged requests (see voice_assistant/hedging.py): if the primary provider has not answered
+    # within its recent p95 latency, the next provider listed for the stage is started as well and
+    # the first answer wins. TTS alternates change the voice mid-reply, so that list is empty by default.
+    HEDGING = False
+    HEDGE_PROVIDERS = {
+        'transcription': ['groq', 'openai'],
+        'response': ['groq', 'openai'],
+        'tts': [],
+    }
+    HEDGE_RACE_STT = False  # start the first two transcription providers together instead of hedging
+    HEDGE_QUANTILE = 0.95
+    HEDGE_MIN_SAMPLES = 20  # latency samples per provider before the deadline is derived from them
+    HEDGE_DEFAULT_DEADLINES = {'transcription': 1.5, 'response': 1.0, 'tts': 0.8}  # seconds
+    HEDGE_MIN_DEADLINE = 0.2  # seconds
+
+    # Circuit breakers, retries and failover (see voice_assistant/resilience.py). A provider that fails
+    # BREAKER_FAILURE_THRESHOLD times in a row is skipped for a cooldown, so a brownout costs one fast
+    # rejection per request instead of a timeout; requests then go to the first viable FAILOVER_PROVIDERS entry
+    RESILIENCE = True
+    BREAKER_FAILURE_THRESHOLD = 3  # consecutive failures that open a provider's breaker
+    BREAKER_COOLDOWN = 5.0  # seconds before the first probe request; doubles each time a probe fails
+    BREAKER_MAX_COOLDOWN = 120.0
+    BREAKER_JITTER = 0.2  # fraction of each cooldown that is randomized
+    RETRY_MAX_ATTEMPTS = 2  # per provider and request, including the first
+    RETRY_BASE_DELAY = 0.1  # seconds before the first retry; doubles per retry, with full jitter
+    RETRY_MAX_DELAY = 1.0
+    # Seconds per request, to the first token or audio chunk when streamed: attempts time out at the deadline and
+    # no retry starts that would end later; failover providers still get one attempt, without the cap
+    RETRY_DEADLINES = {'transcription': 3.0, 'response': 3.0, 'tts': 2.0}
+    # Local backends tried in order when the selected provider fails; entries that aren't set up are skipped.
+    # TTS failover changes the voice for the affected sentences
+    FAILOVER_PROVIDERS = {
+        'transcription': ['local', 'fastwhisperapi'],
+        'response': ['ollama', 'local'],
+        'tts': ['piper', 'melotts'],
+    }
+
+    # Rough list prices in USD used for cost accounting; providers not listed are treated as free
+    STT_PRICE_PER_MINUTE = {'openai': 0.006, 'groq': 0.00185, 'deepgram': 0.0043}
+    LLM_PRICE_PER_MILLION_TOKENS = {'openai': (2.50, 10.00), 'groq': (0.05, 0.08)}  # (input, output)
+    TTS_PRICE_PER_MILLION_CHARS = {'openai': 15.00, 'deepgram': 15.00, 'elevenlabs': 180.00, 'cartesia': 50.00}
 
     # Piper Server configuration
     PIPER_SERVER_URL = os.getenv("PIPER_SERVER_URL")
@@ -34,6 +188,7 @@ class Config:
 
     # LLM Selection
     OLLAMA_LLM="llama3:8b"
+    OLLAMA_KEEP_ALIVE = "30m"  # keep the model and its KV cache loaded between turns
     GROQ_LLM="llama3-8b-8192"
     OPENAI_LLM="gpt-4o"
 
@@ -45,11 +200,48 @@ class Config:
     LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH")
     CARTESIA_API_KEY = os.getenv("CARTESIA_API_KEY")
 
+    # Endpoint overrides, e.g. to point the SDKs at a proxy or at the benchmark's mock providers
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+    FASTWHISPERAPI_URL = os.getenv("FASTWHISPERAPI_URL", "http://localhost:8000")
+
+    # In-process Whisper for TRANSCRIPTION_MODEL = 'local' (see voice_assistant/local_stt.py); needs faster-whisper
+    LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "base.en")  # model name or path to a converted model
+    LOCAL_STT_COMPUTE_TYPE = "int8"
+    LOCAL_STT_CPU_THREADS = 0  # threads per decode; 0 uses every core
+    LOCAL_STT_WORKERS = 1  # decodes that can run in parallel, e.g. for several gateway sessions
+    LOCAL_STT_BEAM_SIZE = 1  # greedy decoding; raise for accuracy at the cost of latency
+    LOCAL_STT_LANGUAGE = "en"
+    LOCAL_STT_WINDOW_SECONDS = 20  # longest stretch of speech decoded at once (Whisper's limit is 30)
+
+    # In-process llama.cpp model for RESPONSE_MODEL = 'local' (see voice_assistant/local_llm.py); needs
+    # llama-cpp-python and a GGUF model at LOCAL_MODEL_PATH
+    LOCAL_LLM_CONTEXT = 4096  # tokens
+    LOCAL_LLM_THREADS = 0  # 0 uses every core
+    LOCAL_LLM_MAX_TOKENS = 256
+    LOCAL_LLM_TEMPERATURE = 0.7
+    LOCAL_LLM_CACHE_BYTES = 512 * 1024 * 1024  # KV states kept in RAM for prompt prefix reuse
+
     # for serving the MeloTTS model
     TTS_PORT_LOCAL = 5150
 
+    # Per-turn latency tracing (see voice_assistant/tracing.py); set a path to None to disable that export
+    TRACE_WINDOW = 500  # recent samples per stage used for the rolling percentiles
+    TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "turn_traces.jsonl")
+    TRACE_PROMETHEUS_PATH = os.getenv("TRACE_PROMETHEUS_PATH", "voice_metrics.prom")
+
+    # MeloTTS server worker queue (see voice_assistant/local_tts_api.py)
+    MELOTTS_QUEUE_SIZE = 32
+
+    # Import the selected providers' SDKs, open their connections and load local models on a background
+    # thread at startup, while the first utterance is recorded (see voice_assistant/prewarm.py)
+    PREWARM = True
+    # Also load the failover backends' models (e.g. faster-whisper, the Ollama LLM) at startup; otherwise
+    # only their modules are imported, and the first failover loads them
+    PREWARM_FAILOVER = False
+
     # temp file generated by the initial STT model
-    INPUT_AUDIO = "test.mp3"
+    INPUT_AUDIO = "test.wav"  # a .mp3 path is encoded to MP3
 
     @staticmethod
     def validate_config():
@@ -59,24 +251,15 @@ class Config:
         Raises:
             ValueError: If a required environment variable is not set.
         """
-        Config._validate_model('TRANSCRIPTION_MODEL', [
-            'openai', 'groq', 'deepgram', 'fastwhisperapi', 'local'])
-        Config._validate_model('RESPONSE_MODEL', [
-            'openai', 'groq', 'ollama', 'local'])
-        Config._validate_model('TTS_MODEL', [
-            'openai', 'deepgram', 'elevenlabs', 'melotts', 'cartesia', 'local', 'piper'])
-
-        Config._validate_api_key('TRANSCRIPTION_MODEL', 'openai', 'OPENAI_API_KEY')
-        Config._validate_api_key('TRANSCRIPTION_MODEL', 'groq', 'GROQ_API_KEY')
-        Config._validate_api_key('TRANSCRIPTION_MODEL', 'deepgram', 'DEEPGRAM_API_KEY')
-
-        Config._validate_api_key('RESPONSE_MODEL', 'openai', 'OPENAI_API_KEY')
-        Config._validate_api_key('RESPONSE_MODEL', 'groq', 'GROQ_API_KEY')
-
-        Config._validate_api_key('TTS_MODEL', 'openai', 'OPENAI_API_KEY')
-        Config._validate_api_key('TTS_MODEL', 'deepgram', 'DEEPGRAM_API_KEY')
-        Config._validate_api_key('TTS_MODEL', 'elevenlabs', 'ELEVENLABS_API_KEY')
-        Config._validate_api_key('TTS_MODEL', 'cartesia', 'CARTESIA_API_KEY')
+        # Imported here because the provider registry itself reads Config
+        from voice_assistant.providers import AUTO, PROVIDERS, SERVICE_MODELS
+
+        for service, attribute in SERVICE_MODELS.items():
+            providers = PROVIDERS[service]
+            Config._validate_model(attribute, list(providers) + [AUTO])
+            provider = providers.get(getattr(Config, attribute))
+            if provider is not None and provider.api_key:
+                Config._validate_api_key(attribute, provider.name, provider.api_key)
 
     @staticmethod
     def _validate_model(attribute, valid_options):
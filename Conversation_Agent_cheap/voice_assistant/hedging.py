@@ -0,0 +1,338 @@
+# voice_assistant/hedging.py
+
+import io
+import logging
+import queue
+import threading
+import time
+import wave
+from collections import defaultdict, deque
+
+from voice_assistant.api_key_manager import get_api_key
+from voice_assistant.audio_formats import negotiate_speech_format
+from voice_assistant.config import Config
+from voice_assistant.providers import PROVIDERS, is_configured, selected_provider
+from voice_assistant.response_generation import stream_response_deltas
+from voice_assistant.text_to_speech import stream_speech
+from voice_assistant.tracing import percentile
+from voice_assistant.transcription import transcribe_audio
+
+# Sentinel for a stream that ended without producing anything
+_EMPTY = object()
+
+_lock = threading.Lock()
+_latencies = defaultdict(lambda: deque(maxlen=Config.TRACE_WINDOW))
+_stats = defaultdict(lambda: {
+    "calls": 0,
+    "hedges": 0,
+    "failovers": 0,
+    "failures": 0,
+    "wins": defaultdict(int),
+    "discarded": 0,
+    "extra_cost_usd": 0.0,
+})
+
+
+def stt_cost(provider, audio_seconds):
+    return Config.STT_PRICE_PER_MINUTE.get(provider, 0.0) * audio_seconds / 60
+
+
+def llm_cost(provider, prompt_chars, reply_chars):
+    input_price, output_price = Config.LLM_PRICE_PER_MILLION_TOKENS.get(provider, (0.0, 0.0))
+    # About four characters per token
+    return (input_price * prompt_chars / 4 + output_price * reply_chars / 4) / 1_000_000
+
+
+def tts_cost(provider, text_chars):
+    return Config.TTS_PRICE_PER_MILLION_CHARS.get(provider, 0.0) * text_chars / 1_000_000
+
+
+def hedge_providers(service):
+    """
+    Return the providers to try for a service, primary first.
+
+    The primary is the provider selected in Config; alternates come from
+    Config.HEDGE_PROVIDERS, skipping any whose API key is not set.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+
+    Returns:
+    list: Provider names in the order they are tried.
+    """
+    primary = selected_provider(service)
+    providers = [primary]
+    for provider in Config.HEDGE_PROVIDERS.get(service, []):
+        if provider in providers:
+            continue
+        if provider in PROVIDERS[service] and not is_configured(PROVIDERS[service][provider]):
+            continue
+        providers.append(provider)
+    return providers
+
+
+def hedge_deadline(service, provider):
+    """
+    Return how long to wait for a provider before starting the next one.
+
+    Uses the provider's recent latency at Config.HEDGE_QUANTILE once there are
+    Config.HEDGE_MIN_SAMPLES samples, and the service's default deadline before that.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    provider (str): The provider being waited on.
+
+    Returns:
+    float: The deadline in seconds.
+    """
+    with _lock:
+        values = sorted(_latencies[(service, provider)])
+    if len(values) < Config.HEDGE_MIN_SAMPLES:
+        return Config.HEDGE_DEFAULT_DEADLINES[service]
+    return max(Config.HEDGE_MIN_DEADLINE, percentile(values, Config.HEDGE_QUANTILE))
+
+
+def _hedged_call(service, attempt, discard, race=False):
+    """
+    Run attempt(provider) on the service's providers, hedging and failing over, and return the first success.
+
+    The next provider is started when the newest one misses its deadline, or
+    at once if every running attempt has failed; a provider whose circuit
+    breaker is open fails at once (see voice_assistant/resilience.py), so
+    the hedge moves straight past it. With race=True the first two
+    start together. Results that arrive after the winner are passed to
+    discard(provider, result) so they can be closed and their cost recorded.
+
+    Returns:
+    tuple: (winning provider, its result).
+    """
+    providers = hedge_providers(service)
+    results = queue.Queue()
+    decided = threading.Event()
+    running = []
+
+    def launch(provider):
+        start = time.monotonic()
+
+        def run():
+            try:
+                outcome = (provider, attempt(provider), None)
+                with _lock:
+                    _latencies[(service, provider)].append(time.monotonic() - start)
+            except Exception as e:
+                outcome = (provider, None, e)
+            with _lock:
+                late = decided.is_set()
+                if not late:
+                    results.put(outcome)
+            if late and outcome[2] is None:
+                discard(*outcome[:2])
+
+        running.append(provider)
+        threading.Thread(target=run, daemon=True).start()
+        return start + hedge_deadline(service, provider)
+
+    with _lock:
+        _stats[service]["calls"] += 1
+    pending = providers[1:]
+    deadline = launch(providers[0])
+    if race and pending:
+        with _lock:
+            _stats[service]["hedges"] += 1
+        deadline = launch(pending.pop(0))
+    outstanding = len(running)
+    last_error = None
+    while outstanding:
+        timeout = max(0.0, deadline - time.monotonic()) if pending else None
+        try:
+            provider, result, error = results.get(timeout=timeout)
+        except queue.Empty:
+            logging.info(f"{service} provider {running[-1]} missed its deadline; hedging with {pending[0]}")
+            with _lock:
+                _stats[service]["hedges"] += 1
+            deadline = launch(pending.pop(0))
+            outstanding += 1
+            continue
+        outstanding -= 1
+        if error is None:
+            with _lock:
+                decided.set()
+                _stats[service]["wins"][provider] += 1
+                late_results = []
+                while not results.empty():
+                    late_results.append(results.get_nowait())
+            for late_provider, late_result, late_error in late_results:
+                if late_error is None:
+                    discard(late_provider, late_result)
+            return provider, result
+        last_error = error
+        logging.warning(f"{service} provider {provider} failed: {error}")
+        if not outstanding and pending:
+            with _lock:
+                _stats[service]["failovers"] += 1
+            deadline = launch(pending.pop(0))
+            outstanding += 1
+    with _lock:
+        decided.set()
+        _stats[service]["failures"] += 1
+    raise last_error
+
+
+def _record_discard(service, cost):
+    with _lock:
+        _stats[service]["discarded"] += 1
+        _stats[service]["extra_cost_usd"] += cost
+
+
+def _audio_seconds(audio_bytes):
+    try:
+        with wave.open(io.BytesIO(audio_bytes)) as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError):
+        # Not a WAV; assume 16 kHz PCM16-sized data
+        return len(audio_bytes) / 32000
+
+
+def hedged_transcribe(audio, local_model_path=None, trace=None):
+    """
+    Transcribe audio with the primary transcription provider, hedged across Config.HEDGE_PROVIDERS.
+
+    A hedged request that loses keeps running until its HTTP call returns (the
+    SDKs offer no way to abort it); its result is dropped and its cost counted.
+
+    Args:
+    audio (str | bytes | BytesIO): The audio file path or the audio itself.
+    local_model_path (str): The path to the local model (if applicable).
+    trace (TurnTrace): If given, the winning provider is recorded on it.
+
+    Returns:
+    str: The transcribed text.
+    """
+    if isinstance(audio, io.BytesIO):
+        name, audio = getattr(audio, "name", "input.wav"), audio.getvalue()
+    else:
+        name = "input.wav"
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            audio_seconds = _audio_seconds(f.read())
+    else:
+        audio_seconds = _audio_seconds(bytes(audio))
+
+    def attempt(provider):
+        # Each attempt gets its own buffer so concurrent uploads don't share a read position
+        upload = audio
+        if not isinstance(audio, str):
+            upload = io.BytesIO(audio)
+            upload.name = name
+        return transcribe_audio(provider, get_api_key("transcription", provider), upload, local_model_path,
+                                failover=False)
+
+    def discard(provider, _):
+        _record_discard("transcription", stt_cost(provider, audio_seconds))
+
+    provider, text = _hedged_call("transcription", attempt, discard, race=Config.HEDGE_RACE_STT)
+    if trace is not None:
+        trace.providers["TRANSCRIPTION_MODEL"] = provider
+    return text
+
+
+def _open_stream(chunks):
+    """
+    Start a stream and wait for its first item, so a stream counts as answered once it produces output.
+    """
+    chunks = iter(chunks)
+    return next(chunks, _EMPTY), chunks
+
+
+def _close_stream(stream):
+    close = getattr(stream, "close", None)
+    if callable(close):
+        close()
+
+
+def _resume_stream(first, chunks):
+    try:
+        if first is not _EMPTY:
+            yield first
+        yield from chunks
+    finally:
+        _close_stream(chunks)
+
+
+def hedged_stream_response(chat_history, local_model_path=None, trace=None):
+    """
+    Stream a response from the primary response provider, hedged on time to first token.
+
+    Losing streams are closed as soon as they produce their first token, which
+    aborts their HTTP request; their prompt tokens are still billed and counted.
+
+    Args:
+    chat_history (list): The chat history as a list of messages.
+    local_model_path (str): The path to the local model (if applicable).
+    trace (TurnTrace): If given, the winning provider is recorded on it.
+
+    Yields:
+    str: Text deltas of the generated response, in order.
+    """
+    prompt_chars = sum(len(message["content"]) for message in chat_history)
+
+    def attempt(provider):
+        return _open_stream(stream_response_deltas(
+            provider, get_api_key("response", provider), chat_history, local_model_path, failover=False))
+
+    def discard(provider, result):
+        first, chunks = result
+        _close_stream(chunks)
+        _record_discard("response", llm_cost(provider, prompt_chars, len(first) if first is not _EMPTY else 0))
+
+    provider, (first, chunks) = _hedged_call("response", attempt, discard)
+    if trace is not None:
+        trace.providers["RESPONSE_MODEL"] = provider
+    yield from _resume_stream(first, chunks)
+
+
+def hedged_stream_speech(text, local_model_path=None, trace=None, accepted=None):
+    """
+    Start streaming speech from the primary TTS provider, hedged on time to first audio chunk.
+
+    Blocks until some provider produces audio. Losing streams are closed when
+    their first chunk arrives; the full text is counted as billed.
+
+    Args:
+    text (str): The text to convert to speech.
+    local_model_path (str): The path to the local model (if applicable).
+    trace (TurnTrace): If given, the winning provider is recorded on it.
+    accepted (list): Format kinds the audio's consumer accepts; defaults to Config.PLAYBACK_FORMATS.
+
+    Returns:
+    tuple: (winning provider, its negotiated speech format, iterator of audio chunks).
+    """
+    def attempt(provider):
+        speech_format = negotiate_speech_format(provider, accepted)
+        first, chunks = _open_stream(stream_speech(provider, get_api_key("tts", provider), text,
+                                                   local_model_path, speech_format, failover=False))
+        return speech_format, first, chunks
+
+    def discard(provider, result):
+        _close_stream(result[2])
+        _record_discard("tts", tts_cost(provider, len(text)))
+
+    provider, (speech_format, first, chunks) = _hedged_call("tts", attempt, discard)
+    if trace is not None:
+        trace.providers["TTS_MODEL"] = provider
+    return provider, speech_format, _resume_stream(first, chunks)
+
+
+def get_hedge_stats():
+    """
+    Return hedging statistics per service.
+
+    Returns:
+    dict: Service mapped to counts of calls, hedges started, failovers, total
+    failures, wins per provider, discarded results and their estimated extra cost in USD.
+    """
+    with _lock:
+        return {
+            service: dict(stats, wins=dict(stats["wins"]))
+            for service, stats in _stats.items()
+        }
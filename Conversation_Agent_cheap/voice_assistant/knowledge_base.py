@@ -0,0 +1,328 @@
+# voice_assistant/knowledge_base.py
+
+import json
+import logging
+import re
+from functools import lru_cache
+
+from voice_assistant.config import Config
+
+NO_INFORMATION = "I currently don't have that information."
+
+# Questions that need reasoning, judgement or arithmetic rather than a lookup go to the LLM, including
+# hypotheticals ('after I take 10 bags', 'if we use two') whose answer isn't the stored figure
+OPEN_ENDED = re.compile(
+    r"\b(why|should|recommend|suggest|compare|comparison|difference|explain|enough|what if|plan|best|better|"
+    r"estimate|calculate|versus|vs|after|if (?:i|we|you|they)|suppose|supposing|assuming|hypothetically|"
+    r"minus|plus|subtract)\b"
+    r"|\b(?:take|takes|taking|took|use|uses|using|used|remove|removing|withdraw|withdrawing|add|adding|"
+    r"need|needs|consume|consuming|send|sending|move|moving)\s+(?:another\s+|an? extra\s+)?"
+    r"(?:\d[\d,.]*|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|twenty|fifty|"
+    r"a (?:few|couple|dozen|hundred|thousand)|half|hundreds|thousands)\b"
+)
+
+# Intents in priority order; the first whose pattern matches the question wins
+INTENTS = [
+    ("contact", re.compile(r"\b(contact|buy|purchase|order more|place an order|manager|email|phone|call|special request)\b")),
+    ("reorder", re.compile(r"\b(reorder|re-order|minimum level|threshold)\b")),
+    ("restock", re.compile(r"\b(restock|re-stock|resupply|next delivery|delivery|arriv\w*|replenish\w*)\b")),
+    ("supplier", re.compile(r"\b(supplier|suppliers|supplie[sd]|supply|vendor|who provides|where do we get)\b")),
+    ("expiry", re.compile(r"\b(expir\w*|valid until|shelf life)\b")),
+    ("status", re.compile(r"\b(active|maintenance|idle|damaged|broken|in use|working|operational|repair\w*|status|free|spare)\b")),
+    ("stock", re.compile(r"\b(how many|how much|stock|available|availability|do we have|have we got|is there|are there|left|quantity|inventory|count)\b")),
+]
+
+
+# Words a lookup question may contain besides the item itself. A question with any other word (a place, a time,
+# a project, another object) carries a qualifier the data can't account for, so it goes to the LLM
+STOP_WORDS = frozenset("""
+a an the of for in on at to from with by about and or any all some our we us i me my you your it its they them
+this that these those there here is are was be do does have has got get hey hi hello rafa please can could would
+will tell let know show check just currently right now still now yet today also much many how what which when
+who whom s re ve don t
+""".split())
+INTENT_WORDS = frozenset("""
+contact buy purchase order more place manager email phone call special request reorder re minimum level threshold
+restock stock resupply next delivery due date arrive arriving arrives arrival replenish replenished replenishment
+supplier suppliers supplies supplied supply vendor provides where get expiry expire expires expired expiring valid
+until shelf life active maintenance under idle damaged broken use working operational repair repairs status free
+spare available availability quantity inventory count left number units total
+""".split())
+
+# Status questions name a state; the ones the data records per state, and the ones it records as in use
+STATE_WORDS = re.compile(r"\b(active|maintenance|idle|damaged|broken|working|operational|repair\w*)\b")
+IN_USE_WORDS = re.compile(r"\b(in use|free)\b")
+
+
+class InventoryKnowledgeBase:
+    """
+    Structured inventory data with an intent/slot matcher for direct lookup questions.
+
+    answer() recognises questions about one inventory item (the slot) asking
+    for its stock, status, reorder level, restock date, supplier or expiry,
+    or asking whom to contact for purchases (the intent), and answers them
+    from the data with a spoken template. Anything else, including questions
+    about several items, that need reasoning, or that carry a qualifier the
+    data doesn't cover ('last month', 'in Abu Dhabi', 'cement trucks'),
+    returns None so the caller can fall back to the LLM.
+
+    Args:
+    data (dict): The inventory, as loaded from Config.INVENTORY_DATA_PATH.
+    """
+
+    def __init__(self, data):
+        self.contact = data["contact"]
+        self.items = {item["id"]: item for item in data["items"]}
+        self._alias_to_item = {}
+        for item in data["items"]:
+            for alias in item["aliases"]:
+                self._alias_to_item[alias.lower()] = item["id"]
+        # One alternation, longest aliases first, so 'concrete mixer' wins over 'concrete'
+        aliases = sorted(self._alias_to_item, key=len, reverse=True)
+        self._alias_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(alias) for alias in aliases) + r")(?:e?s)?\b"
+        )
+
+    def match_items(self, question):
+        """
+        Return the ids of the inventory items a question mentions.
+
+        A spare part mentioned together with the equipment it is for (e.g.
+        'hydraulic pumps for the excavators') counts as the spare part only.
+
+        Args:
+        question (str): The user's question.
+
+        Returns:
+        list: Item ids in order of first mention.
+        """
+        item_ids = []
+        for match in self._alias_pattern.finditer(question.lower()):
+            item_id = self._alias_to_item[match.group(1)]
+            if item_id not in item_ids:
+                item_ids.append(item_id)
+        spare_for = {self.items[item_id].get("spare_for") for item_id in item_ids}
+        return [item_id for item_id in item_ids if item_id not in spare_for]
+
+    def match_intent(self, question):
+        """
+        Return the lookup intent of a question, or None if it is open-ended or not a lookup.
+        """
+        question = question.lower()
+        if OPEN_ENDED.search(question):
+            return None
+        for intent, pattern in INTENTS:
+            if pattern.search(question):
+                return intent
+        return None
+
+    def answer(self, question):
+        """
+        Answer a direct inventory lookup question from the data.
+
+        Args:
+        question (str): The user's question.
+
+        Returns:
+        str: The spoken answer, or None if the question should go to the LLM.
+        """
+        intent = self.match_intent(question)
+        if intent is None:
+            return None
+        item_ids = self.match_items(question)
+        if not self._only_lookup_words(question, item_ids):
+            return None
+        if intent == "contact":
+            return self._contact_answer()
+        if len(item_ids) != 1:
+            return None
+        item = self.items[item_ids[0]]
+        if intent == "status" and not self._records_state(item, question.lower()):
+            return None
+        return getattr(self, f"_{intent}_answer")(item)
+
+    def _only_lookup_words(self, question, item_ids):
+        """
+        Return whether every word left after removing the item mentions is a stop word or an intent word.
+
+        The named items' own descriptive words (name, spec, unit, category) are allowed too, so
+        'bags of cement' or 'TC-90 tower cranes' still count as plain lookups.
+        """
+        allowed = STOP_WORDS | INTENT_WORDS
+        for item_id in item_ids:
+            item = self.items[item_id]
+            descriptions = [item["name"], item.get("spec", ""), item.get("unit", ""), item["category"]]
+            allowed = allowed | set(re.findall(r"[a-z0-9]+", " ".join(descriptions).lower()))
+        leftover = self._alias_pattern.sub(" ", question.lower())
+        return all(word in allowed for word in re.findall(r"[a-z0-9]+", leftover))
+
+    @staticmethod
+    def _records_state(item, question):
+        # 'How many vests are damaged?' can't be answered from data that only counts vests in use
+        if STATE_WORDS.search(question) and not item.get("status"):
+            return False
+        if IN_USE_WORDS.search(question) and "in_use" not in item and not item.get("status"):
+            return False
+        return True
+
+    def prompt_section(self):
+        """
+        Describe the inventory and the purchase contact as the Markdown sections of the system prompt.
+
+        Returns:
+        str: The '## Knowledge Base' and '## Purchase or Special Requests' sections.
+        """
+        lines = ["## Knowledge Base", "Inventory Overview:"]
+        categories = list(dict.fromkeys(item["category"] for item in self.items.values()))
+        for category in categories:
+            lines.append(f"- {category[0].upper()}{category[1:]}:")
+            for item in self.items.values():
+                if item["category"] == category:
+                    lines.append(f"  - {self._prompt_line(item)}")
+        contact = self.contact
+        lines += [
+            "",
+            "## Purchase or Special Requests",
+            "For purchase inquiries or special inventory requests, please redirect the user to contact:",
+            "",
+            f"**{contact['role']}:** {contact['name']}",
+            f"**Email:** {contact['email']}",
+            f"**Phone:** {contact['phone']}",
+        ]
+        if contact.get("location"):
+            lines.append(f"**Location:** {contact['location']}")
+        return "\n".join(lines)
+
+    def _prompt_line(self, item):
+        spec = f" ({item['spec']})" if item.get("spec") else ""
+        name = f"{item['name'][0].upper()}{item['name'][1:]}{spec}"
+        parent = self.items.get(item.get("spare_for"))
+        if "quantity" not in item:
+            if not item.get("available"):
+                return f"{name}: No stock information."
+            return f"{name}: Available for {parent['name']}." if parent else f"{name}: Available."
+        details = []
+        if item.get("status"):
+            details.append(", ".join(f"{count:,} {state}" for state, count in item["status"].items()))
+        if "in_use" in item:
+            details.append(f"{item['in_use']:,} in use")
+        facts = [f"{self._amount(item)} in stock" + (f" ({'; '.join(details)})" if details else "")]
+        if parent:
+            facts[0] += f" for {parent['name']}"
+        if item.get("supplier"):
+            facts.append(f"supplied by {item['supplier']}")
+        if "reorder_level" in item:
+            facts.append(f"reorder level at {self._amount(item, item['reorder_level'])}")
+        if item.get("next_restock"):
+            facts.append(f"next restock due: {item['next_restock']}")
+        if item.get("expiry"):
+            facts.append(f"expiry: {item['expiry']}")
+        return f"{name}: {'; '.join(facts).rstrip('.')}."
+
+    def _contact_answer(self):
+        contact = self.contact
+        return (f"For purchases or special requests, please contact our {contact['role']}, {contact['name']}, "
+                f"by email at {contact['email']} or by phone at {contact['phone']}.")
+
+    @staticmethod
+    def _amount(item, quantity=None):
+        return f"{item['quantity'] if quantity is None else quantity:,} {item['unit']}"
+
+    @staticmethod
+    def _quantity_of(item):
+        # '4 tower cranes' rather than '4 units of tower cranes'
+        if item["unit"] == "units":
+            return f"{item['quantity']:,} {item['name']}"
+        return f"{item['quantity']:,} {item['unit']} of {item['name']}"
+
+    def _stock_answer(self, item):
+        if "quantity" not in item:
+            if item.get("available"):
+                return f"Yes, {item['name']} are available{self._spare_for_text(item)}."
+            return NO_INFORMATION
+        spec = f" ({item['spec']})" if item.get("spec") else ""
+        answer = f"We have {self._quantity_of(item)}{spec}{self._spare_for_text(item)} in stock."
+        if item.get("status"):
+            answer = f"We have {self._quantity_of(item)}{spec}: {self._status_text(item)}."
+        elif "in_use" in item:
+            answer += f" {item['in_use']:,} are currently in use."
+        if "reorder_level" in item:
+            answer += f" The reorder level is {self._amount(item, item['reorder_level'])}."
+        return answer
+
+    def _status_answer(self, item):
+        if item.get("status"):
+            return f"Of our {self._quantity_of(item)}, {self._status_text(item)}."
+        if "in_use" in item:
+            free = item["quantity"] - item["in_use"]
+            return (f"{item['in_use']:,} of our {self._quantity_of(item)} are currently in use, "
+                    f"leaving {free:,} available.")
+        return self._stock_answer(item)
+
+    def _reorder_answer(self, item):
+        if "reorder_level" not in item:
+            return NO_INFORMATION
+        answer = (f"The reorder level for {item['name']} is {self._amount(item, item['reorder_level'])}, "
+                  f"and we currently have {self._amount(item)}.")
+        if item["quantity"] <= item["reorder_level"]:
+            return answer + " Stock is at or below the reorder level."
+        return answer
+
+    def _restock_answer(self, item):
+        if not item.get("next_restock"):
+            return NO_INFORMATION
+        supplier = f" from {item['supplier']}" if item.get("supplier") else ""
+        return f"The next restock of {item['name']}{supplier} is due on {item['next_restock']}."
+
+    def _supplier_answer(self, item):
+        if not item.get("supplier"):
+            return NO_INFORMATION
+        return f"We get our {item['name']} from {item['supplier']}."
+
+    def _expiry_answer(self, item):
+        if not item.get("expiry"):
+            return NO_INFORMATION
+        return f"Our {item['name']} expire in {item['expiry']}."
+
+    @staticmethod
+    def _status_text(item):
+        parts = [f"{count:,} {'is' if count == 1 else 'are'} {state}" for state, count in item["status"].items()]
+        if len(parts) == 1 and item["status"].get("active") == item["quantity"]:
+            return f"all {item['quantity']:,} are active"
+        return " and ".join(parts) if len(parts) <= 2 else ", ".join(parts[:-1]) + f" and {parts[-1]}"
+
+    def _spare_for_text(self, item):
+        parent = self.items.get(item.get("spare_for"))
+        return f" for the {parent['name']}" if parent else ""
+
+
+@lru_cache(maxsize=None)
+def get_knowledge_base():
+    """
+    Return the inventory knowledge base loaded from Config.INVENTORY_DATA_PATH, or None if it can't be loaded.
+    """
+    try:
+        with open(Config.INVENTORY_DATA_PATH) as f:
+            data = json.load(f)
+        knowledge_base = InventoryKnowledgeBase(data)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Failed to load the inventory knowledge base: {e}")
+        return None
+    logging.info(f"Loaded {len(knowledge_base.items)} inventory items")
+    return knowledge_base
+
+
+def answer_locally(question):
+    """
+    Answer a direct inventory question without the LLM.
+
+    Args:
+    question (str): The user's transcribed question.
+
+    Returns:
+    str: The spoken answer, or None if the question should go to the LLM.
+    """
+    knowledge_base = get_knowledge_base()
+    if knowledge_base is None:
+        return None
+    return knowledge_base.answer(question)
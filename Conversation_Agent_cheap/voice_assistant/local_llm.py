@@ -0,0 +1,148 @@
+# voice_assistant/local_llm.py
+
+import logging
+import os
+import threading
+import time
+
+from voice_assistant.config import Config
+
+# Generation speed per provider, for local models whose latency depends on this machine
+_speed_stats = {}
+_speed_lock = threading.Lock()
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def record_generation_speed(provider, decode_tokens, decode_seconds, time_to_first_token, prompt_tokens=None):
+    """
+    Record the speed of one generation.
+
+    Args:
+    provider (str): 'local' or 'ollama'.
+    decode_tokens (int): Tokens generated after the first one.
+    decode_seconds (float): Seconds spent generating them.
+    time_to_first_token (float): Seconds spent before the first token, mostly prompt evaluation.
+    prompt_tokens (int): Prompt tokens evaluated rather than reused from the KV cache, if the backend reports it.
+    """
+    tokens_per_second = decode_tokens / decode_seconds if decode_tokens > 0 and decode_seconds > 0 else None
+    with _speed_lock:
+        stats = _speed_stats.setdefault(provider, {
+            "generations": 0, "decode_tokens": 0, "decode_seconds": 0.0,
+            "last_tokens_per_second": None, "last_time_to_first_token": None, "last_prompt_tokens": None,
+        })
+        stats["generations"] += 1
+        stats["decode_tokens"] += decode_tokens
+        stats["decode_seconds"] += decode_seconds
+        stats["last_tokens_per_second"] = tokens_per_second
+        stats["last_time_to_first_token"] = time_to_first_token
+        stats["last_prompt_tokens"] = prompt_tokens
+    if tokens_per_second is not None:
+        logging.info(f"{provider} generated {decode_tokens + 1} tokens at {tokens_per_second:.1f} tokens/s "
+                     f"(first token after {time_to_first_token * 1000:.0f}ms)")
+
+
+def get_generation_speed_stats():
+    """
+    Return generation speed per provider, including the mean decode tokens/sec over all generations.
+    """
+    with _speed_lock:
+        stats = {provider: dict(values) for provider, values in _speed_stats.items()}
+    for values in stats.values():
+        values["mean_tokens_per_second"] = (
+            values["decode_tokens"] / values["decode_seconds"] if values["decode_seconds"] > 0 else None
+        )
+    return stats
+
+
+class LocalLlama:
+    """
+    A GGUF model served in-process by llama.cpp (llama-cpp-python) on the CPU.
+
+    The model stays resident for the life of the process. llama.cpp skips
+    re-evaluating the longest prefix shared with the previous prompt, and a
+    RAM cache of KV states restores the best matching earlier state when
+    another conversation (a gateway session, the history summarizer) used
+    the model in between. warm() evaluates the system prompt at startup, so
+    even the first turn only pays for its own messages.
+
+    Args:
+    model_path (str): Path to a GGUF model file.
+    """
+
+    def __init__(self, model_path):
+        # Imported here so the dependency is only needed when generating locally
+        from llama_cpp import Llama, LlamaRAMCache
+
+        if not model_path:
+            raise ValueError("LOCAL_MODEL_PATH must point to a GGUF model for the local LLM")
+        start = time.monotonic()
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=Config.LOCAL_LLM_CONTEXT,
+            n_threads=Config.LOCAL_LLM_THREADS or os.cpu_count(),
+            verbose=False,
+        )
+        self.llm.set_cache(LlamaRAMCache(capacity_bytes=Config.LOCAL_LLM_CACHE_BYTES))
+        # llama.cpp contexts are not thread-safe; one generation runs at a time
+        self._lock = threading.Lock()
+        logging.info(f"Loaded local LLM {os.path.basename(model_path)} in {time.monotonic() - start:.2f}s")
+
+    def warm(self, system_prompt):
+        """
+        Evaluate the system prompt so its KV state is cached before the first turn.
+        """
+        start = time.monotonic()
+        for _ in self.stream([{"role": "system", "content": system_prompt}], max_tokens=1):
+            pass
+        logging.info(f"Cached the system prompt in the local LLM in {time.monotonic() - start:.2f}s")
+
+    def stream(self, chat_history, max_tokens=None):
+        """
+        Stream a chat completion.
+
+        Args:
+        chat_history (list): The chat history as a list of messages.
+        max_tokens (int): Maximum tokens to generate; defaults to Config.LOCAL_LLM_MAX_TOKENS.
+
+        Yields:
+        str: Text deltas of the response, in order.
+        """
+        with self._lock:
+            start = time.monotonic()
+            first_token_at = None
+            tokens = 0
+            stream = self.llm.create_chat_completion(
+                messages=chat_history,
+                max_tokens=max_tokens or Config.LOCAL_LLM_MAX_TOKENS,
+                temperature=Config.LOCAL_LLM_TEMPERATURE,
+                stream=True,
+            )
+            try:
+                for chunk in stream:
+                    content = chunk["choices"][0]["delta"].get("content")
+                    if content:
+                        tokens += 1
+                        first_token_at = first_token_at or time.monotonic()
+                        yield content
+            finally:
+                stream.close()
+                if first_token_at is not None:
+                    record_generation_speed("local", tokens - 1, time.monotonic() - first_token_at,
+                                            first_token_at - start)
+
+
+def get_local_llm(model_path=None):
+    """
+    Return the resident local LLM for a model path, loading it on first use.
+
+    Args:
+    model_path (str): Path to a GGUF model; defaults to Config.LOCAL_MODEL_PATH.
+    """
+    model_path = model_path or Config.LOCAL_MODEL_PATH
+    # Held while loading, so a turn that arrives during pre-warming waits instead of loading a second copy
+    with _models_lock:
+        if model_path not in _models:
+            _models[model_path] = LocalLlama(model_path)
+        return _models[model_path]
@@ -0,0 +1,214 @@
+# voice_assistant/local_stt.py
+
+import io
+import logging
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+from voice_assistant.config import Config
+from voice_assistant.vad import VoiceActivityDetector
+
+# Whisper models are trained on 16 kHz audio
+SAMPLE_RATE = 16000
+
+
+def load_pcm(audio):
+    """
+    Read WAV audio into 16 kHz mono PCM16 samples.
+
+    Args:
+    audio (str | bytes | BytesIO): A path to a WAV file, or the WAV audio itself.
+
+    Returns:
+    np.ndarray: int16 samples, or None if the audio isn't 16-bit PCM WAV.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = io.BytesIO(bytes(audio))
+    elif isinstance(audio, io.BytesIO):
+        audio.seek(0)
+    try:
+        with wave.open(audio, "rb") as wav_file:
+            if wav_file.getsampwidth() != 2:
+                return None
+            channels = wav_file.getnchannels()
+            sample_rate = wav_file.getframerate()
+            samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+    except (wave.Error, EOFError):
+        return None
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if sample_rate != SAMPLE_RATE:
+        duration = len(samples) / sample_rate
+        positions = np.linspace(0, len(samples) - 1, int(duration * SAMPLE_RATE))
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+    return samples
+
+
+def speech_windows(samples, window_seconds=None, frame_ms=None, pad_ms=None):
+    """
+    Gate audio with the VAD and pack the speech into decoding windows.
+
+    Speech regions are padded by pad_ms and regions closer than twice that
+    are merged. Consecutive regions are concatenated, without the silence
+    between them, into windows of at most window_seconds. A region longer
+    than a window is cut at the quietest frame in the last quarter of the
+    window, so words are not split where possible.
+
+    The VAD's noise floor is seeded from the quietest frames of the clip
+    rather than its first frame, since clips handed over by barge-in start
+    mid-speech. If gating still finds no speech in a clip that isn't
+    silent, the whole clip is decoded rather than dropped.
+
+    Args:
+    samples (np.ndarray): 16 kHz mono int16 samples.
+    window_seconds (float): Maximum length of a window.
+    frame_ms (int): VAD frame length.
+    pad_ms (int): Audio kept around each speech region.
+
+    Returns:
+    list: int16 arrays, one per window; empty if there is no speech.
+    """
+    window_seconds = Config.LOCAL_STT_WINDOW_SECONDS if window_seconds is None else window_seconds
+    frame_ms = Config.VAD_FRAME_MS if frame_ms is None else frame_ms
+    pad_ms = Config.VAD_PREROLL_MS if pad_ms is None else pad_ms
+    frame_size = SAMPLE_RATE * frame_ms // 1000
+    frame_count = len(samples) // frame_size
+    if frame_count == 0:
+        return []
+    frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size)
+    energy = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+    energy_db = 20 * np.log10(energy + 1e-9)
+
+    # A fresh detector per utterance, its noise floor taken from the quietest tenth of the frames
+    detector = VoiceActivityDetector()
+    detector.noise_floor_db = float(np.percentile(energy_db, 10))
+    speech = [detector.is_speech(frame.tobytes()) for frame in frames]
+    pad = pad_ms // frame_ms
+    regions = []
+    for index, is_speech in enumerate(speech):
+        if not is_speech:
+            continue
+        start, end = max(0, index - pad), min(frame_count, index + pad + 1)
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    if not regions and energy_db.max() >= detector.min_speech_db:
+        # Nothing stood out from the floor, e.g. a clip that is speech throughout; let Whisper decide
+        regions = [[0, frame_count]]
+
+    window_frames = max(1, int(window_seconds * 1000) // frame_ms)
+    pieces = []
+    for start, end in regions:
+        while end - start > window_frames:
+            search_from = start + window_frames * 3 // 4
+            cut = search_from + int(np.argmin(energy[search_from:start + window_frames])) + 1
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    windows, current, current_frames = [], [], 0
+    for start, end in pieces:
+        if current and current_frames + end - start > window_frames:
+            windows.append(np.concatenate(current))
+            current, current_frames = [], 0
+        current.append(frames[start:end].reshape(-1))
+        current_frames += end - start
+    if current:
+        windows.append(np.concatenate(current))
+    return windows
+
+
+class LocalWhisperTranscriber:
+    """
+    In-process Whisper transcription with faster-whisper (CTranslate2) on the CPU.
+
+    The model is loaded once with int8 weights and warmed up with a throwaway
+    decode, so the first utterance doesn't pay for allocation. Each
+    utterance is VAD-gated and decoded window by window (see speech_windows),
+    each window prompted with the previous window's text. Silence never
+    reaches the decoder, which saves time and avoids Whisper's habit of
+    hallucinating text on silence.
+
+    Args:
+    model_size_or_path (str): A faster-whisper model name (e.g. 'base.en') or a path to a converted model.
+    compute_type (str): CTranslate2 compute type, e.g. 'int8'.
+    cpu_threads (int): Threads used to decode one window.
+    num_workers (int): Windows that can be decoded in parallel, e.g. for several gateway sessions.
+    """
+
+    def __init__(self, model_size_or_path=None, compute_type=None, cpu_threads=None, num_workers=None):
+        # Imported here so the dependency is only needed when transcribing locally
+        from faster_whisper import WhisperModel
+
+        self.model_name = model_size_or_path or Config.LOCAL_STT_MODEL
+        start = time.monotonic()
+        self.model = WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=compute_type or Config.LOCAL_STT_COMPUTE_TYPE,
+            cpu_threads=cpu_threads or Config.LOCAL_STT_CPU_THREADS or os.cpu_count() or 4,
+            num_workers=num_workers or Config.LOCAL_STT_WORKERS,
+        )
+        self._decode(np.zeros(SAMPLE_RATE, dtype=np.int16))
+        logging.info(f"Loaded local Whisper model {self.model_name} in {time.monotonic() - start:.2f}s")
+
+    def _decode(self, samples, prompt=None):
+        segments, _ = self.model.transcribe(
+            samples.astype(np.float32) / 32768.0,
+            language=Config.LOCAL_STT_LANGUAGE,
+            beam_size=Config.LOCAL_STT_BEAM_SIZE,
+            initial_prompt=prompt,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+            vad_filter=False,
+        )
+        # Segments are decoded lazily as the generator is consumed
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe(self, audio):
+        """
+        Transcribe an utterance.
+
+        Args:
+        audio (str | bytes | BytesIO): WAV audio, as a path or in memory.
+
+        Returns:
+        str: The transcribed text; empty if the audio contains no speech.
+        """
+        samples = load_pcm(audio)
+        if samples is None:
+            # Not PCM WAV (e.g. an mp3 file); let faster-whisper decode it and skip the gating
+            if isinstance(audio, io.BytesIO):
+                audio.seek(0)
+            segments, _ = self.model.transcribe(audio, language=Config.LOCAL_STT_LANGUAGE,
+                                                beam_size=Config.LOCAL_STT_BEAM_SIZE, vad_filter=True)
+            return " ".join(segment.text.strip() for segment in segments).strip()
+
+        texts = []
+        for window in speech_windows(samples):
+            text = self._decode(window, prompt=texts[-1] if texts else None)
+            if text:
+                texts.append(text)
+        return " ".join(texts)
+
+
+_transcriber = None
+_transcriber_lock = threading.Lock()
+
+
+def get_local_transcriber():
+    """
+    Return the process-wide local transcriber, loading the model on first use.
+
+    Callers that arrive while the model is loading (e.g. during pre-warming) wait for it.
+    """
+    global _transcriber
+    with _transcriber_lock:
+        if _transcriber is None:
+            _transcriber = LocalWhisperTranscriber()
+        return _transcriber
@@ -1,7 +1,17 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from melo.api import TTS
 from config import Config
+import io
+import logging
+import queue
+import re
+import struct
+import threading
+import time
+import wave
+import numpy as np
 import torch
 import uuid
 
@@ -10,7 +20,7 @@ app = FastAPI()
 class TextToSpeechRequest(BaseModel):
     """
     Model representing a text-to-speech request.
-    
+
     Attributes:
         text (str): The text to convert to speech.
         language (str): The language of the text.
@@ -27,7 +37,7 @@ class TextToSpeechRequest(BaseModel):
 def get_device():
     """
     Determine the appropriate device for running the TTS model.
-    
+
     Returns:
         str: The device to use ('cuda', 'mps', or 'cpu').
     """
@@ -42,6 +52,121 @@ def get_device():
 device = get_device()  # Determine the appropriate device
 model = TTS(language='EN', device=device)
 speaker_ids = model.hps.data.spk2id
+sample_rate = model.hps.data.sampling_rate
+
+
+class SynthesisJob:
+    """
+    A single synthesis request waiting for the model worker.
+
+    Attributes:
+        text (str): The text to convert to speech.
+        speaker_id (int): The MeloTTS speaker id.
+        speed (float): The speed of the speech.
+        output_path (str): File to write the audio to, or None to return it in memory.
+        audio (np.ndarray): The generated float audio when output_path is None.
+        error (Exception): The error raised by the model, if any.
+    """
+    def __init__(self, text, speaker_id, speed, output_path=None):
+        self.text = text
+        self.speaker_id = speaker_id
+        self.speed = speed
+        self.output_path = output_path
+        self.audio = None
+        self.error = None
+        self.done = threading.Event()
+
+# Bounded so a burst of requests gets a fast 503 instead of unbounded latency
+jobs = queue.Queue(maxsize=Config.MELOTTS_QUEUE_SIZE)
+
+def synthesis_worker():
+    """
+    Run queued jobs one at a time on the single resident model.
+
+    The model is not thread-safe and MeloTTS has no multi-text batch API, so
+    this one thread serves every request in arrival order; HTTP handling
+    stays on the server's threads.
+    """
+    while True:
+        job = jobs.get()
+        try:
+            with torch.inference_mode():
+                job.audio = model.tts_to_file(job.text, job.speaker_id, job.output_path, speed=job.speed, quiet=True)
+        except Exception as e:
+            job.error = e
+        finally:
+            job.done.set()
+
+def synthesize(text, accent, speed, output_path=None):
+    """
+    Queue text for synthesis and wait for the result.
+
+    Args:
+        text (str): The text to convert to speech.
+        accent (str): The accent to use for the speech.
+        speed (float): The speed of the speech.
+        output_path (str): File to write the audio to, or None to return it in memory.
+
+    Returns:
+        np.ndarray: The generated float audio, or None when written to output_path.
+
+    Raises:
+        HTTPException: If the accent is invalid, the queue is full, or synthesis fails.
+    """
+    if accent not in speaker_ids:
+        raise HTTPException(status_code=400, detail="Invalid accent specified")
+    job = SynthesisJob(text, speaker_ids[accent], speed, output_path)
+    try:
+        jobs.put_nowait(job)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Synthesis queue is full")
+    job.done.wait()
+    if job.error is not None:
+        raise HTTPException(status_code=500, detail=str(job.error))
+    return job.audio
+
+def to_pcm16(audio):
+    """
+    Convert float audio in [-1, 1] to PCM16 bytes.
+    """
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+def to_wav(audio):
+    """
+    Encode float audio as an in-memory PCM16 WAV.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(to_pcm16(audio))
+    return buffer.getvalue()
+
+def streaming_wav_header():
+    """
+    WAV header for a stream of unknown length; the size fields are set to their maximum.
+    """
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+def split_sentences(text):
+    """
+    Split text into sentences for streaming synthesis.
+    """
+    return [sentence for sentence in re.split(r'(?<=[.!?])\s+', text.strip()) if sentence]
+
+
+@app.on_event("startup")
+def warm_up():
+    """
+    Start the model worker and run a throwaway synthesis so the first real request doesn't pay JIT and allocation costs.
+    """
+    threading.Thread(target=synthesis_worker, daemon=True).start()
+    start = time.monotonic()
+    synthesize("Warming up.", 'EN-US', 1.0)
+    logging.info(f"MeloTTS warm-up finished in {time.monotonic() - start:.2f}s on {device}")
 
 
 @app.post("/generate-audio/")
@@ -54,24 +179,65 @@ def generate_audio(request: TextToSpeechRequest):
 
     Returns:
         dict: A dictionary containing a message and the file path of the generated audio.
-    
+
     Raises:
         HTTPException: If the specified accent is invalid or if there is an error during audio generation.
     """
-    if request.accent not in speaker_ids:
-        raise HTTPException(status_code=400, detail="Invalid accent specified")
-    
-    try:
-        # Use the provided filename or generate a unique one
-        output_filename = request.filename
-        
-        # Generate the audio file
-        model.tts_to_file(request.text, speaker_ids[request.accent], output_filename, speed=request.speed)
-        
-        return {"message": "Audio file generated successfully", "file_path": output_filename}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Use the provided filename or generate a unique one
+    output_filename = request.filename
+
+    # Generate the audio file
+    synthesize(request.text, request.accent, request.speed, output_filename)
+
+    return {"message": "Audio file generated successfully", "file_path": output_filename}
+
+
+@app.post("/generate-audio-bytes/")
+def generate_audio_bytes(request: TextToSpeechRequest):
+    """
+    Generate audio from the given text and return it as a WAV response body.
+
+    Args:
+        request (TextToSpeechRequest): The request containing text and other parameters. filename is ignored.
+
+    Returns:
+        Response: The generated audio as audio/wav.
+    """
+    audio = synthesize(request.text, request.accent, request.speed)
+    return Response(content=to_wav(audio), media_type="audio/wav")
+
+
+@app.post("/generate-audio-stream/")
+def generate_audio_stream(request: TextToSpeechRequest):
+    """
+    Generate audio sentence by sentence and stream it as a single WAV as each sentence is ready.
+
+    Args:
+        request (TextToSpeechRequest): The request containing text and other parameters. filename is ignored.
+
+    Returns:
+        StreamingResponse: A WAV stream with an open-ended header followed by PCM16 per sentence.
+    """
+    sentences = split_sentences(request.text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="Text to synthesize is empty")
+    # The first sentence is synthesized before responding, so its errors (bad accent, full queue) still get
+    # a proper status code; after that the headers are sent and a failure can only end the stream early
+    first_audio = synthesize(sentences[0], request.accent, request.speed)
+
+    def stream():
+        yield streaming_wav_header()
+        yield to_pcm16(first_audio)
+        for sentence in sentences[1:]:
+            try:
+                audio = synthesize(sentence, request.accent, request.speed)
+            except HTTPException as e:
+                logging.error(f"Speech synthesis failed mid-stream: {e.detail}")
+                return
+            yield to_pcm16(audio)
+
+    return StreamingResponse(stream(), media_type="audio/wav")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=Config.TTS_PORT_LOCAL)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=Config.TTS_PORT_LOCAL)
@@ -1,4 +1,5 @@
 import requests
+from voice_assistant.clients import get_session
 from voice_assistant.config import Config
 
 
@@ -36,7 +37,7 @@ def generate_audio_file_melotts(text, language='EN', accent='EN-US', speed=1.0,
     }
 
     # Make the POST request
-    response = requests.post(url, json=payload, headers=headers)
+    response = get_session('melotts').post(url, json=payload, headers=headers)
 
     # Check the response
     if response.status_code == 200:
@@ -44,6 +45,56 @@ def generate_audio_file_melotts(text, language='EN', accent='EN-US', speed=1.0,
     else:
         response.raise_for_status()
 
+def generate_audio_bytes_melotts(text, language='EN', accent='EN-US', speed=1.0):
+    """
+    Generate speech for the given text and return it in memory.
+
+    Args:
+        text (str): The text to convert to speech.
+        language (str): The language of the text. Default is 'EN'.
+        accent (str): The accent to use for the speech. Default is 'EN-US'.
+        speed (float): The speed of the speech. Default is 1.0.
+
+    Returns:
+        bytes: The generated audio as WAV.
+    """
+    url = f"http://localhost:{Config.TTS_PORT_LOCAL}/generate-audio-bytes/"
+    payload = {
+        "text": text,
+        "language": language,
+        "accent": accent,
+        "speed": speed
+    }
+    response = get_session('melotts').post(url, json=payload)
+    response.raise_for_status()
+    return response.content
+
+
+def stream_audio_melotts(text, language='EN', accent='EN-US', speed=1.0, chunk_size=4096):
+    """
+    Stream speech for the given text as the server synthesizes it sentence by sentence.
+
+    Args:
+        text (str): The text to convert to speech.
+        language (str): The language of the text. Default is 'EN'.
+        accent (str): The accent to use for the speech. Default is 'EN-US'.
+        speed (float): The speed of the speech. Default is 1.0.
+        chunk_size (int): Size of the chunks read from the response.
+
+    Yields:
+        bytes: Chunks of a single WAV stream.
+    """
+    url = f"http://localhost:{Config.TTS_PORT_LOCAL}/generate-audio-stream/"
+    payload = {
+        "text": text,
+        "language": language,
+        "accent": accent,
+        "speed": speed
+    }
+    with get_session('melotts').post(url, json=payload, stream=True) as response:
+        response.raise_for_status()
+        yield from response.iter_content(chunk_size=chunk_size)
+
 # Example usage of the function
 if __name__ == "__main__":
     try:
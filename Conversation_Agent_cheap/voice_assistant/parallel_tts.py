@@ -0,0 +1,195 @@
+# voice_assistant/parallel_tts.py
+
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from voice_assistant.config import Config
+from voice_assistant.providers import get_provider
+from voice_assistant.text_to_speech import stream_speech
+
+# Marks the end of a sentence's audio on its chunk queue
+_END_OF_STREAM = None
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {"requests": 0, "throttled": 0, "throttled_seconds": 0.0})
+
+
+class RateLimiter:
+    """
+    Limits the requests sent to one provider: how many run at once and how often one starts.
+
+    Use as a context manager around a request; entering blocks until both
+    limits allow it.
+
+    Args:
+    provider (str): The provider name, used to key the stats.
+    max_concurrent (int): Requests allowed in flight at once.
+    requests_per_minute (float): Requests allowed to start per minute; None for no limit.
+    """
+
+    def __init__(self, provider, max_concurrent, requests_per_minute=None):
+        self.provider = provider
+        self.max_concurrent = max_concurrent
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._condition = threading.Condition()
+        self._active = 0
+        # Tickets admit requests in arrival order, so a later sentence never takes the slot an earlier one waits for
+        self._next_ticket = 0
+        self._serving = 0
+        self._next_start = 0.0
+
+    def __enter__(self):
+        waited_from = time.monotonic()
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving or self._active >= self.max_concurrent:
+                self._condition.wait()
+            self._serving += 1
+            self._active += 1
+            self._condition.notify_all()
+            # Requests start at least interval apart, in the order they arrived
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+        waited = time.monotonic() - waited_from
+        with _stats_lock:
+            stats = _stats[self.provider]
+            stats["requests"] += 1
+            if waited > 0.001:
+                stats["throttled"] += 1
+                stats["throttled_seconds"] += waited
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter(provider):
+    """
+    Return the process-wide rate limiter of a TTS provider.
+
+    Its concurrency is the smallest of Config.TTS_WORKERS, the provider's
+    max_concurrency in the registry and Config.TTS_CONCURRENCY_LIMITS; its
+    request rate comes from Config.TTS_REQUESTS_PER_MINUTE.
+    """
+    limits = [Config.TTS_WORKERS, get_provider('tts', provider).max_concurrency,
+              Config.TTS_CONCURRENCY_LIMITS.get(provider)]
+    return RateLimiter(provider, min(limit for limit in limits if limit),
+                       Config.TTS_REQUESTS_PER_MINUTE.get(provider))
+
+
+def get_rate_limit_stats():
+    """
+    Return per-provider counts of TTS requests and of those that waited for the rate limiter.
+    """
+    with _stats_lock:
+        return {provider: dict(values) for provider, values in _stats.items()}
+
+
+@lru_cache(maxsize=None)
+def _get_executor():
+    # Shared by every turn (and gateway session), so Config.TTS_WORKERS bounds synthesis process-wide
+    return ThreadPoolExecutor(max_workers=Config.TTS_WORKERS, thread_name_prefix="tts")
+
+
+class SentenceSpeech:
+    """
+    One sentence's audio, synthesized in the background.
+
+    Attributes:
+        sentence (str): The sentence text.
+        speech_format (str): The format of its audio.
+    """
+
+    def __init__(self, sentence, speech_format):
+        self.sentence = sentence
+        self.speech_format = speech_format
+        self._chunks = queue.Queue()
+        self._error = None
+
+    def chunks(self):
+        """
+        Yield the audio chunks as they arrive, blocking until each is ready.
+
+        Raises:
+        Exception: Whatever synthesis failed with, once the chunks before the failure are consumed.
+        """
+        while True:
+            chunk = self._chunks.get()
+            if chunk is _END_OF_STREAM:
+                break
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+
+class ParallelSpeechSynthesizer:
+    """
+    Synthesize the sentences of a reply concurrently, handing back their audio in order.
+
+    Each submitted sentence is synthesized on a shared pool of
+    Config.TTS_WORKERS threads, within the provider's rate limits, and its
+    chunks are buffered until the consumer reaches it. The consumer plays
+    the sentences in submission order: the first one streams as it is
+    synthesized, and later ones are usually ready by the time it is over.
+
+    Args:
+    model (str): The TTS model to use.
+    api_key (str): The API key for the TTS service.
+    local_model_path (str): The path to the local model (if applicable).
+    speech_format (str): The format to request, from negotiate_speech_format.
+    cancel (threading.Event): When set, sentences not yet started are skipped and running ones stop early.
+    trace (TurnTrace): Trace to mark the start of synthesis on.
+    """
+
+    def __init__(self, model, api_key, local_model_path=None, speech_format=None, cancel=None, trace=None):
+        self.model = model
+        self.api_key = api_key
+        self.local_model_path = local_model_path
+        self.speech_format = speech_format
+        self.cancel = cancel or threading.Event()
+        self.trace = trace
+
+    def submit(self, sentence):
+        """
+        Start synthesizing a sentence once a worker and the rate limiter allow it.
+
+        Returns:
+        SentenceSpeech: The sentence's audio, to be consumed in submission order.
+        """
+        speech = SentenceSpeech(sentence, self.speech_format)
+        _get_executor().submit(self._synthesize, speech)
+        return speech
+
+    def _synthesize(self, speech):
+        try:
+            if self.cancel.is_set():
+                return
+            with get_rate_limiter(self.model):
+                if self.trace is not None:
+                    self.trace.mark("tts_start")
+                chunks = stream_speech(self.model, self.api_key, speech.sentence, self.local_model_path,
+                                       self.speech_format)
+                try:
+                    for chunk in chunks:
+                        if self.cancel.is_set():
+                            break
+                        speech._chunks.put(chunk)
+                finally:
+                    chunks.close()
+        except Exception as e:
+            # Raised to the consumer when it reaches this sentence
+            speech._error = e
+        finally:
+            speech._chunks.put(_END_OF_STREAM)
@@ -0,0 +1,252 @@
+# voice_assistant/pipeline.py
+
+import logging
+import queue
+import threading
+
+from colorama import Fore
+
+from voice_assistant.audio import play_audio
+from voice_assistant.audio_formats import CONTAINER_FORMATS, negotiate_speech_format
+from voice_assistant.barge_in import spoken_prefix
+from voice_assistant.config import Config
+from voice_assistant.hedging import hedged_stream_response, hedged_stream_speech
+from voice_assistant.parallel_tts import ParallelSpeechSynthesizer, SentenceSpeech
+from voice_assistant.playback import get_output_engine
+from voice_assistant.response_generation import stream_response
+from voice_assistant.text_chunking import SentenceChunker
+from voice_assistant.text_to_speech import get_speech_format, stream_speech, synthesize_speech
+from voice_assistant.tracing import TurnTrace
+
+# Marks the end of a stage's output on the queue feeding the next stage
+_END_OF_STREAM = None
+
+
+def _tts_worker(sentences, audio_chunks, tts_model, tts_api_key, local_model_path, trace):
+    """
+    Synthesize each sentence from the sentences queue into in-memory audio.
+
+    Sentences already being synthesized in parallel (SentenceSpeech) are
+    collected as they become ready.
+    """
+    while True:
+        sentence = sentences.get()
+        if sentence is _END_OF_STREAM:
+            break
+        trace.mark("tts_start")
+        try:
+            if isinstance(sentence, SentenceSpeech):
+                audio_chunks.put(b"".join(sentence.chunks()))
+            elif Config.HEDGING:
+                # Played without being told its format, so it needs a container
+                _, _, chunks = hedged_stream_speech(sentence, local_model_path, trace, accepted=CONTAINER_FORMATS)
+                audio_chunks.put(b"".join(chunks))
+            else:
+                audio_chunks.put(synthesize_speech(tts_model, tts_api_key, sentence, local_model_path))
+            trace.mark("tts_first_chunk")
+        except Exception as e:
+            logging.error(f"Failed to convert sentence to speech: {e}")
+        trace.mark("tts_end")
+    audio_chunks.put(_END_OF_STREAM)
+
+
+def _streaming_tts_worker(sentences, tts_model, tts_api_key, local_model_path, cancel, segments, written_at_start,
+                          trace):
+    """
+    Stream each sentence's TTS audio straight into the persistent output engine.
+
+    Playback of earlier sentences continues from the engine's buffer while
+    later ones are being synthesized. The offsets of each sentence in the
+    turn's audio (bytes written to the engine buffer since written_at_start)
+    are appended to segments so an interrupted turn can tell what was heard.
+    """
+    engine = get_output_engine()
+    while True:
+        sentence = sentences.get()
+        if sentence is _END_OF_STREAM:
+            break
+        if cancel.is_set():
+            continue
+        start = engine.buffer.written_bytes - written_at_start
+        trace.mark("tts_start")
+        try:
+            if isinstance(sentence, SentenceSpeech):
+                speech_format, chunks = sentence.speech_format, sentence.chunks()
+                sentence = sentence.sentence
+            elif Config.HEDGING:
+                _, speech_format, chunks = hedged_stream_speech(sentence, local_model_path, trace)
+            else:
+                speech_format = get_speech_format(tts_model)
+                chunks = stream_speech(tts_model, tts_api_key, sentence, local_model_path, speech_format)
+            with engine.open_stream(speech_format) as stream:
+                for chunk in chunks:
+                    if cancel.is_set():
+                        break
+                    trace.mark("tts_first_chunk")
+                    stream.write(chunk)
+            trace.add_cpu_time("audio_decode", stream.cpu_seconds)
+        except Exception as e:
+            logging.error(f"Failed to convert sentence to speech: {e}")
+        trace.mark("tts_end")
+        segments.append((sentence, start, engine.buffer.written_bytes - written_at_start))
+    if not cancel.is_set():
+        engine.drain()
+    # When the turn's first audio played; playback_started_at moves on every resumption after a gap
+    if engine.first_audio_at is not None:
+        trace.mark("playback_start", engine.first_audio_at)
+    trace.mark("playback_end")
+
+
+def _playback_worker(audio_chunks, trace):
+    """
+    Play audio from the audio_chunks queue in order.
+    """
+    while True:
+        audio = audio_chunks.get()
+        if audio is _END_OF_STREAM:
+            break
+        trace.mark("playback_start")
+        play_audio(audio)
+        trace.mark("playback_end")
+
+
+def _sentence_speaker(tts_model, tts_api_key, local_model_path, cancel, trace):
+    """
+    Return the function that turns a chunk of the reply into what is queued for the TTS worker.
+
+    With Config.PARALLEL_TTS each chunk starts synthesizing as soon as it is
+    complete; otherwise it is queued as text for the worker to synthesize in
+    turn. Hedged TTS always runs in turn.
+    """
+    if not Config.PARALLEL_TTS or Config.HEDGING:
+        return lambda sentence: sentence
+    if Config.PERSISTENT_AUDIO_OUTPUT:
+        speech_format = get_speech_format(tts_model)
+    else:
+        # Played without being told its format, so it needs a container
+        speech_format = negotiate_speech_format(tts_model, CONTAINER_FORMATS)
+    synthesizer = ParallelSpeechSynthesizer(tts_model, tts_api_key, local_model_path, speech_format, cancel, trace)
+    return synthesizer.submit
+
+
+def run_streaming_turn(chat_history, response_model, response_api_key, tts_model, tts_api_key,
+                       local_model_path=None, barge_in=None, trace=None, deltas=None):
+    """
+    Generate and speak a reply with the LLM, TTS and playback stages overlapping.
+
+    LLM tokens are split into speakable chunks as they stream in; each chunk is
+    synthesized while generation continues, and playback of the first
+    chunk starts before the full reply exists.
+
+    Args:
+    chat_history (list): The chat history as a list of messages.
+    response_model (str): The model to use for response generation.
+    response_api_key (str): The API key for the response generation service.
+    tts_model (str): The model to use for text-to-speech.
+    tts_api_key (str): The API key for the TTS service.
+    local_model_path (str): The path to the local model (if applicable).
+    barge_in (BargeInMonitor): If given, watches the microphone during the turn; when the user
+        starts speaking, playback, generation and synthesis are cancelled. Requires
+        Config.PERSISTENT_AUDIO_OUTPUT.
+    trace (TurnTrace): Trace to mark the LLM, TTS and playback stage boundaries on.
+    deltas (iterator): An already started response stream to speak, e.g. a speculative response;
+        if None, a response is generated from chat_history.
+
+    Returns:
+    str: The full response text, or only the part the user heard if they interrupted.
+    """
+    trace = trace or TurnTrace(0)
+    sentences = queue.Queue()
+    audio_chunks = queue.Queue()
+    cancel = threading.Event()
+    segments = []
+    # Queued as text, or with Config.PARALLEL_TTS as speech already being synthesized
+    speak = _sentence_speaker(tts_model, tts_api_key, local_model_path, cancel, trace)
+
+    if Config.PERSISTENT_AUDIO_OUTPUT:
+        engine = get_output_engine()
+        engine.start_turn()
+        # The buffer is empty between turns, so both counters start this turn's audio at the same point;
+        # earlier turns' stopped audio was written but never played, so the absolute counts differ
+        written_at_start = engine.buffer.written_bytes
+        played_at_start = engine.buffer.played_bytes
+        tts_thread = threading.Thread(
+            target=_streaming_tts_worker,
+            args=(sentences, tts_model, tts_api_key, local_model_path, cancel, segments, written_at_start, trace),
+            daemon=True
+        )
+        playback_thread = None
+        if barge_in is not None:
+            def interrupt():
+                cancel.set()
+                engine.stop()
+            barge_in.start(interrupt)
+    else:
+        tts_thread = threading.Thread(
+            target=_tts_worker,
+            args=(sentences, audio_chunks, tts_model, tts_api_key, local_model_path, trace),
+            daemon=True
+        )
+        playback_thread = threading.Thread(target=_playback_worker, args=(audio_chunks, trace), daemon=True)
+        playback_thread.start()
+    tts_thread.start()
+
+    response_parts = []
+    chunker = SentenceChunker()
+    trace.mark("llm_start")
+    if deltas is None and Config.HEDGING:
+        deltas = hedged_stream_response(chat_history, local_model_path, trace)
+    elif deltas is None:
+        deltas = stream_response(response_model, response_api_key, chat_history, local_model_path)
+    try:
+        for delta in deltas:
+            if cancel.is_set():
+                break
+            trace.mark("llm_first_token")
+            response_parts.append(delta)
+            for chunk in chunker.feed(delta):
+                sentences.put(speak(chunk))
+        else:
+            for chunk in chunker.flush():
+                sentences.put(speak(chunk))
+    except Exception as e:
+        logging.error(Fore.RED + f"Streaming response generation failed: {e}" + Fore.RESET)
+    finally:
+        # Closing the generator closes the provider's HTTP stream if generation was cut short
+        if hasattr(deltas, "close"):
+            deltas.close()
+        trace.mark("llm_end")
+        sentences.put(_END_OF_STREAM)
+
+    tts_thread.join()
+    if playback_thread is not None:
+        playback_thread.join()
+        return "".join(response_parts)
+
+    if barge_in is not None:
+        barge_in.stop()
+    if cancel.is_set():
+        # Drop anything a decoder flushed into the buffer after the interruption
+        engine.stop()
+        spoken_text = spoken_prefix(segments, engine.buffer.played_bytes - played_at_start)
+        logging.info(f"Playback interrupted; the user heard: {spoken_text}")
+        return spoken_text
+    return "".join(response_parts)
+
+
+def speak_text(text, tts_model, tts_api_key, local_model_path=None, trace=None):
+    """
+    Speak a complete reply sentence by sentence, with synthesis running ahead of playback.
+
+    With Config.PARALLEL_TTS the sentences are synthesized concurrently, so
+    a long reply takes about as long as its slowest few sentences instead of
+    the sum of all of them.
+
+    Args:
+    text (str): The reply to speak.
+    tts_model (str): The model to use for text-to-speech.
+    tts_api_key (str): The API key for the TTS service.
+    local_model_path (str): The path to the local model (if applicable).
+    trace (TurnTrace): Trace to mark the TTS and playback stage boundaries on.
+    """
+    run_streaming_turn(None, None, None, tts_model, tts_api_key, local_model_path, trace=trace, deltas=iter([text]))
@@ -0,0 +1,319 @@
+# voice_assistant/playback.py
+
+import logging
+import os
+import subprocess
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from voice_assistant.audio_formats import Resampler, WavStreamParser, pcm_sample_rate
+from voice_assistant.config import Config
+
+_BYTES_PER_SAMPLE = 2  # PCM16
+
+
+class _JitterBuffer:
+    """
+    PCM16 buffer between the decoders and the audio device callback.
+
+    Playback only starts once prebuffer_bytes are queued (or the writer has
+    signalled the end of the audio), and re-buffers after an underrun, so
+    bursty network chunks don't turn into audible gaps.
+
+    written_bytes and played_bytes count PCM ever written and actually played
+    (silence padding excluded), so callers can tell how far playback got.
+    """
+
+    def __init__(self, prebuffer_bytes):
+        self.prebuffer_bytes = prebuffer_bytes
+        self.underruns = 0
+        self.written_bytes = 0
+        self.played_bytes = 0
+        self._data = bytearray()
+        self._primed = False
+        self._end_of_audio = False
+        self._condition = threading.Condition()
+
+    def write(self, pcm):
+        with self._condition:
+            self._data.extend(pcm)
+            self.written_bytes += len(pcm)
+            self._end_of_audio = False
+            self._condition.notify_all()
+
+    def mark_end(self):
+        with self._condition:
+            self._end_of_audio = True
+            self._condition.notify_all()
+
+    def clear(self):
+        with self._condition:
+            self._data.clear()
+            self._primed = False
+            self._end_of_audio = True
+            self._condition.notify_all()
+
+    def read(self, size):
+        """
+        Return exactly size bytes for the device, padding with silence when not primed or on underrun.
+
+        Returns:
+        tuple: (pcm bytes, whether any real audio was included).
+        """
+        with self._condition:
+            if not self._primed:
+                if len(self._data) >= self.prebuffer_bytes or (self._end_of_audio and self._data):
+                    self._primed = True
+                else:
+                    return bytes(size), False
+            pcm = bytes(self._data[:size])
+            del self._data[:size]
+            self.played_bytes += len(pcm)
+            if len(pcm) < size:
+                if not self._end_of_audio:
+                    self.underruns += 1
+                self._primed = False
+                pcm += bytes(size - len(pcm))
+            if not self._data:
+                self._condition.notify_all()
+            return pcm, True
+
+    def wait_until_empty(self, timeout=None):
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._data, timeout=timeout)
+
+
+class PlaybackStream:
+    """
+    One piece of encoded audio (e.g. one TTS reply or sentence) being decoded into the engine.
+
+    Raw PCM and PCM WAV are converted in-process: the samples go straight to
+    the buffer, resampled once if their rate differs from the engine's.
+    MP3 and Opus are piped through a long-running ffmpeg process that
+    decodes incrementally to PCM16 at the engine's sample rate.
+
+    Attributes:
+        cpu_seconds (float): CPU time spent decoding and resampling this stream, available after close().
+    """
+
+    def __init__(self, engine, input_format=None):
+        self._engine = engine
+        self._decoder = None
+        self._reader = None
+        self._wav = None
+        self._resampler = None
+        self._odd_byte = b""
+        self._detect = input_format is None
+        self.cpu_seconds = 0.0
+        pcm_rate = engine.sample_rate if input_format == "pcm" else pcm_sample_rate(input_format)
+        if pcm_rate is not None:
+            self._resampler = Resampler(pcm_rate, engine.sample_rate)
+        elif input_format == "wav":
+            self._wav = WavStreamParser()
+        elif input_format is not None:
+            self._start_decoder(input_format)
+
+    def _start_decoder(self, input_format=None):
+        command = ["ffmpeg", "-loglevel", "error"]
+        if input_format:
+            command += ["-f", "ogg" if input_format == "opus" else input_format]
+        command += ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(self._engine.sample_rate), "pipe:1"]
+        self._decoder = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+        self._reader = threading.Thread(target=self._read_decoded, daemon=True)
+        self._reader.start()
+
+    def _read_decoded(self):
+        while True:
+            pcm = self._decoder.stdout.read1(4096)
+            if not pcm:
+                break
+            self._engine.buffer.write(pcm)
+
+    def _write_samples(self, samples, last=False):
+        start = time.thread_time()
+        pcm = self._resampler.process(samples, last=last)
+        self.cpu_seconds += time.thread_time() - start
+        if len(pcm):
+            self._engine.buffer.write(pcm.tobytes())
+
+    def _write_decoder(self, chunk):
+        try:
+            self._decoder.stdin.write(chunk)
+            self._decoder.stdin.flush()
+        except BrokenPipeError:
+            logging.error("Audio decoder exited early; dropping audio chunk")
+
+    def write(self, chunk):
+        """
+        Queue a chunk of encoded audio for playback.
+
+        Args:
+        chunk (bytes): The next chunk of audio in this stream's format.
+        """
+        if self._detect:
+            # Only WAV is recognised here; anything else goes to ffmpeg's own detection
+            self._detect = False
+            if chunk[:4] == b"RIFF":
+                self._wav = WavStreamParser()
+            else:
+                self._start_decoder()
+        if self._decoder is not None:
+            self._write_decoder(chunk)
+        elif self._wav is not None:
+            samples = self._wav.feed(chunk)
+            if self._wav.supported is False:
+                # Not 16-bit PCM; let ffmpeg decode it from the start
+                self._start_decoder()
+                self._write_decoder(self._wav.header)
+                self._wav = None
+            elif self._wav.supported:
+                if self._resampler is None:
+                    self._resampler = Resampler(self._wav.sample_rate, self._engine.sample_rate)
+                self._write_samples(samples)
+        else:
+            # Network chunks can split a sample; carry the odd byte over to the next chunk
+            chunk = self._odd_byte + chunk
+            usable = len(chunk) - len(chunk) % _BYTES_PER_SAMPLE
+            self._odd_byte = chunk[usable:]
+            self._write_samples(np.frombuffer(chunk[:usable], dtype=np.int16))
+
+    def close(self):
+        """
+        Signal the end of this stream's input and wait until all of it has been decoded into the buffer.
+        """
+        if self._decoder is None:
+            if self._resampler is not None:
+                self._write_samples(np.zeros(0, dtype=np.int16), last=True)
+            return
+        try:
+            self._decoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        if hasattr(os, "wait4"):
+            # Reap ffmpeg ourselves to get the CPU time it used
+            _, status, usage = os.wait4(self._decoder.pid, 0)
+            self._decoder.returncode = os.waitstatus_to_exitcode(status)
+            self.cpu_seconds += usage.ru_utime + usage.ru_stime
+        else:
+            self._decoder.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AudioOutputEngine:
+    """
+    Persistent audio output that keeps the device open between turns.
+
+    Audio is written through PlaybackStream objects, buffered in a jitter
+    buffer and pulled by the sounddevice callback. While idle the device
+    simply plays silence.
+
+    Attributes:
+        sample_rate (int): Output sample rate in Hz.
+        buffer (_JitterBuffer): The PCM buffer feeding the device.
+        playback_started_at (float): time.monotonic() when audio last started after silence.
+        first_audio_at (float): time.monotonic() when audio first played since start_turn(); None until then.
+    """
+
+    def __init__(self, sample_rate=None, prebuffer_ms=None, blocksize=None):
+        self.sample_rate = sample_rate or Config.AUDIO_OUTPUT_SAMPLE_RATE
+        prebuffer_ms = Config.AUDIO_PREBUFFER_MS if prebuffer_ms is None else prebuffer_ms
+        self.buffer = _JitterBuffer(int(self.sample_rate * prebuffer_ms / 1000) * _BYTES_PER_SAMPLE)
+        self.playback_started_at = None
+        self.first_audio_at = None
+        self._playing = False
+        # Imported here so servers without an audio device can use the rest of the module
+        import sounddevice as sd
+
+        self._stream = sd.RawOutputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype="int16",
+            blocksize=blocksize or Config.AUDIO_OUTPUT_BLOCKSIZE,
+            callback=self._callback,
+        )
+        self._stream.start()
+        logging.info(f"Audio output engine started at {self.sample_rate} Hz")
+
+    def _callback(self, outdata, frames, time_info, status):
+        pcm, has_audio = self.buffer.read(len(outdata))
+        outdata[:] = pcm
+        if has_audio and not self._playing:
+            self.playback_started_at = time.monotonic()
+            if self.first_audio_at is None:
+                self.first_audio_at = self.playback_started_at
+        self._playing = has_audio
+
+    def start_turn(self):
+        """
+        Start timing a new turn: first_audio_at is set again by the next audio played.
+        """
+        self.first_audio_at = None
+
+    def open_stream(self, input_format=None):
+        """
+        Start a new stream of encoded audio.
+
+        Args:
+        input_format (str): 'pcm_<rate>', 'wav', 'opus', 'mp3', 'pcm' (PCM16 at the engine's rate),
+            or None to detect it.
+
+        Returns:
+        PlaybackStream: The stream to write chunks to.
+        """
+        return PlaybackStream(self, input_format)
+
+    def play(self, audio, input_format=None):
+        """
+        Queue a complete piece of encoded audio and return without waiting for it to play.
+
+        Args:
+        audio (bytes): The encoded audio.
+        input_format (str): As for open_stream.
+        """
+        with self.open_stream(input_format) as stream:
+            stream.write(audio)
+
+    def drain(self, timeout=None):
+        """
+        Block until everything queued so far has been played.
+
+        Args:
+        timeout (float): Maximum time to wait in seconds.
+
+        Returns:
+        bool: True if the buffer drained before the timeout.
+        """
+        self.buffer.mark_end()
+        return self.buffer.wait_until_empty(timeout)
+
+    def stop(self):
+        """
+        Discard all queued audio immediately.
+        """
+        self.buffer.clear()
+
+    def close(self):
+        """
+        Stop playback and release the audio device.
+        """
+        self.stop()
+        self._stream.stop()
+        self._stream.close()
+
+
+@lru_cache(maxsize=None)
+def get_output_engine():
+    """
+    Return the process-wide audio output engine, opening the device on first use.
+    """
+    return AudioOutputEngine()
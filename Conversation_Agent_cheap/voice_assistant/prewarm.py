@@ -0,0 +1,175 @@
+# voice_assistant/prewarm.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from voice_assistant.api_key_manager import get_api_key
+from voice_assistant.clients import get_client, get_session
+from voice_assistant.config import Config
+from voice_assistant.hedging import hedge_providers
+from voice_assistant.local_llm import get_local_llm
+from voice_assistant.local_stt import get_local_transcriber
+from voice_assistant.providers import SERVICE_MODELS, load_provider, selected_provider
+from voice_assistant.resilience import failover_chain
+from voice_assistant.transcription import check_fastwhisperapi
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def selected_providers():
+    """
+    Return the (service, provider) pairs this configuration will use.
+
+    That is the provider selected in Config for each service, plus the
+    hedging alternates when Config.HEDGING is set.
+    """
+    providers = []
+    for service in SERVICE_MODELS:
+        names = hedge_providers(service) if Config.HEDGING else [selected_provider(service)]
+        providers += [(service, name) for name in dict.fromkeys(names)]
+    return providers
+
+
+def failover_providers():
+    """
+    Return the (service, provider) pairs that failover may move requests to, excluding the selected providers.
+
+    Empty unless Config.RESILIENCE is set.
+    """
+    if not Config.RESILIENCE:
+        return []
+    selected = set(selected_providers())
+    providers = []
+    for service in SERVICE_MODELS:
+        providers += [(service, name) for name in failover_chain(service, selected_provider(service))[1:]
+                      if (service, name) not in selected]
+    return providers
+
+
+def _warm_openai_compatible(service, provider, system_prompt):
+    api_key = get_api_key(service, provider)
+    if api_key:
+        # A free request that opens the pooled TLS connection
+        get_client(provider, api_key).models.list()
+
+
+def _warm_sdk_client(service, provider, system_prompt):
+    api_key = get_api_key(service, provider)
+    if api_key:
+        get_client(provider, api_key)
+
+
+def _warm_ollama(service, provider, system_prompt):
+    # Loads the model into memory and caches the system prompt's KV state
+    get_client('ollama', None).chat(
+        model=Config.OLLAMA_LLM,
+        messages=[{"role": "system", "content": system_prompt}],
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
+        options={"num_predict": 1},
+    )
+
+
+def _warm_fastwhisperapi(service, provider, system_prompt):
+    check_fastwhisperapi()
+
+
+def _warm_http_server(url):
+    def warm(service, provider, system_prompt):
+        if url():
+            # Any response will do; the point is the open keep-alive connection
+            get_session(provider).get(url(), timeout=Config.HTTP_TIMEOUT)
+    return warm
+
+
+def _warm_local_transcriber(service, provider, system_prompt):
+    get_local_transcriber()
+
+
+def _warm_local_llm(service, provider, system_prompt):
+    get_local_llm(Config.LOCAL_MODEL_PATH).warm(system_prompt)
+
+
+# How to warm each provider once its modules are imported, keyed by (service, provider)
+_WARMERS = {
+    ("transcription", "openai"): _warm_openai_compatible,
+    ("transcription", "groq"): _warm_openai_compatible,
+    ("transcription", "deepgram"): _warm_sdk_client,
+    ("transcription", "fastwhisperapi"): _warm_fastwhisperapi,
+    ("transcription", "local"): _warm_local_transcriber,
+    ("response", "openai"): _warm_openai_compatible,
+    ("response", "groq"): _warm_openai_compatible,
+    ("response", "ollama"): _warm_ollama,
+    ("response", "local"): _warm_local_llm,
+    ("tts", "openai"): _warm_openai_compatible,
+    ("tts", "deepgram"): _warm_sdk_client,
+    ("tts", "elevenlabs"): _warm_sdk_client,
+    ("tts", "cartesia"): _warm_sdk_client,
+    ("tts", "melotts"): _warm_http_server(lambda: f"http://localhost:{Config.TTS_PORT_LOCAL}/"),
+    ("tts", "piper"): _warm_http_server(lambda: Config.PIPER_SERVER_URL),
+}
+
+
+def _warm_provider(service, provider, system_prompt, import_only=False):
+    start = time.monotonic()
+    error = None
+    try:
+        load_provider(service, provider)
+        warmer = None if import_only else _WARMERS.get((service, provider))
+        if warmer:
+            warmer(service, provider, system_prompt)
+    except Exception as e:
+        # The turn that needs the provider will report the failure properly
+        error = str(e)
+        logging.warning(f"Failed to pre-warm {service} provider '{provider}': {e}")
+    with _lock:
+        _stats[f"{service}:{provider}"] = {"seconds": time.monotonic() - start, "error": error}
+
+
+def prewarm(system_prompt):
+    """
+    Import and warm up every selected provider, in parallel, and wait until they are ready.
+
+    Imports each provider's SDK, opens its pooled connection with a cheap
+    request, and loads local models (the local LLM also caches the system
+    prompt). The failover backends only have their modules imported, unless
+    Config.PREWARM_FAILOVER is set: loading their models would compete with
+    the first turn for a failover that may never happen. Failures are logged
+    and otherwise ignored.
+
+    Args:
+    system_prompt (str): The assistant's system prompt, cached by the LLMs that support it.
+    """
+    start = time.monotonic()
+    failover = failover_providers()
+    providers = selected_providers() + failover
+    with ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="prewarm") as executor:
+        for service, provider in providers:
+            import_only = (service, provider) in failover and not Config.PREWARM_FAILOVER
+            executor.submit(_warm_provider, service, provider, system_prompt, import_only)
+    logging.info(f"Pre-warmed {len(providers)} providers in {time.monotonic() - start:.2f}s")
+
+
+def prewarm_in_background(system_prompt):
+    """
+    Run prewarm on a daemon thread, so it overlaps with the first recording.
+
+    A turn that reaches a provider before it is warm just waits for (or
+    repeats) the remaining work, so nothing needs to wait for this thread.
+
+    Returns:
+    threading.Thread: The started thread.
+    """
+    thread = threading.Thread(target=prewarm, args=(system_prompt,), name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_prewarm_stats():
+    """
+    Return the seconds spent warming each provider and any error, keyed by 'service:provider'.
+    """
+    with _lock:
+        return {key: dict(values) for key, values in _stats.items()}
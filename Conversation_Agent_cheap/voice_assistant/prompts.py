@@ -0,0 +1,31 @@
+# voice_assistant/prompts.py
+
+from voice_assistant.knowledge_base import get_knowledge_base
+
+OBJECTIVE = """## Objective
+You are Rafa, a helpful and polite voice assistant for Dubai Constructions Company. You assist users by answering their questions about inventory, equipment, safety gear, and spare parts."""
+
+RESPONSE_STYLE = """## Response Style
+- Always answer factually and politely.
+- If a user asks something outside the known information, respond with: "I currently don't have that information."
+- Be warm and professional in tone, reflecting the Dubai Constructions Company brand."""
+
+
+def build_system_prompt():
+    """
+    Build the assistant's system prompt, with the inventory and contact sections written from Config.INVENTORY_DATA_PATH.
+
+    The knowledge base answers direct lookups from the same data, so the two can't drift apart.
+
+    Returns:
+    str: The system prompt.
+    """
+    knowledge_base = get_knowledge_base()
+    if knowledge_base is None:
+        inventory = "## Knowledge Base\nThe inventory data could not be loaded."
+    else:
+        inventory = knowledge_base.prompt_section()
+    return f"{OBJECTIVE}\n\n{inventory}\n\n{RESPONSE_STYLE}\n"
+
+
+SYSTEM_PROMPT = build_system_prompt()
@@ -0,0 +1,229 @@
+# voice_assistant/providers.py
+
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from voice_assistant.config import Config
+
+# Config attribute holding the selected provider of each service
+SERVICE_MODELS = {
+    "transcription": "TRANSCRIPTION_MODEL",
+    "response": "RESPONSE_MODEL",
+    "tts": "TTS_MODEL",
+}
+
+# Config value that selects the fastest viable provider at startup (see resolve_auto_providers)
+AUTO = "auto"
+
+
+class Provider:
+    """
+    Capabilities of one backend for one service.
+
+    The service modules dispatch on these (e.g. text_to_speech only streams
+    from providers with streaming_output), and the scheduler uses them to
+    pick providers and size worker pools.
+
+    Attributes:
+        name (str): The provider's Config value, e.g. 'deepgram'.
+        modules (tuple): Third-party modules it needs, imported on first use.
+        api_key (str): The Config attribute holding its API key, or None if it needs none.
+        requires (tuple): Other Config attributes that must be set for it to be usable.
+        streaming_input (bool): Whether it accepts its input incrementally (audio frames, text deltas).
+        streaming_output (bool): Whether it returns its output incrementally (tokens, audio chunks).
+        formats (tuple): Audio format kinds a TTS provider can return (see audio_formats).
+        pcm_sample_rates (tuple): Raw PCM sample rates a TTS provider can produce; None means any rate.
+        max_concurrency (int): Requests it serves at once; None means no practical limit.
+        typical_latency (float): Typical seconds to the first result (text, token or audio chunk).
+        selectable (bool): Whether 'auto' may pick it.
+    """
+
+    def __init__(self, name, modules=(), api_key=None, requires=(), streaming_input=False, streaming_output=False,
+                 formats=(), pcm_sample_rates=None, max_concurrency=None, typical_latency=1.0, selectable=True):
+        self.name = name
+        self.modules = tuple(modules)
+        self.api_key = api_key
+        self.requires = tuple(requires)
+        self.streaming_input = streaming_input
+        self.streaming_output = streaming_output
+        self.formats = tuple(formats)
+        self.pcm_sample_rates = pcm_sample_rates
+        self.max_concurrency = max_concurrency
+        self.typical_latency = typical_latency
+        self.selectable = selectable
+
+    def __repr__(self):
+        return f"Provider({self.name!r})"
+
+
+def _registry(*providers):
+    return {provider.name: provider for provider in providers}
+
+
+# Every backend of each service. To add one, declare it here and add its handlers to the service module's
+# dispatch tables (transcription.py, response_generation.py or text_to_speech.py).
+PROVIDERS = {
+    "transcription": _registry(
+        Provider("openai", modules=["openai"], api_key="OPENAI_API_KEY", typical_latency=0.8),
+        Provider("groq", modules=["groq"], api_key="GROQ_API_KEY", typical_latency=0.35),
+        Provider("deepgram", modules=["deepgram"], api_key="DEEPGRAM_API_KEY", typical_latency=0.4),
+        Provider("fastwhisperapi", requires=["FASTWHISPERAPI_URL"], max_concurrency=1, typical_latency=1.0),
+        Provider("local", modules=["faster_whisper"], max_concurrency=1, typical_latency=0.7),
+    ),
+    "response": _registry(
+        Provider("openai", modules=["openai"], api_key="OPENAI_API_KEY", streaming_output=True,
+                 typical_latency=0.5),
+        Provider("groq", modules=["groq"], api_key="GROQ_API_KEY", streaming_output=True, typical_latency=0.2),
+        Provider("ollama", modules=["ollama"], streaming_output=True, max_concurrency=1, typical_latency=0.6),
+        Provider("local", modules=["llama_cpp"], requires=["LOCAL_MODEL_PATH"], streaming_output=True,
+                 max_concurrency=1, typical_latency=0.4),
+    ),
+    "tts": _registry(
+        Provider("openai", modules=["openai"], api_key="OPENAI_API_KEY", streaming_output=True,
+                 formats=["pcm", "opus", "mp3", "wav"], pcm_sample_rates=(24000,), typical_latency=0.5),
+        Provider("deepgram", modules=["deepgram"], api_key="DEEPGRAM_API_KEY", formats=["pcm", "wav", "opus", "mp3"],
+                 pcm_sample_rates=(8000, 16000, 24000, 32000, 48000), typical_latency=0.35),
+        Provider("elevenlabs", modules=["elevenlabs"], api_key="ELEVENLABS_API_KEY", streaming_output=True,
+                 formats=["pcm", "mp3"], pcm_sample_rates=(16000, 22050, 24000, 44100), typical_latency=0.3),
+        Provider("cartesia", modules=["cartesia"], api_key="CARTESIA_API_KEY", streaming_output=True,
+                 formats=["pcm", "wav", "mp3"], typical_latency=0.1),
+        # local_tts_api.py runs one model that synthesizes a request at a time
+        Provider("melotts", streaming_output=True, formats=["wav"], max_concurrency=1, typical_latency=0.4),
+        # piper_server.py runs PIPER_POOL_SIZE (default 2) persistent processes
+        Provider("piper", requires=["PIPER_SERVER_URL"], streaming_output=True, formats=["wav"], max_concurrency=2,
+                 typical_latency=0.1),
+        Provider("local", formats=["wav"], selectable=False),
+    ),
+}
+
+_lock = threading.Lock()
+_import_stats = {}
+
+
+def get_provider(service, name):
+    """
+    Return the registered provider of a service.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    name (str): The provider's Config value.
+
+    Returns:
+    Provider: Its capabilities.
+
+    Raises:
+    ValueError: If the provider is not registered for the service.
+    """
+    provider = PROVIDERS.get(service, {}).get(name)
+    if provider is None:
+        raise ValueError(f"Unsupported {service} model '{name}'. Must be one of {list(PROVIDERS.get(service, {}))}")
+    return provider
+
+
+def selected_provider(service):
+    """
+    Return the provider name selected in Config for a service ('transcription', 'response' or 'tts').
+    """
+    return getattr(Config, SERVICE_MODELS[service])
+
+
+def is_configured(provider):
+    """
+    Return whether a provider's API key and other required Config values are set.
+    """
+    attributes = provider.requires + ((provider.api_key,) if provider.api_key else ())
+    return all(getattr(Config, attribute, None) for attribute in attributes)
+
+
+def is_viable(provider, streaming_output=None):
+    """
+    Return whether a provider can be used here: configured, its modules installed, and
+    streaming its output if streaming_output is True.
+    """
+    if streaming_output and not provider.streaming_output:
+        return False
+    if not is_configured(provider):
+        return False
+    return all(importlib.util.find_spec(module) is not None for module in provider.modules)
+
+
+def fastest_provider(service, streaming_output=None):
+    """
+    Return the viable selectable provider of a service with the lowest typical latency.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    streaming_output (bool): Only consider providers that stream their output.
+
+    Returns:
+    str: The provider name, or None if no provider is viable.
+    """
+    candidates = [provider for provider in PROVIDERS[service].values()
+                  if provider.selectable and is_viable(provider, streaming_output)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda provider: provider.typical_latency).name
+
+
+def resolve_auto_providers():
+    """
+    Replace each Config model set to 'auto' with the fastest viable provider of its service.
+
+    TTS prefers providers that stream their audio, so playback can start
+    before a sentence is fully synthesized.
+
+    Raises:
+    ValueError: If no provider of an 'auto' service is viable.
+    """
+    for service, attribute in SERVICE_MODELS.items():
+        if getattr(Config, attribute) != AUTO:
+            continue
+        name = None
+        if service == "tts":
+            name = fastest_provider(service, streaming_output=True)
+        name = name or fastest_provider(service)
+        if name is None:
+            raise ValueError(f"No {service} provider is configured; set {attribute} or the API key of a provider")
+        setattr(Config, attribute, name)
+        logging.info(f"Selected {service} provider '{name}'")
+
+
+@lru_cache(maxsize=None)
+def load_provider(service, provider):
+    """
+    Import the third-party modules a provider needs.
+
+    Imports happen once per process; later calls return the cached modules.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    provider (str): The provider's Config value, e.g. 'deepgram'.
+
+    Returns:
+    list: The imported modules.
+
+    Raises:
+    ValueError: If the provider is not known for the service.
+    ImportError: If one of its modules is not installed.
+    """
+    names = get_provider(service, provider).modules
+    start = time.perf_counter()
+    modules = [importlib.import_module(name) for name in names]
+    seconds = time.perf_counter() - start
+    with _lock:
+        _import_stats[f"{service}:{provider}"] = seconds
+    if names:
+        logging.info(f"Imported {', '.join(names)} for {service} provider '{provider}' in {seconds * 1000:.0f}ms")
+    return modules
+
+
+def get_import_stats():
+    """
+    Return the seconds spent importing each loaded provider's modules, keyed by 'service:provider'.
+    """
+    with _lock:
+        return dict(_import_stats)
@@ -0,0 +1,526 @@
+# voice_assistant/resilience.py
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+import requests
+
+from voice_assistant.api_key_manager import get_api_key
+from voice_assistant.audio_formats import source_speech_format
+from voice_assistant.clients import request_deadline
+from voice_assistant.config import Config
+from voice_assistant.providers import PROVIDERS, get_provider, is_viable
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Sentinel for a stream that ended without producing anything
+_EMPTY = object()
+
+_lock = threading.Lock()
+_breakers = {}
+_stats = defaultdict(lambda: {"calls": 0, "retries": 0, "failovers": 0, "failures": 0, "not_retried": 0})
+
+# HTTP statuses worth retrying: timeouts, rate limits and server errors; any other 4xx is the request's fault
+_RETRYABLE_STATUSES = {408, 425, 429}
+
+
+class ProviderUnavailableError(Exception):
+    """
+    Raised when no provider of a service could serve a request: each one's breaker was open or its attempts failed.
+    """
+
+
+def _status_code(error):
+    # SDK errors carry status_code; httpx and requests errors carry the response
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error):
+    """
+    Return whether an error says the provider is failing, so the request may be retried or failed over.
+
+    Transport errors, timeouts, 5xx, 408 and 429 responses are retryable.
+    Other 4xx responses (bad request, auth, not found) and errors such as
+    ValueError or TypeError come from the request itself: another attempt
+    would fail the same way, and they say nothing about the provider's health.
+
+    Args:
+    error (Exception): The error an attempt raised.
+
+    Returns:
+    bool: True if the error is retryable.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status in _RETRYABLE_STATUSES
+    if isinstance(error, (requests.RequestException, httpx.HTTPError, OSError, TimeoutError)):
+        return True
+    return not isinstance(error, (ValueError, TypeError, KeyError, AttributeError, NotImplementedError))
+
+
+def _not_retried(service, provider, error):
+    with _lock:
+        _stats[service]["not_retried"] += 1
+    logging.warning(f"{service} provider '{provider}' rejected the request, not retrying: {error}")
+
+
+def backoff_delay(attempt, base, cap, jitter=1.0):
+    """
+    Return an exponential backoff delay with jitter.
+
+    Args:
+    attempt (int): Failures so far, from 0; the delay doubles with each.
+    base (float): The delay after the first failure, in seconds.
+    cap (float): The longest delay, in seconds.
+    jitter (float): Fraction of the delay that is randomized; 1.0 is "full jitter", anywhere from 0 to the delay.
+
+    Returns:
+    float: The delay in seconds.
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return delay * (1 - jitter * random.random())
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one provider and stops sending it requests while it is failing.
+
+    Closed, requests go through. After Config.BREAKER_FAILURE_THRESHOLD
+    consecutive failures the breaker opens and requests are rejected at once,
+    so callers move straight on to a failover provider instead of waiting out
+    another timeout. Once the cooldown has passed, one probe request is let
+    through (half-open): if it succeeds the breaker closes, if it fails the
+    breaker opens again for twice as long, up to Config.BREAKER_MAX_COOLDOWN.
+    Cooldowns are jittered so sessions sharing a provider don't probe it in lockstep.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    provider (str): The provider's Config value.
+    """
+
+    def __init__(self, service, provider):
+        self.service = service
+        self.provider = provider
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        # Times the breaker has opened since the provider last succeeded; sets the cooldown
+        self._trips = 0
+        self._retry_at = 0.0
+        self._last_error = None
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self):
+        """
+        Return whether a request may be sent to the provider now, counting it as rejected if not.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now >= self._retry_at:
+                # Let one probe through; if it never reports back, another follows after the same cooldown
+                self.state = HALF_OPEN
+                self._retry_at = now + self._cooldown()
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            if self.state != CLOSED:
+                logging.info(f"Circuit breaker for {self.service} provider '{self.provider}' closed")
+            self.state = CLOSED
+            self._consecutive_failures = 0
+            self._trips = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            self._last_error = str(error)
+            if self.state == HALF_OPEN or self._consecutive_failures >= Config.BREAKER_FAILURE_THRESHOLD:
+                cooldown = self._cooldown()
+                self._trips += 1
+                self._stats["opened"] += 1
+                self.state = OPEN
+                self._retry_at = time.monotonic() + cooldown
+                logging.warning(f"Circuit breaker for {self.service} provider '{self.provider}' opened for "
+                                f"{cooldown:.1f}s after {self._consecutive_failures} consecutive failures: {error}")
+
+    def _cooldown(self):
+        return backoff_delay(self._trips, Config.BREAKER_COOLDOWN, Config.BREAKER_MAX_COOLDOWN, Config.BREAKER_JITTER)
+
+    def snapshot(self):
+        """
+        Return the breaker's state, its counts, the seconds until it lets a probe through and the last error.
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive_failures,
+                "retry_in_seconds": max(0.0, self._retry_at - time.monotonic()) if self.state != CLOSED else 0.0,
+                "last_error": self._last_error,
+                **self._stats,
+            }
+
+
+def get_breaker(service, provider):
+    """
+    Return the process-wide circuit breaker of a provider.
+    """
+    with _lock:
+        breaker = _breakers.get((service, provider))
+        if breaker is None:
+            breaker = _breakers[(service, provider)] = CircuitBreaker(service, provider)
+        return breaker
+
+
+def failover_chain(service, provider, speech_format=None):
+    """
+    Return the providers to try for a request, the requested one first.
+
+    The rest come from Config.FAILOVER_PROVIDERS, skipping any that are not
+    viable here (see providers.is_viable) and, for TTS, any that can't
+    deliver speech_format.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    provider (str): The provider the request is for.
+    speech_format (str): For TTS, the format the caller expects.
+
+    Returns:
+    list: Provider names in the order they are tried.
+    """
+    providers = [provider]
+    for name in Config.FAILOVER_PROVIDERS.get(service, []):
+        candidate = PROVIDERS[service].get(name)
+        if name in providers or candidate is None or not is_viable(candidate):
+            continue
+        if speech_format and source_speech_format(name, speech_format) is None:
+            continue
+        providers.append(name)
+    return providers
+
+
+def _candidates(service, provider, api_key, failover, speech_format):
+    # Yields (provider, its API key, its breaker) for each provider to try
+    with _lock:
+        _stats[service]["calls"] += 1
+    providers = failover_chain(service, provider, speech_format) if failover else [provider]
+    for index, candidate in enumerate(providers):
+        if index:
+            logging.warning(f"Failing over from {service} provider '{providers[index - 1]}' to '{candidate}'")
+            with _lock:
+                _stats[service]["failovers"] += 1
+        yield candidate, api_key if candidate == provider else get_api_key(service, candidate), \
+            get_breaker(service, candidate)
+
+
+def _retry_delay(service, provider, attempt, deadline):
+    """
+    Return how long to wait before retrying a provider, or None if the retry would not fit before the deadline.
+    """
+    if attempt + 1 >= Config.RETRY_MAX_ATTEMPTS:
+        return None
+    delay = backoff_delay(attempt, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY)
+    # Only retry if the provider typically answers before the deadline even after the wait
+    if time.monotonic() + delay + get_provider(service, provider).typical_latency > deadline:
+        return None
+    with _lock:
+        _stats[service]["retries"] += 1
+    return delay
+
+
+def _unavailable(service, last_error):
+    with _lock:
+        _stats[service]["failures"] += 1
+    return ProviderUnavailableError(f"No {service} provider is available: {last_error or 'every circuit is open'}")
+
+
+def call_with_failover(service, provider, api_key, attempt, failover=True, speech_format=None):
+    """
+    Run a request on a provider, retrying it and failing over to the local backends if it keeps failing.
+
+    Each provider is retried with exponential backoff and full jitter while
+    the retry still fits in the service's Config.RETRY_DEADLINES budget;
+    providers whose circuit breaker is open are skipped without a request.
+    Each attempt's requests time out at that deadline (see
+    clients.request_deadline), so a brownout costs the budget rather than
+    Config.HTTP_TIMEOUT before failover. Every failover provider gets at
+    least one attempt, even past the deadline, without that cap. Errors that
+    is_retryable rejects are raised at once and don't count against the
+    provider's breaker.
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    provider (str): The provider the request is for.
+    api_key (str): Its API key; failover providers use their own.
+    attempt (callable): Sends the request, called as attempt(provider, api_key).
+    failover (bool): Whether to fall back to Config.FAILOVER_PROVIDERS; hedged requests do their own.
+    speech_format (str): For TTS, the format the caller expects, which failover providers must deliver.
+
+    Returns:
+    tuple: (the provider that served the request, its result).
+
+    Raises:
+    ProviderUnavailableError: If every provider failed or was skipped.
+    Exception: The error of an attempt that is_retryable rejects.
+    """
+    if not Config.RESILIENCE:
+        return provider, attempt(provider, api_key)
+    deadline = time.monotonic() + Config.RETRY_DEADLINES[service]
+    last_error = None
+    for candidate, candidate_api_key, breaker in _candidates(service, provider, api_key, failover, speech_format):
+        for attempt_number in range(Config.RETRY_MAX_ATTEMPTS):
+            if not breaker.allow():
+                break
+            try:
+                with request_deadline(deadline if time.monotonic() < deadline else None):
+                    result = attempt(candidate, candidate_api_key)
+            except Exception as e:
+                if not is_retryable(e):
+                    _not_retried(service, candidate, e)
+                    raise
+                breaker.record_failure(e)
+                last_error = e
+                logging.warning(f"{service} provider '{candidate}' failed: {e}")
+                delay = _retry_delay(service, candidate, attempt_number, deadline)
+                if delay is None:
+                    break
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            return candidate, result
+    raise _unavailable(service, last_error) from last_error
+
+
+async def call_with_failover_async(service, provider, api_key, attempt, failover=True, speech_format=None):
+    """
+    Run a request like call_with_failover, without blocking the event loop.
+
+    Each attempt is cancelled at the deadline rather than having its requests' timeouts capped.
+
+    Args:
+    attempt (callable): Sends the request, called as await attempt(provider, api_key).
+
+    Returns:
+    tuple: (the provider that served the request, its result).
+    """
+    if not Config.RESILIENCE:
+        return provider, await attempt(provider, api_key)
+    deadline = time.monotonic() + Config.RETRY_DEADLINES[service]
+    last_error = None
+    for candidate, candidate_api_key, breaker in _candidates(service, provider, api_key, failover, speech_format):
+        for attempt_number in range(Config.RETRY_MAX_ATTEMPTS):
+            if not breaker.allow():
+                break
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    result = await asyncio.wait_for(attempt(candidate, candidate_api_key), remaining)
+                else:
+                    result = await attempt(candidate, candidate_api_key)
+            except Exception as e:
+                if not is_retryable(e):
+                    _not_retried(service, candidate, e)
+                    raise
+                breaker.record_failure(e)
+                last_error = e
+                logging.warning(f"{service} provider '{candidate}' failed: {e}")
+                delay = _retry_delay(service, candidate, attempt_number, deadline)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return candidate, result
+    raise _unavailable(service, last_error) from last_error
+
+
+def _close(chunks):
+    close = getattr(chunks, "close", None)
+    if callable(close):
+        close()
+
+
+class FailoverStream:
+    """
+    Iterator over a streamed response (tokens or audio chunks) with retries and failover before its first item.
+
+    A stream counts as served once it produces its first item; until then it
+    is retried and failed over like call_with_failover. An error after that
+    is recorded on the provider's breaker and raised, since the items already
+    consumed can't be taken back. The request starts on the first next().
+
+    Args:
+    service (str): 'transcription', 'response' or 'tts'.
+    provider (str): The provider the request is for.
+    api_key (str): Its API key; failover providers use their own.
+    open_stream (callable): Starts the stream, called as open_stream(provider, api_key); returns an iterable.
+    failover (bool): Whether to fall back to Config.FAILOVER_PROVIDERS.
+    speech_format (str): For TTS, the format the caller expects.
+
+    Attributes:
+        provider (str): The provider serving the stream, once it has started.
+    """
+
+    def __init__(self, service, provider, api_key, open_stream, failover=True, speech_format=None):
+        self.service = service
+        self.provider = None
+        self._request = (provider, api_key, open_stream, failover, speech_format)
+        self._first = _EMPTY
+        self._chunks = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._chunks is None:
+            self._start()
+        if self._first is not _EMPTY:
+            first, self._first = self._first, _EMPTY
+            return first
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise
+        except Exception as e:
+            if Config.RESILIENCE and is_retryable(e):
+                get_breaker(self.service, self.provider).record_failure(e)
+            raise
+
+    def _start(self):
+        provider, api_key, open_stream, failover, speech_format = self._request
+
+        def attempt(candidate, candidate_api_key):
+            chunks = iter(open_stream(candidate, candidate_api_key))
+            try:
+                return next(chunks, _EMPTY), chunks
+            except Exception:
+                _close(chunks)
+                raise
+
+        self.provider, (self._first, self._chunks) = call_with_failover(
+            self.service, provider, api_key, attempt, failover, speech_format)
+
+    def close(self):
+        # Closing the provider's generator closes its HTTP stream
+        if self._chunks is not None:
+            _close(self._chunks)
+
+
+class AsyncFailoverStream:
+    """
+    Async iterator over a streamed response, like FailoverStream.
+
+    Args:
+    open_stream (callable): Starts the stream, called as open_stream(provider, api_key); returns an async iterable.
+
+    Attributes:
+        provider (str): The provider serving the stream, once it has started.
+    """
+
+    def __init__(self, service, provider, api_key, open_stream, failover=True, speech_format=None):
+        self.service = service
+        self.provider = None
+        self._request = (provider, api_key, open_stream, failover, speech_format)
+        self._first = _EMPTY
+        self._chunks = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._chunks is None:
+            await self._start()
+        if self._first is not _EMPTY:
+            first, self._first = self._first, _EMPTY
+            return first
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            raise
+        except Exception as e:
+            if Config.RESILIENCE and is_retryable(e):
+                get_breaker(self.service, self.provider).record_failure(e)
+            raise
+
+    async def _start(self):
+        provider, api_key, open_stream, failover, speech_format = self._request
+
+        async def attempt(candidate, candidate_api_key):
+            chunks = open_stream(candidate, candidate_api_key).__aiter__()
+            try:
+                return await chunks.__anext__(), chunks
+            except StopAsyncIteration:
+                return _EMPTY, chunks
+            except BaseException:
+                # Including the cancellation at the attempt's deadline
+                await _aclose(chunks)
+                raise
+
+        self.provider, (self._first, self._chunks) = await call_with_failover_async(
+            self.service, provider, api_key, attempt, failover, speech_format)
+
+    async def aclose(self):
+        if self._chunks is not None:
+            await _aclose(self._chunks)
+
+
+async def _aclose(chunks):
+    aclose = getattr(chunks, "aclose", None)
+    if callable(aclose):
+        await aclose()
+
+
+def get_resilience_stats():
+    """
+    Return retry and failover counts per service, and the circuit breaker of each provider used so far.
+
+    Returns:
+    dict: 'services' maps each service to its calls, retries, failovers, failures (requests no provider
+    could serve) and not_retried (requests raised at once, see is_retryable); 'breakers' maps
+    'service:provider' to CircuitBreaker.snapshot().
+    """
+    with _lock:
+        services = {service: dict(stats) for service, stats in _stats.items()}
+        breakers = dict(_breakers)
+    return {
+        "services": services,
+        "breakers": {f"{service}:{provider}": breaker.snapshot() for (service, provider), breaker in breakers.items()},
+    }
+
+
+# Breaker states as Prometheus gauge values
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def prometheus_lines():
+    """
+    Render the circuit breakers in the Prometheus text exposition format, as a list of lines.
+    """
+    lines = [
+        "# HELP voice_provider_circuit_state Circuit breaker state per provider: 0 closed, 1 half-open, 2 open.",
+        "# TYPE voice_provider_circuit_state gauge",
+    ]
+    rejected = ["# HELP voice_provider_rejected_total Requests skipped because the provider's circuit was open.",
+                "# TYPE voice_provider_rejected_total counter"]
+    for key, breaker in sorted(get_resilience_stats()["breakers"].items()):
+        service, provider = key.split(":", 1)
+        labels = f'service="{service}",provider="{provider}"'
+        lines.append(f"voice_provider_circuit_state{{{labels}}} {_STATE_VALUES[breaker['state']]}")
+        rejected.append(f"voice_provider_rejected_total{{{labels}}} {breaker['rejected']}")
+    return lines + rejected
@@ -1,64 +1,279 @@
 # voice_assistant/response_generation.py
 
+import asyncio
 import logging
 
-from openai import OpenAI
-from groq import Groq
-import ollama
-
+from voice_assistant.clients import get_async_client, get_client
 from voice_assistant.config import Config
+from voice_assistant.local_llm import get_local_llm, record_generation_speed
+from voice_assistant.providers import get_provider
+from voice_assistant.resilience import AsyncFailoverStream, FailoverStream, call_with_failover
+from voice_assistant.utils import iterate_in_thread
 
 
 def generate_response(model:str, api_key:str, chat_history:list, local_model_path:str=None):
     """
     Generate a response using the specified model.
+
+    Failed requests are retried, and fail over to the local backends in
+    Config.FAILOVER_PROVIDERS (see voice_assistant/resilience.py).
     
     Args:
-    model (str): The model to use for response generation ('openai', 'groq', 'local').
+    model (str): A response provider registered in voice_assistant.providers ('openai', 'groq', 'ollama', 'local').
     api_key (str): The API key for the response generation service.
     chat_history (list): The chat history as a list of messages.
-    local_model_path (str): The path to the local model (if applicable).
+    local_model_path (str): The path to the local GGUF model for 'local'; defaults to Config.LOCAL_MODEL_PATH.
 
     Returns:
     str: The generated response text.
     """
     try:
-        if model == 'openai':
-            return _generate_openai_response(api_key, chat_history)
-        elif model == 'groq':
-            return _generate_groq_response(api_key, chat_history)
-        elif model == 'ollama':
-            return _generate_ollama_response(chat_history)
-        elif model == 'local':
-            # Placeholder for local LLM response generation
-            return "Generated response from local model"
-        else:
-            raise ValueError("Unsupported response generation model")
+        get_provider('response', model)
+        _, text = call_with_failover(
+            'response', model, api_key,
+            lambda provider, provider_api_key: _GENERATORS[provider](provider_api_key, chat_history, local_model_path))
+        return text
     except Exception as e:
         logging.error(f"Failed to generate response: {e}")
         return "Error in generating response"
 
-def _generate_openai_response(api_key, chat_history):
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model=Config.OPENAI_LLM,
-        messages=chat_history
+def stream_response(model:str, api_key:str, chat_history:list, local_model_path:str=None):
+    """
+    Stream a response token by token using the specified model.
+
+    Providers without streaming output fall back to a single delta holding the
+    full response from generate_response. As with generate_response, errors are
+    logged rather than raised; if nothing was streamed yet the error message is
+    yielded in place of the response.
+
+    Args:
+    model (str): A response provider registered in voice_assistant.providers.
+    api_key (str): The API key for the response generation service.
+    chat_history (list): The chat history as a list of messages.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Yields:
+    str: Text deltas of the generated response, in order.
+    """
+    streamed = False
+    try:
+        for delta in stream_response_deltas(model, api_key, chat_history, local_model_path):
+            streamed = True
+            yield delta
+    except Exception as e:
+        logging.error(f"Failed to stream response: {e}")
+        if not streamed:
+            yield "Error in generating response"
+
+def stream_response_deltas(model:str, api_key:str, chat_history:list, local_model_path:str=None, failover:bool=True):
+    """
+    Stream a response token by token like stream_response, but raise provider errors instead of logging them.
+
+    A request that fails before its first token is retried and, with
+    failover, moved to the local backends in Config.FAILOVER_PROVIDERS.
+
+    Returns:
+    FailoverStream: Text deltas of the generated response, in order.
+    """
+    get_provider('response', model)
+    return FailoverStream(
+        'response', model, api_key,
+        lambda provider, provider_api_key: _stream_provider_deltas(provider, provider_api_key, chat_history,
+                                                                   local_model_path),
+        failover)
+
+def _stream_provider_deltas(provider, api_key, chat_history, local_model_path):
+    if get_provider('response', provider).streaming_output:
+        return _STREAMERS[provider](api_key, chat_history, local_model_path)
+    return iter([_GENERATORS[provider](api_key, chat_history, local_model_path)])
+
+async def generate_response_async(model:str, api_key:str, chat_history:list, local_model_path:str=None):
+    """
+    Generate a response like generate_response, without blocking the event loop.
+
+    Returns:
+    str: The generated response text.
+    """
+    parts = []
+    async for delta in stream_response_async(model, api_key, chat_history, local_model_path):
+        parts.append(delta)
+    return "".join(parts)
+
+async def stream_response_async(model:str, api_key:str, chat_history:list, local_model_path:str=None):
+    """
+    Stream a response token by token like stream_response, without blocking the event loop.
+
+    Errors are logged rather than raised; if nothing was streamed yet the error
+    message is yielded in place of the response.
+
+    Yields:
+    str: Text deltas of the generated response, in order.
+    """
+    streamed = False
+    deltas = None
+    try:
+        deltas = stream_response_deltas_async(model, api_key, chat_history, local_model_path)
+        async for delta in deltas:
+            streamed = True
+            yield delta
+    except Exception as e:
+        logging.error(f"Failed to stream response: {e}")
+        if not streamed:
+            yield "Error in generating response"
+    finally:
+        if deltas is not None:
+            await deltas.aclose()
+
+def stream_response_deltas_async(model:str, api_key:str, chat_history:list, local_model_path:str=None,
+                                 failover:bool=True):
+    """
+    Stream a response like stream_response_deltas, using the providers' async clients.
+
+    Providers without an async client stream on a worker thread, or generate
+    the full response there if they don't stream.
+
+    Returns:
+    AsyncFailoverStream: Text deltas of the generated response, in order.
+    """
+    get_provider('response', model)
+    return AsyncFailoverStream(
+        'response', model, api_key,
+        lambda provider, provider_api_key: _stream_provider_deltas_async(provider, provider_api_key, chat_history,
+                                                                         local_model_path),
+        failover)
+
+async def _stream_provider_deltas_async(provider, api_key, chat_history, local_model_path):
+    streamer = _ASYNC_STREAMERS.get(provider)
+    if streamer is not None:
+        async for delta in streamer(api_key, chat_history):
+            yield delta
+    elif get_provider('response', provider).streaming_output:
+        # e.g. llama.cpp, which runs on the CPU; generate on a worker thread and stream tokens back to the loop
+        async for delta in iterate_in_thread(_STREAMERS[provider](api_key, chat_history, local_model_path)):
+            yield delta
+    else:
+        yield await asyncio.to_thread(_GENERATORS[provider], api_key, chat_history, local_model_path)
+
+# Chat model used by each OpenAI-compatible API, as a Config attribute
+_LLM_SETTINGS = {'openai': 'OPENAI_LLM', 'groq': 'GROQ_LLM'}
+
+
+def _openai_compatible_streamer(provider):
+    def stream_deltas(api_key, chat_history, local_model_path=None):
+        stream = get_client(provider, api_key).chat.completions.create(
+            model=getattr(Config, _LLM_SETTINGS[provider]),
+            messages=chat_history,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    return stream_deltas
+
+
+def _async_openai_compatible_streamer(provider):
+    async def stream_deltas(api_key, chat_history):
+        stream = await get_async_client(provider, api_key).chat.completions.create(
+            model=getattr(Config, _LLM_SETTINGS[provider]),
+            messages=chat_history,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+    return stream_deltas
+
+
+def _openai_compatible_generator(provider):
+    def generate(api_key, chat_history, local_model_path=None):
+        response = get_client(provider, api_key).chat.completions.create(
+            model=getattr(Config, _LLM_SETTINGS[provider]),
+            messages=chat_history
+        )
+        return response.choices[0].message.content
+    return generate
+
+
+def _stream_ollama_response(api_key, chat_history, local_model_path=None):
+    stream = get_client('ollama', None).chat(
+        model=Config.OLLAMA_LLM,
+        messages=chat_history,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
+        stream=True,
     )
-    return response.choices[0].message.content
+    for chunk in stream:
+        content = chunk['message']['content']
+        if content:
+            yield content
+        if chunk['done']:
+            _record_ollama_speed(chunk)
 
 
-def _generate_groq_response(api_key, chat_history):
-    client = Groq(api_key=api_key)
-    response = client.chat.completions.create(
-        model=Config.GROQ_LLM,
-        messages=chat_history
+async def _stream_ollama_response_async(api_key, chat_history):
+    stream = await get_async_client('ollama', None).chat(
+        model=Config.OLLAMA_LLM,
+        messages=chat_history,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
+        stream=True,
     )
-    return response.choices[0].message.content
+    async for chunk in stream:
+        content = chunk['message']['content']
+        if content:
+            yield content
+        if chunk['done']:
+            _record_ollama_speed(chunk)
+
+
+def _record_ollama_speed(response):
+    # Ollama reports its own timings in nanoseconds; prompt_eval_count excludes the tokens it reused from the KV cache
+    if response.get('eval_count') and response.get('eval_duration'):
+        record_generation_speed(
+            'ollama', response['eval_count'], response['eval_duration'] / 1e9,
+            (response.get('load_duration') or 0) / 1e9 + (response.get('prompt_eval_duration') or 0) / 1e9,
+            response.get('prompt_eval_count'),
+        )
 
 
-def _generate_ollama_response(chat_history):
-    response = ollama.chat(
+def _generate_ollama_response(api_key, chat_history, local_model_path=None):
+    response = get_client('ollama', None).chat(
         model=Config.OLLAMA_LLM,
         messages=chat_history,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
     )
-    return response['message']['content']
\ No newline at end of file
+    _record_ollama_speed(response)
+    return response['message']['content']
+
+
+def _stream_local_response(api_key, chat_history, local_model_path=None):
+    return get_local_llm(local_model_path).stream(chat_history)
+
+
+def _generate_local_response(api_key, chat_history, local_model_path=None):
+    return "".join(get_local_llm(local_model_path).stream(chat_history))
+
+
+# Response handlers of the providers registered in voice_assistant.providers
+_GENERATORS = {
+    'openai': _openai_compatible_generator('openai'),
+    'groq': _openai_compatible_generator('groq'),
+    'ollama': _generate_ollama_response,
+    'local': _generate_local_response,
+}
+
+# Streaming handlers of the providers with streaming_output
+_STREAMERS = {
+    'openai': _openai_compatible_streamer('openai'),
+    'groq': _openai_compatible_streamer('groq'),
+    'ollama': _stream_ollama_response,
+    'local': _stream_local_response,
+}
+
+# Providers with a native async client
+_ASYNC_STREAMERS = {
+    'openai': _async_openai_compatible_streamer('openai'),
+    'groq': _async_openai_compatible_streamer('groq'),
+    'ollama': _stream_ollama_response_async,
+}
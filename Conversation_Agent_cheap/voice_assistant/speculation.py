@@ -0,0 +1,250 @@
+# voice_assistant/speculation.py
+
+import logging
+import queue
+import re
+import threading
+from collections import defaultdict
+
+from voice_assistant.config import Config
+from voice_assistant.response_generation import stream_response, stream_response_deltas
+from voice_assistant.transcription import transcribe_audio
+from voice_assistant.vad import pcm_to_wav
+
+# Marks the end of a speculative response on its delta queue
+_END_OF_STREAM = None
+
+_stats = defaultdict(int)
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def transcript_distance(a, b):
+    """
+    Word-level edit distance between two transcripts, as a fraction of the longer one's words.
+
+    Case and punctuation are ignored.
+
+    Args:
+    a (str): The first transcript.
+    b (str): The second transcript.
+
+    Returns:
+    float: 0.0 for identical transcripts up to 1.0 for completely different ones.
+    """
+    a_words = re.findall(r"[\w']+", a.lower())
+    b_words = re.findall(r"[\w']+", b.lower())
+    if not a_words and not b_words:
+        return 0.0
+    previous = list(range(len(b_words) + 1))
+    for i, a_word in enumerate(a_words, 1):
+        current = [i]
+        for j, b_word in enumerate(b_words, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a_word != b_word)))
+        previous = current
+    return previous[-1] / max(len(a_words), len(b_words))
+
+
+class _SpeculativeStream:
+    """
+    A response generated in the background for a partial transcript, buffered until it is used or cancelled.
+    """
+
+    def __init__(self, transcript, chat_history, response_model, response_api_key, local_model_path):
+        self.transcript = transcript
+        self.failed = False
+        self._deltas = queue.Queue()
+        self._cancel = threading.Event()
+        messages = chat_history + [{"role": "user", "content": transcript}]
+        self._thread = threading.Thread(
+            target=self._run, args=(messages, response_model, response_api_key, local_model_path), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, messages, response_model, response_api_key, local_model_path):
+        try:
+            deltas = stream_response_deltas(response_model, response_api_key, messages, local_model_path)
+            try:
+                for delta in deltas:
+                    if self._cancel.is_set():
+                        break
+                    self._deltas.put(delta)
+            finally:
+                # Closing the generator closes the provider's HTTP stream
+                close = getattr(deltas, "close", None)
+                if callable(close):
+                    close()
+        except Exception as e:
+            logging.warning(f"Speculative response generation failed: {e}")
+            self.failed = True
+            self._deltas.put(e)
+        self._deltas.put(_END_OF_STREAM)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def stream(self):
+        """
+        Yield the buffered deltas followed by the rest of the response as it streams in.
+        """
+        try:
+            while True:
+                delta = self._deltas.get()
+                if delta is _END_OF_STREAM:
+                    return
+                if isinstance(delta, Exception):
+                    raise delta
+                yield delta
+        finally:
+            self.cancel()
+
+
+class SpeculativeResponder:
+    """
+    Starts generating the reply to a turn while the user is still finishing it.
+
+    Pass on_pause to record_utterance: each pause in the user's speech is
+    transcribed in the background and response generation starts on that
+    partial transcript. A later pause with a materially different transcript
+    replaces the speculation. Since each partial transcription is a paid
+    request, a pause is only transcribed after Config.SPECULATION_MIN_NEW_SPEECH_MS
+    of new speech, and at most Config.SPECULATION_MAX_PER_UTTERANCE times.
+    Once the final transcript is known, resolve() hands over the speculative
+    response if the two transcripts are within Config.SPECULATION_MAX_EDIT_DISTANCE,
+    and cancels it otherwise.
+
+    Args:
+    chat_history (list): The chat history before this turn's user message.
+    transcription_model (str): The model used to transcribe the partial utterances.
+    transcription_api_key (str): The API key for the transcription service.
+    response_model (str): The model to use for response generation.
+    response_api_key (str): The API key for the response generation service.
+    local_model_path (str): The path to the local model (if applicable).
+    """
+
+    def __init__(self, chat_history, transcription_model, transcription_api_key, response_model, response_api_key,
+                 local_model_path=None):
+        self.chat_history = list(chat_history)
+        self.transcription_model = transcription_model
+        self.transcription_api_key = transcription_api_key
+        self.response_model = response_model
+        self.response_api_key = response_api_key
+        self.local_model_path = local_model_path
+        self._lock = threading.Lock()
+        self._latest_pause = 0
+        # Bytes of speech already transcribed, to measure the new speech at the next pause
+        self._transcribed_bytes = 0
+        self._resolved = False
+        self._speculation = None
+
+    def on_pause(self, pcm, sample_rate):
+        """
+        Transcribe the speech so far in the background and speculate on it. Returns immediately.
+
+        Args:
+        pcm (bytes): The PCM16 mono speech so far.
+        sample_rate (int): Its sample rate.
+        """
+        with self._lock:
+            if self._resolved:
+                return
+            new_speech_ms = (len(pcm) - self._transcribed_bytes) * 1000 / (2 * sample_rate)
+            if (self._latest_pause >= Config.SPECULATION_MAX_PER_UTTERANCE
+                    or new_speech_ms < Config.SPECULATION_MIN_NEW_SPEECH_MS):
+                _count("skipped")
+                return
+            self._latest_pause += 1
+            self._transcribed_bytes = len(pcm)
+            pause = self._latest_pause
+        threading.Thread(target=self._speculate, args=(pause, pcm_to_wav(pcm, sample_rate)), daemon=True).start()
+
+    def _speculate(self, pause, audio):
+        try:
+            transcript = transcribe_audio(self.transcription_model, self.transcription_api_key, audio,
+                                          self.local_model_path)
+        except Exception as e:
+            logging.warning(f"Partial transcription failed: {e}")
+            return
+        if not transcript or not transcript.strip():
+            return
+        with self._lock:
+            # A newer pause or the final transcript has superseded this one
+            if pause != self._latest_pause or self._resolved:
+                return
+            if self._speculation is not None:
+                if transcript_distance(self._speculation.transcript, transcript) <= Config.SPECULATION_MAX_EDIT_DISTANCE:
+                    return
+                self._speculation.cancel()
+                _count("replaced")
+            logging.info(f"Speculating on partial transcript: {transcript}")
+            _count("started")
+            self._speculation = _SpeculativeStream(transcript, self.chat_history, self.response_model,
+                                                   self.response_api_key, self.local_model_path)
+
+    def resolve(self, final_transcript):
+        """
+        Return the speculative response if it was generated for (nearly) the final transcript.
+
+        Args:
+        final_transcript (str): The transcript of the complete utterance.
+
+        Returns:
+        iterator: Text deltas of the speculative response, or None if there is no usable
+        speculation and the caller should generate the response itself.
+        """
+        with self._lock:
+            self._resolved = True
+            speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            _count("missed")
+            return None
+        distance = transcript_distance(speculation.transcript, final_transcript)
+        if speculation.failed or distance > Config.SPECULATION_MAX_EDIT_DISTANCE:
+            speculation.cancel()
+            _count("rejected")
+            logging.info(f"Discarding speculative response (transcript distance {distance:.2f})")
+            return None
+        _count("accepted")
+        return self._stream_with_fallback(speculation, final_transcript)
+
+    def _stream_with_fallback(self, speculation, final_transcript):
+        # A speculation that fails before its first token would leave the turn silent, so generate anew
+        deltas = speculation.stream()
+        try:
+            first = next(deltas)
+        except StopIteration:
+            return
+        except Exception as e:
+            logging.warning(f"Speculative response failed before its first token, generating it again: {e}")
+            _count("regenerated")
+            messages = self.chat_history + [{"role": "user", "content": final_transcript}]
+            yield from stream_response(self.response_model, self.response_api_key, messages, self.local_model_path)
+            return
+        try:
+            yield first
+            yield from deltas
+        finally:
+            deltas.close()
+
+    def cancel(self):
+        """
+        Stop any speculation, e.g. when the turn is abandoned.
+        """
+        with self._lock:
+            self._resolved = True
+            speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            speculation.cancel()
+
+
+def get_speculation_stats():
+    """
+    Return counts of speculative responses started, replaced, accepted, rejected and regenerated after failing,
+    of pauses skipped by the per-utterance limits, and of turns with none.
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,123 @@
+# voice_assistant/text_chunking.py
+
+from voice_assistant.config import Config
+
+_SENTENCE_TERMINALS = ".!?"
+_CLAUSE_BREAKS = ",;:—"
+
+# Words that end in a period without ending the sentence
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "no", "st", "vs", "approx", "e.g", "i.e", "inc", "co", "ltd"}
+
+
+class SentenceChunker:
+    """
+    Incrementally split streamed LLM text into speakable chunks.
+
+    Chunks end at sentence boundaries once they reach min_chars, so very short
+    sentences are merged with the next one. To get the first audio out quickly,
+    the first chunk may also end at a clause boundary (comma, semicolon, colon,
+    dash) once it reaches first_clause_min_chars; later chunks only break at a
+    clause when they grow past clause_min_chars. Text with no usable boundary
+    is force-split at a word boundary after max_chars.
+
+    Attributes:
+        min_chars (int): Minimum length of a chunk ending at a sentence boundary.
+        first_clause_min_chars (int): Minimum length of a first chunk ending at a clause boundary.
+        clause_min_chars (int): Minimum length of a later chunk ending at a clause boundary.
+        max_chars (int): Length after which a chunk is force-split.
+    """
+
+    def __init__(self, min_chars=None, first_clause_min_chars=None, clause_min_chars=None, max_chars=None):
+        self.min_chars = Config.CHUNK_MIN_CHARS if min_chars is None else min_chars
+        self.first_clause_min_chars = (Config.CHUNK_FIRST_CLAUSE_MIN_CHARS
+                                       if first_clause_min_chars is None else first_clause_min_chars)
+        self.clause_min_chars = Config.CHUNK_CLAUSE_MIN_CHARS if clause_min_chars is None else clause_min_chars
+        self.max_chars = Config.CHUNK_MAX_CHARS if max_chars is None else max_chars
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, delta):
+        """
+        Add a text delta and return any chunks that are now complete.
+
+        Args:
+        delta (str): The next piece of streamed text.
+
+        Returns:
+        list: Complete chunks, in order.
+        """
+        self._buffer += delta
+        chunks = []
+        while True:
+            cut = self._find_boundary()
+            if cut is None:
+                break
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:].lstrip()
+            if chunk:
+                chunks.append(chunk)
+                self._emitted += 1
+        return chunks
+
+    def flush(self):
+        """
+        Return whatever text remains once the stream has ended.
+
+        Returns:
+        list: The final chunk, or an empty list if nothing is left.
+        """
+        chunk = self._buffer.strip()
+        self._buffer = ""
+        if not chunk:
+            return []
+        self._emitted += 1
+        return [chunk]
+
+    def _find_boundary(self):
+        buffer = self._buffer
+        clause_min_chars = self.first_clause_min_chars if self._emitted == 0 else self.clause_min_chars
+        # A boundary needs the following character to be known, so the last character is never a candidate
+        for i in range(len(buffer) - 1):
+            char = buffer[i]
+            if char == "\n":
+                if i >= self.min_chars:
+                    return i + 1
+                continue
+            if not buffer[i + 1].isspace():
+                continue
+            if char in _SENTENCE_TERMINALS:
+                if i + 1 >= self.min_chars and not _is_abbreviation(buffer, i):
+                    return i + 1
+            elif char in _CLAUSE_BREAKS and i + 1 >= clause_min_chars:
+                return i + 1
+        if len(buffer) > self.max_chars:
+            cut = buffer.rfind(" ", 0, self.max_chars)
+            return cut if cut > 0 else self.max_chars
+        return None
+
+
+def _is_abbreviation(buffer, period_index):
+    if buffer[period_index] != ".":
+        return False
+    word_start = period_index
+    while word_start > 0 and not buffer[word_start - 1].isspace():
+        word_start -= 1
+    word = buffer[word_start:period_index].lower().lstrip("(\"'")
+    return word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+
+def iter_speakable_chunks(deltas, chunker=None):
+    """
+    Turn a stream of text deltas into a stream of speakable chunks.
+
+    Args:
+    deltas (iterable): Text deltas, e.g. from response_generation.stream_response.
+    chunker (SentenceChunker): The chunker to use. A default one is created if omitted.
+
+    Yields:
+    str: Speakable chunks, in order.
+    """
+    chunker = chunker or SentenceChunker()
+    for delta in deltas:
+        yield from chunker.feed(delta)
+    yield from chunker.flush()
@@ -1,103 +1,479 @@
+import asyncio
+import functools
 import logging
-import json
-import pyaudio
-import elevenlabs
-import soundfile as sf
-import requests
-import wave
-
-from openai import OpenAI
-from deepgram import DeepgramClient, SpeakOptions
-from elevenlabs.client import ElevenLabs
-from cartesia import Cartesia
 
+from voice_assistant.audio_formats import (CONTAINER_FORMATS, PcmConverter, negotiate_speech_format, pcm_sample_rate,
+                                           source_speech_format)
+from voice_assistant.clients import get_async_client, get_async_session, get_client, get_session, get_transport
 from voice_assistant.config import Config
-from voice_assistant.local_tts_generation import generate_audio_file_melotts
+from voice_assistant.local_tts_generation import generate_audio_bytes_melotts, stream_audio_melotts
+from voice_assistant.providers import get_provider
+from voice_assistant.resilience import AsyncFailoverStream, FailoverStream, call_with_failover, call_with_failover_async
+from voice_assistant.tts_cache import cache_key, cached_synthesize_speech, get_tts_cache, get_tts_voice
+from voice_assistant.utils import iterate_in_thread
 
 def text_to_speech(model: str, api_key: str, text: str, output_file_path: str, local_model_path: str = None):
     """
     Convert text to speech using the specified model.
-    
+
     Args:
-    model (str): The model to use for TTS ('openai', 'deepgram', 'elevenlabs', 'cartesia', 'melotts', 'piper', 'local').
+    model (str): A TTS provider registered in voice_assistant.providers ('openai', 'deepgram', 'elevenlabs',
+        'cartesia', 'melotts', 'piper', 'local').
     api_key (str): The API key for the TTS service.
     text (str): The text to convert to speech.
     output_file_path (str): The path to save the generated speech audio file.
     local_model_path (str): The path to the local model (if applicable).
+
+    Raises:
+    Exception: If no audio could be produced, so the caller doesn't play a missing or stale file.
     """
-    
+
     try:
-        if model == 'openai':
-            client = OpenAI(api_key=api_key)
-            speech_response = client.audio.speech.create(
-                model="tts-1",
-                voice="nova",
-                input=text
-            )
-            speech_response.stream_to_file(output_file_path)
-        
-        elif model == 'deepgram':
-            client = DeepgramClient(api_key=api_key)
-            options = SpeakOptions(
-                model="aura-arcas-en",
-                encoding="linear16",
-                container="wav"
-            )
-            SPEAK_OPTIONS = {"text": text}
-            response = client.speak.v("1").save(output_file_path, SPEAK_OPTIONS, options)
-        
-        elif model == 'elevenlabs':
-            client = ElevenLabs(api_key=api_key)
-            audio = client.generate(
-                text=text, 
-                voice="Paul J.", 
-                output_format="mp3_22050_32", 
-                model="eleven_turbo_v2"
-            )
-            elevenlabs.save(audio, output_file_path)
-        
-        elif model == 'cartesia':
-            client = Cartesia(api_key=api_key)
-            audio_generator = client.tts.bytes(
-                model_id="sonic-2",
-                transcript=text,
-                voice={"id": "a0e99841-438c-4a64-b679-ae501e7d6091"},
-                output_format={
-                    "container": "mp3",
-                    "bit_rate": 128000,
-                    "sample_rate": 44100 # Example bit rate for MP3
-                }
-            )
-            with open(output_file_path, "wb") as f:
-                for chunk in audio_generator:
-                    f.write(chunk)
-        elif model == "melotts":
-            generate_audio_file_melotts(text=text, filename=output_file_path)
-        
-        elif model == "piper":
-            try:
-                response = requests.post(
-                    f"{Config.PIPER_SERVER_URL}/synthesize/",
-                    json={"text": text},
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code == 200:
-                    with open(output_file_path, "wb") as f:
-                        f.write(response.content)
-                    logging.info(f"Piper TTS output saved to {output_file_path}")
-                else:
-                    logging.error(f"Piper TTS API error: {response.status_code} - {response.text}")
-            
-            except Exception as e:
-                logging.error(f"Piper TTS request failed: {e}")
-        
-        elif model == 'local':
-            with open(output_file_path, "wb") as f:
-                f.write(b"Local TTS audio data")
-        
-        filtered_text = text.replace('\n', ' ').replace('\r', ' ')
-        logging.info(f"Text to speech conversion completed for model '{model}' with text: '{filtered_text}'")
-        
+        audio = synthesize_speech(model, api_key, text, local_model_path)
+        with open(output_file_path, "wb") as f:
+            f.write(audio)
     except Exception as e:
-        logging.error(f"Failed to convert text to speech: {e}")
\ No newline at end of file
+        logging.error(f"Failed to convert text to speech: {e}")
+        raise
+
+async def text_to_speech_async(model: str, api_key: str, text: str, output_file_path: str, local_model_path: str = None):
+    """
+    Convert text to speech like text_to_speech, without blocking the event loop.
+    """
+    try:
+        audio = await synthesize_speech_async(model, api_key, text, local_model_path)
+        await asyncio.to_thread(_write_file, output_file_path, audio)
+    except Exception as e:
+        logging.error(f"Failed to convert text to speech: {e}")
+        raise
+
+def _write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def get_speech_format(model: str) -> str:
+    """
+    Return the format to request from the given TTS model for local playback.
+
+    Args:
+    model (str): The TTS model name.
+
+    Returns:
+    str: 'pcm_<rate>', 'wav', 'opus' or 'mp3', as negotiated by negotiate_speech_format.
+    """
+    return negotiate_speech_format(model)
+
+def _openai_response_format(speech_format):
+    # OpenAI's 'pcm' is PCM16 at 24 kHz
+    return 'pcm' if pcm_sample_rate(speech_format) else speech_format
+
+def _elevenlabs_output_format(speech_format):
+    return speech_format if pcm_sample_rate(speech_format) else "mp3_22050_32"
+
+def _cartesia_output_format(speech_format):
+    sample_rate = pcm_sample_rate(speech_format)
+    if sample_rate:
+        return {"container": "raw", "encoding": "pcm_s16le", "sample_rate": sample_rate}
+    if speech_format == 'wav':
+        return {"container": "wav", "encoding": "pcm_s16le", "sample_rate": Config.AUDIO_OUTPUT_SAMPLE_RATE}
+    return {"container": "mp3", "bit_rate": 128000, "sample_rate": 44100}
+
+def _deepgram_options(speech_format):
+    from deepgram import SpeakOptions
+
+    sample_rate = pcm_sample_rate(speech_format)
+    if sample_rate:
+        return SpeakOptions(model=Config.TTS_VOICES['deepgram'], encoding="linear16", container="none",
+                            sample_rate=sample_rate)
+    if speech_format == 'opus':
+        return SpeakOptions(model=Config.TTS_VOICES['deepgram'], encoding="opus", container="ogg")
+    if speech_format == 'mp3':
+        return SpeakOptions(model=Config.TTS_VOICES['deepgram'], encoding="mp3")
+    return SpeakOptions(model=Config.TTS_VOICES['deepgram'], encoding="linear16", container="wav")
+
+def stream_speech(model: str, api_key: str, text: str, local_model_path: str = None, speech_format: str = None,
+                  failover: bool = True):
+    """
+    Convert text to speech and yield the encoded audio as it arrives.
+
+    Providers with streaming_output yield chunks as they arrive from the
+    network; the others yield the complete audio from synthesize_speech as
+    one chunk. A request that fails before its first chunk is retried and,
+    with failover, moved to the local backends in Config.FAILOVER_PROVIDERS,
+    whose audio is converted to speech_format.
+
+    Args:
+    model (str): The model to use for TTS.
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    local_model_path (str): The path to the local model (if applicable).
+    speech_format (str): The format to request, from negotiate_speech_format; defaults to get_speech_format(model).
+    failover (bool): Whether to fall back to other providers; hedged requests pass False.
+
+    Yields:
+    bytes: Chunks of audio in speech_format.
+    """
+    speech_format = speech_format or get_speech_format(model)
+    get_provider('tts', model)
+    stream = FailoverStream(
+        'tts', model, api_key,
+        lambda provider, provider_api_key: _stream_provider_speech(provider, provider_api_key, text,
+                                                                   local_model_path, speech_format),
+        failover, speech_format)
+    if not Config.TTS_CACHE:
+        try:
+            yield from stream
+        finally:
+            stream.close()
+        return
+
+    cache = get_tts_cache()
+    audio = cache.get(cache_key(model, get_tts_voice(model), speech_format, text))
+    if audio is not None:
+        yield audio
+        return
+    chunks = []
+    try:
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        stream.close()
+    # Keyed by the provider that answered, so a failover voice never stands in for the requested one
+    cache.put(cache_key(stream.provider, get_tts_voice(stream.provider), speech_format, text), b"".join(chunks))
+
+def _stream_provider_speech(provider, api_key, text, local_model_path, speech_format):
+    # Requests the closest format the provider has and converts it, for a failover provider without speech_format
+    source_format = source_speech_format(provider, speech_format) or speech_format
+    if get_provider('tts', provider).streaming_output:
+        chunks = _SPEECH_STREAMERS[provider](api_key, text, source_format)
+    else:
+        chunks = iter([_synthesize_provider_speech(provider, api_key, text, local_model_path, source_format)])
+    if source_format == speech_format:
+        return chunks
+    return _convert_to_pcm(chunks, pcm_sample_rate(speech_format))
+
+def _convert_to_pcm(chunks, sample_rate):
+    converter = PcmConverter(sample_rate)
+    try:
+        for chunk in chunks:
+            pcm = converter.feed(chunk)
+            if pcm:
+                yield pcm
+        pcm = converter.flush()
+        if pcm:
+            yield pcm
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+def _stream_openai_speech(api_key, text, speech_format):
+    client = get_client('openai', api_key)
+    with client.audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice=Config.TTS_VOICES['openai'],
+        input=text,
+        response_format=_openai_response_format(speech_format)
+    ) as speech_response:
+        yield from speech_response.iter_bytes()
+
+def _stream_elevenlabs_speech(api_key, text, speech_format):
+    client = get_client('elevenlabs', api_key)
+    yield from client.generate(
+        text=text,
+        voice=Config.TTS_VOICES['elevenlabs'],
+        output_format=_elevenlabs_output_format(speech_format),
+        model="eleven_turbo_v2",
+        stream=True
+    )
+
+def _stream_cartesia_speech(api_key, text, speech_format):
+    client = get_client('cartesia', api_key)
+    yield from client.tts.bytes(
+        model_id="sonic-2",
+        transcript=text,
+        voice={"id": Config.TTS_VOICES['cartesia']},
+        output_format=_cartesia_output_format(speech_format)
+    )
+
+def _stream_melotts_speech(api_key, text, speech_format):
+    yield from stream_audio_melotts(text=text, accent=Config.TTS_VOICES['melotts'])
+
+def _stream_piper_speech(api_key, text, speech_format):
+    with get_session('piper').post(
+        f"{Config.PIPER_SERVER_URL}/synthesize/stream",
+        json={"text": text},
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        yield from response.iter_content(chunk_size=4096)
+
+async def stream_speech_async(model: str, api_key: str, text: str, local_model_path: str = None,
+                              speech_format: str = None, failover: bool = True):
+    """
+    Stream speech like stream_speech, without blocking the event loop.
+
+    Providers with an async streamer (OpenAI, MeloTTS and Piper) stream
+    through async HTTP clients; the others' synchronous streams are read on
+    worker threads.
+
+    Yields:
+    bytes: Chunks of audio in speech_format, which defaults to get_speech_format(model).
+    """
+    speech_format = speech_format or get_speech_format(model)
+    get_provider('tts', model)
+    stream = AsyncFailoverStream(
+        'tts', model, api_key,
+        lambda provider, provider_api_key: _stream_provider_speech_async(provider, provider_api_key, text,
+                                                                         local_model_path, speech_format),
+        failover, speech_format)
+    if not Config.TTS_CACHE:
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+        return
+
+    cache = get_tts_cache()
+    audio = await asyncio.to_thread(cache.get, cache_key(model, get_tts_voice(model), speech_format, text))
+    if audio is not None:
+        yield audio
+        return
+    chunks = []
+    try:
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        await stream.aclose()
+    await asyncio.to_thread(cache.put, cache_key(stream.provider, get_tts_voice(stream.provider), speech_format, text),
+                            b"".join(chunks))
+
+async def _stream_provider_speech_async(provider, api_key, text, local_model_path, speech_format):
+    streamer = _ASYNC_SPEECH_STREAMERS.get(provider)
+    if streamer is None:
+        async for chunk in iterate_in_thread(_stream_provider_speech(provider, api_key, text, local_model_path,
+                                                                     speech_format)):
+            yield chunk
+        return
+    source_format = source_speech_format(provider, speech_format) or speech_format
+    converter = PcmConverter(pcm_sample_rate(speech_format)) if source_format != speech_format else None
+    async for chunk in streamer(api_key, text, source_format):
+        chunk = converter.feed(chunk) if converter else chunk
+        if chunk:
+            yield chunk
+    if converter:
+        chunk = converter.flush()
+        if chunk:
+            yield chunk
+
+async def _stream_openai_speech_async(api_key, text, speech_format):
+    client = get_async_client('openai', api_key)
+    async with client.audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice=Config.TTS_VOICES['openai'],
+        input=text,
+        response_format=_openai_response_format(speech_format)
+    ) as speech_response:
+        async for chunk in speech_response.iter_bytes():
+            yield chunk
+
+def _local_server_request(model, text, stream):
+    # MeloTTS and Piper serve WAV over plain HTTP; returns the URL and JSON payload of a request
+    if model == 'melotts':
+        path = "generate-audio-stream/" if stream else "generate-audio-bytes/"
+        return (f"http://localhost:{Config.TTS_PORT_LOCAL}/{path}",
+                {"text": text, "language": "EN", "accent": Config.TTS_VOICES['melotts'], "speed": 1.0})
+    path = "synthesize/stream" if stream else "synthesize/"
+    return f"{Config.PIPER_SERVER_URL}/{path}", {"text": text}
+
+def _local_server_streamer_async(model):
+    async def stream(api_key, text, speech_format):
+        url, payload = _local_server_request(model, text, stream=True)
+        async with get_async_session(model).stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+    return stream
+
+async def synthesize_speech_async(model: str, api_key: str, text: str, local_model_path: str = None,
+                                  speech_format: str = None) -> bytes:
+    """
+    Convert text to speech like synthesize_speech, without blocking the event loop.
+
+    Returns:
+    bytes: The generated speech audio in speech_format.
+    """
+    speech_format = speech_format or negotiate_speech_format(model, CONTAINER_FORMATS)
+    if model not in _ASYNC_SPEECH_SYNTHESIZERS:
+        return await asyncio.to_thread(synthesize_speech, model, api_key, text, local_model_path, speech_format)
+    if not Config.TTS_CACHE:
+        _, audio = await _synthesize_speech_uncached_async(model, api_key, text, local_model_path, speech_format)
+        return audio
+
+    cache = get_tts_cache()
+    audio = await asyncio.to_thread(cache.get, cache_key(model, get_tts_voice(model), speech_format, text))
+    if audio is None:
+        provider, audio = await _synthesize_speech_uncached_async(model, api_key, text, local_model_path,
+                                                                  speech_format)
+        await asyncio.to_thread(cache.put, cache_key(provider, get_tts_voice(provider), speech_format, text), audio)
+    return audio
+
+async def _synthesize_speech_uncached_async(model, api_key, text, local_model_path, speech_format):
+    async def attempt(provider, provider_api_key):
+        synthesizer = _ASYNC_SPEECH_SYNTHESIZERS.get(provider)
+        source_format = source_speech_format(provider, speech_format) or speech_format
+        if synthesizer is None:
+            audio = await asyncio.to_thread(_synthesize_provider_speech, provider, provider_api_key, text,
+                                            local_model_path, source_format)
+        else:
+            audio = await synthesizer(provider_api_key, text, source_format)
+        return _convert_audio(audio, source_format, speech_format)
+
+    return await call_with_failover_async('tts', model, api_key, attempt, speech_format=speech_format)
+
+async def _synthesize_openai_speech_async(api_key, text, speech_format):
+    speech_response = await get_async_client('openai', api_key).audio.speech.create(
+        model="tts-1",
+        voice=Config.TTS_VOICES['openai'],
+        input=text,
+        response_format=_openai_response_format(speech_format)
+    )
+    return speech_response.content
+
+def _local_server_synthesizer_async(model):
+    async def synthesize(api_key, text, speech_format):
+        url, payload = _local_server_request(model, text, stream=False)
+        response = await get_async_session(model).post(url, json=payload)
+        response.raise_for_status()
+        return response.content
+    return synthesize
+
+def synthesize_speech(model: str, api_key: str, text: str, local_model_path: str = None,
+                      speech_format: str = None) -> bytes:
+    """
+    Convert text to speech using the specified model and return the encoded audio in memory.
+
+    Args:
+    model (str): A TTS provider registered in voice_assistant.providers.
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    local_model_path (str): The path to the local model (if applicable).
+    speech_format (str): The format to request, from negotiate_speech_format; defaults to the
+        cheapest self-describing format (WAV or MP3), since the caller may play or save it as is.
+
+    Returns:
+    bytes: The generated speech audio in speech_format.
+
+    Raises:
+    ProviderUnavailableError: If no TTS provider could produce audio, after retries and failover.
+    """
+    speech_format = speech_format or negotiate_speech_format(model, CONTAINER_FORMATS)
+    get_provider('tts', model)
+    if Config.TTS_CACHE:
+        return cached_synthesize_speech(functools.partial(_synthesize_speech_uncached, speech_format=speech_format),
+                                        model, api_key, text, speech_format, local_model_path)
+    _, audio = _synthesize_speech_uncached(model, api_key, text, local_model_path, speech_format)
+    return audio
+
+def _synthesize_speech_uncached(model, api_key, text, local_model_path, speech_format):
+    # Returns the provider that answered with the audio, which a failover provider converts to speech_format
+    def attempt(provider, provider_api_key):
+        source_format = source_speech_format(provider, speech_format) or speech_format
+        audio = _synthesize_provider_speech(provider, provider_api_key, text, local_model_path, source_format)
+        return _convert_audio(audio, source_format, speech_format)
+
+    return call_with_failover('tts', model, api_key, attempt, speech_format=speech_format)
+
+def _synthesize_provider_speech(provider, api_key, text, local_model_path, speech_format):
+    audio = _SPEECH_SYNTHESIZERS[provider](api_key, text, speech_format)
+
+    filtered_text = text.replace('\n', ' ').replace('\r', ' ')
+    logging.info(f"Text to speech conversion completed for model '{provider}' with text: '{filtered_text}'")
+    return audio
+
+def _convert_audio(audio, source_format, speech_format):
+    if source_format == speech_format:
+        return audio
+    converter = PcmConverter(pcm_sample_rate(speech_format))
+    return converter.feed(audio) + converter.flush()
+
+def _synthesize_openai_speech(api_key, text, speech_format):
+    client = get_client('openai', api_key)
+    speech_response = client.audio.speech.create(
+        model="tts-1",
+        voice=Config.TTS_VOICES['openai'],
+        input=text,
+        response_format=_openai_response_format(speech_format)
+    )
+    return speech_response.content
+
+def _synthesize_deepgram_speech(api_key, text, speech_format):
+    client = get_client('deepgram', api_key)
+    options = _deepgram_options(speech_format)
+    SPEAK_OPTIONS = {"text": text}
+    response = client.speak.v("1").stream(SPEAK_OPTIONS, options, transport=get_transport('deepgram'))
+    return response.stream.getvalue()
+
+def _synthesize_elevenlabs_speech(api_key, text, speech_format):
+    client = get_client('elevenlabs', api_key)
+    audio_stream = client.generate(
+        text=text,
+        voice=Config.TTS_VOICES['elevenlabs'],
+        output_format=_elevenlabs_output_format(speech_format),
+        model="eleven_turbo_v2"
+    )
+    return b"".join(audio_stream)
+
+def _synthesize_cartesia_speech(api_key, text, speech_format):
+    return b"".join(_stream_cartesia_speech(api_key, text, speech_format))
+
+def _synthesize_melotts_speech(api_key, text, speech_format):
+    return generate_audio_bytes_melotts(text=text, accent=Config.TTS_VOICES['melotts'])
+
+def _synthesize_piper_speech(api_key, text, speech_format):
+    response = get_session('piper').post(
+        f"{Config.PIPER_SERVER_URL}/synthesize/",
+        json={"text": text},
+        headers={"Content-Type": "application/json"}
+    )
+    if response.status_code != 200:
+        raise Exception(f"Piper TTS API error: {response.status_code} - {response.text}")
+    return response.content
+
+def _synthesize_local_speech(api_key, text, speech_format):
+    return b"Local TTS audio data"
+
+# TTS handlers of the providers registered in voice_assistant.providers
+_SPEECH_SYNTHESIZERS = {
+    'openai': _synthesize_openai_speech,
+    'deepgram': _synthesize_deepgram_speech,
+    'elevenlabs': _synthesize_elevenlabs_speech,
+    'cartesia': _synthesize_cartesia_speech,
+    'melotts': _synthesize_melotts_speech,
+    'piper': _synthesize_piper_speech,
+    'local': _synthesize_local_speech,
+}
+
+# Streaming handlers of the providers with streaming_output
+_SPEECH_STREAMERS = {
+    'openai': _stream_openai_speech,
+    'elevenlabs': _stream_elevenlabs_speech,
+    'cartesia': _stream_cartesia_speech,
+    'melotts': _stream_melotts_speech,
+    'piper': _stream_piper_speech,
+}
+
+# Providers with native async handlers; the rest run on worker threads
+_ASYNC_SPEECH_STREAMERS = {
+    'openai': _stream_openai_speech_async,
+    'melotts': _local_server_streamer_async('melotts'),
+    'piper': _local_server_streamer_async('piper'),
+}
+
+_ASYNC_SPEECH_SYNTHESIZERS = {
+    'openai': _synthesize_openai_speech_async,
+    'melotts': _local_server_synthesizer_async('melotts'),
+    'piper': _local_server_synthesizer_async('piper'),
+}
@@ -0,0 +1,229 @@
+# voice_assistant/tracing.py
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+from voice_assistant.config import Config
+from voice_assistant.resilience import prometheus_lines as breaker_prometheus_lines
+
+# Stage name -> (start mark, end mark, Config attribute naming the stage's provider)
+STAGES = {
+    "record": ("record_start", "record_end", None),
+    "stt": ("stt_start", "stt_end", "TRANSCRIPTION_MODEL"),
+    "llm_ttft": ("llm_start", "llm_first_token", "RESPONSE_MODEL"),
+    "llm": ("llm_start", "llm_end", "RESPONSE_MODEL"),
+    "tts_ttfb": ("tts_start", "tts_first_chunk", "TTS_MODEL"),
+    "tts": ("tts_start", "tts_end", "TTS_MODEL"),
+    "playback": ("playback_start", "playback_end", None),
+    "time_to_first_audio": ("record_end", "playback_start", None),
+    "turn": ("record_end", "playback_end", None),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class TurnTrace:
+    """
+    Monotonic timestamps for the stage boundaries of one conversational turn.
+
+    Marks ending in '_end' keep the latest timestamp; all others keep the first,
+    so e.g. 'tts_start' is the start of the first sentence's synthesis and
+    'tts_end' the end of the last one.
+
+    Attributes:
+        turn_id (int): Sequence number of the turn.
+        providers (dict): Provider chosen in Config for each stage's Config attribute.
+        marks (dict): Mark name mapped to its time.monotonic() timestamp.
+        cpu_seconds (dict): CPU time spent in this process on work such as audio decoding, by kind.
+    """
+
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.wall_time = time.time()
+        self.providers = {
+            attribute: getattr(Config, attribute)
+            for attribute in ("TRANSCRIPTION_MODEL", "RESPONSE_MODEL", "TTS_MODEL")
+        }
+        self.marks = {}
+        self.cpu_seconds = defaultdict(float)
+
+    def mark(self, name, timestamp=None):
+        """
+        Record a stage boundary.
+
+        Args:
+        name (str): The mark name, e.g. 'stt_start'.
+        timestamp (float): A time.monotonic() value; defaults to now.
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if name.endswith("_end"):
+            self.marks[name] = timestamp
+        else:
+            self.marks.setdefault(name, timestamp)
+
+    def add_cpu_time(self, kind, seconds):
+        """
+        Add CPU time spent on this turn's behalf, e.g. kind 'audio_decode'.
+        """
+        self.cpu_seconds[kind] += seconds
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Mark '<stage>_start' and '<stage>_end' around a block.
+        """
+        self.mark(f"{stage}_start")
+        try:
+            yield
+        finally:
+            self.mark(f"{stage}_end")
+
+    def durations(self):
+        """
+        Return the duration in seconds of every stage whose boundaries were both marked.
+        """
+        durations = {}
+        for stage, (start, end, _) in STAGES.items():
+            if start in self.marks and end in self.marks:
+                durations[stage] = self.marks[end] - self.marks[start]
+        return durations
+
+    def provider(self, stage):
+        attribute = STAGES[stage][2]
+        return self.providers.get(attribute, "") if attribute else ""
+
+
+def percentile(sorted_values, quantile):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(quantile * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Tracer:
+    """
+    Collects finished turn traces into rolling per-stage latency windows and exports them.
+
+    Each finished turn is appended to a JSONL file, and the Prometheus text
+    file is rewritten with p50/p95/p99 summaries per (stage, provider).
+
+    Attributes:
+        window (int): Number of recent samples kept per (stage, provider).
+    """
+
+    def __init__(self, window=None, jsonl_path=None, prometheus_path=None):
+        self.window = window or Config.TRACE_WINDOW
+        self.jsonl_path = Config.TRACE_JSONL_PATH if jsonl_path is None else jsonl_path
+        self.prometheus_path = Config.TRACE_PROMETHEUS_PATH if prometheus_path is None else prometheus_path
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._next_turn_id = 0
+        self._lock = threading.Lock()
+
+    def start_turn(self):
+        """
+        Begin tracing a new turn.
+
+        Returns:
+        TurnTrace: The trace to mark stage boundaries on.
+        """
+        with self._lock:
+            self._next_turn_id += 1
+            return TurnTrace(self._next_turn_id)
+
+    def finish_turn(self, trace):
+        """
+        Record a finished turn's stage durations and export the updated statistics.
+
+        Args:
+        trace (TurnTrace): The finished trace.
+        """
+        durations = trace.durations()
+        with self._lock:
+            for stage, seconds in durations.items():
+                key = (stage, trace.provider(stage))
+                self._samples[key].append(seconds)
+                self._counts[key] += 1
+                self._sums[key] += seconds
+        try:
+            self._export(trace, durations)
+        except OSError as e:
+            logging.warning(f"Failed to export turn trace: {e}")
+        summary = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in durations.items())
+        if trace.cpu_seconds:
+            summary += "; CPU: " + ", ".join(f"{kind}={seconds * 1000:.1f}ms" for kind, seconds in trace.cpu_seconds.items())
+        logging.info(f"Turn {trace.turn_id} latency: {summary}")
+
+    def percentiles(self, stage, provider=""):
+        """
+        Return rolling p50/p95/p99 latencies for a stage.
+
+        Args:
+        stage (str): The stage name from STAGES.
+        provider (str): The provider the samples were tagged with.
+
+        Returns:
+        dict: Quantile mapped to seconds; empty if there are no samples.
+        """
+        with self._lock:
+            values = sorted(self._samples.get((stage, provider), ()))
+        if not values:
+            return {}
+        return {quantile: percentile(values, quantile) for quantile in QUANTILES}
+
+    def _export(self, trace, durations):
+        if self.jsonl_path:
+            record = {
+                "turn_id": trace.turn_id,
+                "time": trace.wall_time,
+                "providers": trace.providers,
+                "durations": durations,
+                "cpu_seconds": trace.cpu_seconds,
+                "marks": {name: timestamp - min(trace.marks.values()) for name, timestamp in trace.marks.items()},
+            }
+            with open(self.jsonl_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        if self.prometheus_path:
+            temp_path = f"{self.prometheus_path}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, self.prometheus_path)
+
+    def prometheus_text(self):
+        """
+        Render the rolling statistics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP voice_stage_latency_seconds Latency of voice assistant turn stages over a rolling window.",
+            "# TYPE voice_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            keys = sorted(self._samples)
+            snapshot = {key: (sorted(self._samples[key]), self._counts[key], self._sums[key]) for key in keys}
+        for (stage, provider), (values, count, total) in snapshot.items():
+            labels = f'stage="{stage}",provider="{provider}"'
+            for quantile in QUANTILES:
+                lines.append(f'voice_stage_latency_seconds{{{labels},quantile="{quantile}"}} {percentile(values, quantile):.6f}')
+            lines.append(f"voice_stage_latency_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"voice_stage_latency_seconds_count{{{labels}}} {count}")
+        if Config.RESILIENCE:
+            lines += breaker_prometheus_lines()
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_tracer():
+    """
+    Return the process-wide tracer.
+    """
+    return Tracer()
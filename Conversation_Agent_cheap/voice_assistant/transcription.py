@@ -1,16 +1,21 @@
 # voice_assistant/transcription.py
 
+import asyncio
+import io
 import json
 import logging
-import requests
+import os
 import time
 
 from colorama import Fore, init
-from openai import OpenAI
-from groq import Groq
-from deepgram import DeepgramClient,PrerecordedOptions,FileSource
 
-fast_url = "http://localhost:8000"
+from voice_assistant.clients import get_async_client, get_async_session, get_client, get_session, get_transport
+from voice_assistant.config import Config
+from voice_assistant.local_stt import get_local_transcriber
+from voice_assistant.providers import get_provider
+from voice_assistant.resilience import ProviderUnavailableError, call_with_failover, call_with_failover_async
+
+fast_url = Config.FASTWHISPERAPI_URL
 checked_fastwhisperapi = False
 
 def check_fastwhisperapi():
@@ -19,75 +24,150 @@ def check_fastwhisperapi():
     if not checked_fastwhisperapi:
         infopoint = f"{fast_url}/info"
         try:
-            response = requests.get(infopoint)
+            response = get_session('fastwhisperapi').get(infopoint)
+            if response.status_code != 200:
+                raise Exception("FastWhisperAPI is not running")
+        except Exception:
+            raise Exception("FastWhisperAPI is not running")
+        checked_fastwhisperapi = True
+
+async def check_fastwhisperapi_async():
+    """Check if the FastWhisper API is running, without blocking the event loop."""
+    global checked_fastwhisperapi
+    if not checked_fastwhisperapi:
+        try:
+            response = await get_async_session('fastwhisperapi').get(f"{fast_url}/info")
             if response.status_code != 200:
                 raise Exception("FastWhisperAPI is not running")
         except Exception:
             raise Exception("FastWhisperAPI is not running")
         checked_fastwhisperapi = True
 
-def transcribe_audio(model, api_key, audio_file_path, local_model_path=None):
+def _read_audio(audio):
+    """
+    Normalize a path or an in-memory buffer into a (filename, bytes) pair.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return "input.wav", bytes(audio)
+    if isinstance(audio, io.BytesIO):
+        return getattr(audio, "name", "input.wav"), audio.getvalue()
+    with open(audio, "rb") as audio_file:
+        return os.path.basename(audio), audio_file.read()
+
+def transcribe_audio(model, api_key, audio_file_path, local_model_path=None, failover=True):
     """
     Transcribe an audio file using the specified model.
-    
+
+    Failed requests are retried, and fail over to the local backends in
+    Config.FAILOVER_PROVIDERS (see voice_assistant/resilience.py).
+
+    Args:
+        model (str): A transcription provider registered in voice_assistant.providers ('openai', 'groq',
+            'deepgram', 'fastwhisperapi', 'local').
+        api_key (str): The API key for the transcription service.
+        audio_file_path (str | bytes | BytesIO): The path to the audio file to transcribe, or the audio itself.
+        local_model_path (str): The path to the local model (if applicable).
+        failover (bool): Whether to fall back to other providers; hedged requests pass False.
+
+    Returns:
+        str: The transcribed text.
+
+    Raises:
+        ProviderUnavailableError: If no provider could transcribe the audio.
+    """
+    try:
+        get_provider('transcription', model)
+        _, text = call_with_failover(
+            'transcription', model, api_key,
+            lambda provider, provider_api_key: _TRANSCRIBERS[provider](provider_api_key, audio_file_path),
+            failover)
+        return text
+    except ProviderUnavailableError as e:
+        logging.error(f"{Fore.RED}Failed to transcribe audio: {e}{Fore.RESET}")
+        raise
+    except Exception as e:
+        logging.error(f"{Fore.RED}Failed to transcribe audio: {e}{Fore.RESET}")
+        raise Exception("Error in transcribing audio")
+
+async def transcribe_audio_async(model, api_key, audio_file_path, local_model_path=None, failover=True):
+    """
+    Transcribe audio like transcribe_audio, without blocking the event loop.
+
+    Providers with an async transcriber (OpenAI, Groq and FastWhisperAPI) use
+    async HTTP clients; the others run on a worker thread.
+
     Args:
-        model (str): The model to use for transcription ('openai', 'groq', 'deepgram', 'fastwhisper', 'local').
+        model (str): A transcription provider registered in voice_assistant.providers.
         api_key (str): The API key for the transcription service.
-        audio_file_path (str): The path to the audio file to transcribe.
+        audio_file_path (str | bytes | BytesIO): The path to the audio file to transcribe, or the audio itself.
         local_model_path (str): The path to the local model (if applicable).
+        failover (bool): Whether to fall back to other providers.
 
     Returns:
         str: The transcribed text.
     """
+    async def attempt(provider, provider_api_key):
+        transcriber = _ASYNC_TRANSCRIBERS.get(provider)
+        if transcriber is None:
+            return await asyncio.to_thread(_TRANSCRIBERS[provider], provider_api_key, audio_file_path)
+        upload = await asyncio.to_thread(_read_audio, audio_file_path)
+        return await transcriber(provider_api_key, upload)
+
     try:
-        if model == 'openai':
-            return _transcribe_with_openai(api_key, audio_file_path)
-        elif model == 'groq':
-            return _transcribe_with_groq(api_key, audio_file_path)
-        elif model == 'deepgram':
-            return _transcribe_with_deepgram(api_key, audio_file_path)
-        elif model == 'fastwhisperapi':
-            return _transcribe_with_fastwhisperapi(audio_file_path)
-        elif model == 'local':
-            # Placeholder for local STT model transcription
-            return "Transcribed text from local model"
-        else:
-            raise ValueError("Unsupported transcription model")
+        get_provider('transcription', model)
+        _, text = await call_with_failover_async('transcription', model, api_key, attempt, failover)
+        return text
+    except ProviderUnavailableError as e:
+        logging.error(f"{Fore.RED}Failed to transcribe audio: {e}{Fore.RESET}")
+        raise
     except Exception as e:
         logging.error(f"{Fore.RED}Failed to transcribe audio: {e}{Fore.RESET}")
         raise Exception("Error in transcribing audio")
 
-def _transcribe_with_openai(api_key, audio_file_path):
-    client = OpenAI(api_key=api_key)
-    with open(audio_file_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
+def _as_upload(audio):
+    # The SDKs read file-like objects directly, so in-memory buffers are uploaded without a copy
+    if isinstance(audio, io.BytesIO):
+        audio.seek(0)
+        return (getattr(audio, "name", "input.wav"), audio)
+    return _read_audio(audio)
+
+# Whisper model used by each OpenAI-compatible transcription API
+_WHISPER_MODELS = {'openai': "whisper-1", 'groq': "whisper-large-v3"}
+
+
+def _openai_compatible_transcriber(provider):
+    def transcribe(api_key, audio_file_path):
+        transcription = get_client(provider, api_key).audio.transcriptions.create(
+            model=_WHISPER_MODELS[provider],
+            file=_as_upload(audio_file_path),
             language='en'
         )
-    return transcription.text
+        return transcription.text
+    return transcribe
 
 
-def _transcribe_with_groq(api_key, audio_file_path):
-    client = Groq(api_key=api_key)
-    with open(audio_file_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-large-v3",
-            file=audio_file,
+def _async_openai_compatible_transcriber(provider):
+    async def transcribe(api_key, upload):
+        transcription = await get_async_client(provider, api_key).audio.transcriptions.create(
+            model=_WHISPER_MODELS[provider],
+            file=upload,
             language='en'
         )
-    return transcription.text
+        return transcription.text
+    return transcribe
 
 
 def _transcribe_with_deepgram(api_key, audio_file_path):
-    deepgram = DeepgramClient(api_key)
+    from deepgram import PrerecordedOptions
+
+    deepgram = get_client('deepgram', api_key)
     try:
-        with open(audio_file_path, "rb") as file:
-            buffer_data = file.read()
+        _, buffer_data = _read_audio(audio_file_path)
 
         payload = {"buffer": buffer_data}
         options = PrerecordedOptions(model="nova-2", smart_format=True)
-        response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
+        response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options,
+                                                                      transport=get_transport('deepgram'))
         data = json.loads(response.to_json())
 
         transcript = data['results']['channels'][0]['alternatives'][0]['transcript']
@@ -97,11 +177,11 @@ def _transcribe_with_deepgram(api_key, audio_file_path):
         raise
 
 
-def _transcribe_with_fastwhisperapi(audio_file_path):
+def _transcribe_with_fastwhisperapi(api_key, audio_file_path):
     check_fastwhisperapi()
     endpoint = f"{fast_url}/v1/transcriptions"
 
-    files = {'file': (audio_file_path, open(audio_file_path, 'rb'))}
+    files = {'file': _read_audio(audio_file_path)}
     data = {
         'model': "base",
         'language': "en",
@@ -110,6 +190,38 @@ def _transcribe_with_fastwhisperapi(audio_file_path):
     }
     headers = {'Authorization': 'Bearer dummy_api_key'}
 
-    response = requests.post(endpoint, files=files, data=data, headers=headers)
+    response = get_session('fastwhisperapi').post(endpoint, files=files, data=data, headers=headers)
     response_json = response.json()
-    return response_json.get('text', 'No text found in the response.')
\ No newline at end of file
+    return response_json.get('text', 'No text found in the response.')
+
+
+async def _transcribe_with_fastwhisperapi_async(api_key, upload):
+    await check_fastwhisperapi_async()
+    response = await get_async_session('fastwhisperapi').post(
+        f"{fast_url}/v1/transcriptions",
+        files={'file': upload},
+        data={'model': "base", 'language': "en", 'vad_filter': True},
+        headers={'Authorization': 'Bearer dummy_api_key'}
+    )
+    return response.json().get('text', 'No text found in the response.')
+
+
+def _transcribe_locally(api_key, audio_file_path):
+    return get_local_transcriber().transcribe(audio_file_path)
+
+
+# Transcription handlers of the providers registered in voice_assistant.providers
+_TRANSCRIBERS = {
+    'openai': _openai_compatible_transcriber('openai'),
+    'groq': _openai_compatible_transcriber('groq'),
+    'deepgram': _transcribe_with_deepgram,
+    'fastwhisperapi': _transcribe_with_fastwhisperapi,
+    'local': _transcribe_locally,
+}
+
+# Providers with a native async transcriber; the rest run on worker threads
+_ASYNC_TRANSCRIBERS = {
+    'openai': _async_openai_compatible_transcriber('openai'),
+    'groq': _async_openai_compatible_transcriber('groq'),
+    'fastwhisperapi': _transcribe_with_fastwhisperapi_async,
+}
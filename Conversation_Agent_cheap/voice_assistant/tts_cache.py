@@ -0,0 +1,190 @@
+# voice_assistant/tts_cache.py
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from voice_assistant.config import Config
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Normalize text so trivially different renderings of the same phrase share a cache entry.
+
+    Whitespace is collapsed and case is folded; punctuation is kept because it changes prosody.
+
+    Args:
+    text (str): The text to be spoken.
+
+    Returns:
+    str: The normalized text.
+    """
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def cache_key(provider, voice, audio_format, text):
+    """
+    Build the content address for a piece of synthesized speech.
+
+    Args:
+    provider (str): The TTS model name.
+    voice (str): The voice identifier.
+    audio_format (str): The output format, e.g. 'mp3' or 'wav'.
+    text (str): The text to be spoken.
+
+    Returns:
+    str: A SHA-256 hex digest.
+    """
+    material = "\x1f".join((provider, voice or "", audio_format, normalize_text(text)))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Hot entries are kept in an in-memory LRU; every entry is also written to
+    cache_dir, which is trimmed least-recently-used first (by file access
+    time) whenever it grows past max_disk_bytes.
+
+    Attributes:
+        cache_dir (str): Directory holding one file per cached entry.
+        max_disk_bytes (int): Size cap for cache_dir.
+        max_memory_entries (int): Number of entries kept in memory.
+        hits (int): Lookups served from memory or disk.
+        misses (int): Lookups that found nothing.
+    """
+
+    def __init__(self, cache_dir=None, max_disk_bytes=None, max_memory_entries=None):
+        self.cache_dir = cache_dir or Config.TTS_CACHE_DIR
+        self.max_disk_bytes = Config.TTS_CACHE_MAX_DISK_BYTES if max_disk_bytes is None else max_disk_bytes
+        self.max_memory_entries = (Config.TTS_CACHE_MAX_MEMORY_ENTRIES
+                                   if max_memory_entries is None else max_memory_entries)
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _remember(self, key, audio):
+        self._memory[key] = audio
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return cached audio for a key, or None.
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            # Refresh the access time so disk eviction sees this entry as recently used
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self._remember(key, audio)
+            self.hits += 1
+        return audio
+
+    def put(self, key, audio):
+        """
+        Store audio under a key in memory and on disk.
+        """
+        if not audio:
+            return
+        with self._lock:
+            self._remember(key, audio)
+        temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logging.warning(f"Failed to write TTS cache entry: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(audio)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.is_file() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_atime
+        )
+        self._disk_bytes = sum(entry.stat().st_size for entry in entries)
+        # Trim to 90% of the cap so eviction doesn't run on every put
+        target = self.max_disk_bytes * 0.9
+        for entry in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
+
+
+@lru_cache(maxsize=None)
+def get_tts_cache():
+    """
+    Return the process-wide TTS cache.
+    """
+    return TTSCache()
+
+
+def get_tts_voice(model):
+    """
+    Return the voice a TTS model is configured to use, for cache keying.
+    """
+    return Config.TTS_VOICES.get(model, "")
+
+
+def cached_synthesize_speech(synthesize, model, api_key, text, audio_format, local_model_path=None):
+    """
+    Return speech for text from the cache, synthesizing and storing it on a miss.
+
+    Audio is stored under the model that produced it, which can be a failover
+    model rather than the requested one (see voice_assistant/resilience.py).
+
+    Args:
+    synthesize (callable): The function producing audio on a miss, called as
+        synthesize(model, api_key, text, local_model_path); returns (the model that produced it, the audio).
+    model (str): The TTS model name.
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    audio_format (str): The format synthesize returns, part of the cache key.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Returns:
+    bytes: The speech audio.
+    """
+    cache = get_tts_cache()
+    audio = cache.get(cache_key(model, get_tts_voice(model), audio_format, text))
+    if audio is not None:
+        logging.info(f"TTS cache hit for text: '{text[:60]}'")
+        return audio
+    producer, audio = synthesize(model, api_key, text, local_model_path)
+    cache.put(cache_key(producer, get_tts_voice(producer), audio_format, text), audio)
+    return audio
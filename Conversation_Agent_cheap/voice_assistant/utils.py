@@ -1,8 +1,12 @@
 # voice_assistant/utils.py
 
+import asyncio
 import os
 import logging
 
+# Returned by next() when a blocking iterator is exhausted
+_EXHAUSTED = object()
+
 def delete_file(file_path):
     """
     Delete a file from the filesystem.
@@ -19,3 +23,34 @@ def delete_file(file_path):
         logging.error(f"Permission denied when trying to delete file: {file_path}")
     except OSError as e:
         logging.error(f"Error deleting file {file_path}: {e}")
+
+async def iterate_in_thread(iterator, executor=None):
+    """
+    Consume a blocking iterator from async code, fetching each item on a worker thread.
+
+    Lets the event loop use providers that only have a synchronous streaming
+    API without blocking on their network reads.
+
+    Args:
+    iterator (iterable): The blocking iterator, e.g. a synchronous stream_speech generator.
+    executor (Executor): The executor to run it on; defaults to the loop's default executor.
+
+    Yields:
+    object: The iterator's items, in order.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterator)
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if callable(close):
+            try:
+                await loop.run_in_executor(executor, close)
+            except ValueError:
+                # Still running on a worker thread after a cancellation; it finishes on its own
+                pass
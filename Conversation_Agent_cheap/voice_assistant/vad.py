@@ -0,0 +1,276 @@
+# voice_assistant/vad.py
+
+import collections
+import logging
+import queue
+import time
+import wave
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+
+from voice_assistant.config import Config
+
+
+class VoiceActivityDetector:
+    """
+    Frame-based voice activity detector using energy and zero-crossing rate.
+
+    The noise floor is tracked with an exponential moving average over
+    non-speech frames and persists across turns, so there is no per-turn
+    calibration step.
+
+    Attributes:
+        noise_floor_db (float): Current estimate of the background level in dB (PCM16 scale).
+        margin_db (float): How far above the noise floor a frame must be to count as speech.
+        min_speech_db (float): Absolute level below which a frame is never speech.
+        max_zcr (float): Zero-crossing rate above which quiet frames are treated as hiss.
+    """
+
+    def __init__(self, margin_db=None, min_speech_db=None, max_zcr=None, noise_adapt_rate=None):
+        self.margin_db = Config.VAD_MARGIN_DB if margin_db is None else margin_db
+        self.min_speech_db = Config.VAD_MIN_SPEECH_DB if min_speech_db is None else min_speech_db
+        self.max_zcr = Config.VAD_MAX_ZCR if max_zcr is None else max_zcr
+        self.noise_adapt_rate = Config.VAD_NOISE_ADAPT_RATE if noise_adapt_rate is None else noise_adapt_rate
+        self.noise_floor_db = None
+
+    def is_speech(self, frame):
+        """
+        Classify one frame of PCM16 mono audio, updating the noise floor on non-speech frames.
+
+        Args:
+        frame (bytes): One frame of PCM16 mono audio.
+
+        Returns:
+        bool: True if the frame contains speech.
+        """
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        if samples.size == 0:
+            return False
+        rms = np.sqrt(np.mean(samples * samples))
+        energy_db = 20 * np.log10(rms + 1e-9)
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[1:] != signs[:-1]) / samples.size
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = energy_db
+            return False
+
+        above_floor = energy_db - self.noise_floor_db
+        speech = (
+            energy_db >= self.min_speech_db
+            and above_floor >= self.margin_db
+            # Fricatives have a high ZCR too, so only reject high-ZCR frames that are also quiet
+            and (zcr <= self.max_zcr or above_floor >= 2 * self.margin_db)
+        )
+        if not speech:
+            self.noise_floor_db += self.noise_adapt_rate * (energy_db - self.noise_floor_db)
+        return speech
+
+
+class Endpointer:
+    """
+    Turn a stream of frames into utterances using a VoiceActivityDetector.
+
+    Speech starts after start_ms of consecutive speech frames and ends after
+    end_silence_ms of non-speech. Up to preroll_ms of audio before the start
+    is kept so the first syllable isn't clipped.
+    """
+
+    def __init__(self, detector, frame_ms, start_ms=None, end_silence_ms=None, preroll_ms=None,
+                 max_utterance_ms=None):
+        self.detector = detector
+        self.frame_ms = frame_ms
+        self.start_frames = max(1, (Config.VAD_START_MS if start_ms is None else start_ms) // frame_ms)
+        self.end_frames = max(1, (Config.VAD_END_SILENCE_MS if end_silence_ms is None else end_silence_ms) // frame_ms)
+        self.max_frames = (Config.VAD_MAX_UTTERANCE_MS if max_utterance_ms is None else max_utterance_ms) // frame_ms
+        preroll_frames = (Config.VAD_PREROLL_MS if preroll_ms is None else preroll_ms) // frame_ms
+        self._preroll = collections.deque(maxlen=max(preroll_frames, self.start_frames))
+        self.reset()
+
+    def reset(self):
+        """
+        Forget any partial utterance.
+        """
+        self._preroll.clear()
+        self._utterance = []
+        self._speech_run = 0
+        self._silence_run = 0
+        self.in_speech = False
+
+    def process(self, frame):
+        """
+        Feed one frame.
+
+        Args:
+        frame (bytes): One frame of PCM16 mono audio.
+
+        Returns:
+        bytes: The complete utterance's PCM once its end is detected, otherwise None.
+        """
+        speech = self.detector.is_speech(frame)
+        if not self.in_speech:
+            self._preroll.append(frame)
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= self.start_frames:
+                self.in_speech = True
+                self._utterance = list(self._preroll)
+                self._silence_run = 0
+            return None
+
+        self._utterance.append(frame)
+        self._silence_run = 0 if speech else self._silence_run + 1
+        if self._silence_run >= self.end_frames or len(self._utterance) >= self.max_frames:
+            # Drop the trailing silence; the transcriber doesn't need it
+            utterance = b"".join(self._utterance[:len(self._utterance) - self._silence_run])
+            self.reset()
+            return utterance
+        return None
+
+    @property
+    def silence_ms(self):
+        """
+        Length of the silence since the last speech frame of the current utterance.
+        """
+        return self._silence_run * self.frame_ms if self.in_speech else 0
+
+    def partial_utterance(self):
+        """
+        Return the PCM of the current utterance so far, without trailing silence.
+        """
+        return b"".join(self._utterance[:len(self._utterance) - self._silence_run])
+
+
+class MicrophoneStream:
+    """
+    Continuously open microphone delivering fixed-size PCM16 mono frames.
+
+    Attributes:
+        sample_rate (int): Capture sample rate in Hz.
+        frame_ms (int): Frame length in milliseconds.
+    """
+
+    def __init__(self, sample_rate=None, frame_ms=None):
+        self.sample_rate = sample_rate or Config.VAD_SAMPLE_RATE
+        self.frame_ms = frame_ms or Config.VAD_FRAME_MS
+        self._frames = queue.Queue()
+        # Imported here so servers without an audio device can use the rest of the module
+        import sounddevice as sd
+
+        self._stream = sd.RawInputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype="int16",
+            blocksize=self.sample_rate * self.frame_ms // 1000,
+            callback=self._callback,
+        )
+        self._stream.start()
+        logging.info(f"Microphone stream opened at {self.sample_rate} Hz")
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            logging.debug(f"Microphone status: {status}")
+        self._frames.put(bytes(indata))
+
+    def read(self, timeout=None):
+        """
+        Return the next frame, or None if none arrived within the timeout.
+        """
+        try:
+            return self._frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        """
+        Discard frames captured while nobody was listening.
+        """
+        while True:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        self._stream.stop()
+        self._stream.close()
+
+
+@lru_cache(maxsize=None)
+def get_microphone_stream():
+    """
+    Return the process-wide microphone stream, opening it on first use.
+    """
+    return MicrophoneStream()
+
+
+@lru_cache(maxsize=None)
+def get_voice_activity_detector():
+    """
+    Return the process-wide detector so the noise floor carries across turns.
+    """
+    return VoiceActivityDetector()
+
+
+def pcm_to_wav(pcm, sample_rate):
+    """
+    Wrap PCM16 mono audio in an in-memory WAV container.
+
+    Args:
+    pcm (bytes): PCM16 mono audio.
+    sample_rate (int): Sample rate in Hz.
+
+    Returns:
+    BytesIO: The WAV audio, named 'input.wav'.
+    """
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = "input.wav"
+    return buffer
+
+
+def record_utterance(timeout=10, endpointer=None, on_pause=None):
+    """
+    Wait for the user to speak and return their utterance as soon as its end is detected.
+
+    Args:
+    timeout (float): Maximum time to wait for speech to start, in seconds.
+    endpointer (Endpointer): An endpointer already inside an utterance (e.g. from barge-in
+        detection) to continue instead of starting afresh.
+    on_pause (callable): Called as on_pause(pcm, sample_rate) with the speech so far once
+        the user has paused for Config.SPECULATION_PAUSE_MS, at most once per pause.
+
+    Returns:
+    BytesIO: The utterance as an in-memory WAV, or None if no speech started before the timeout.
+    """
+    microphone = get_microphone_stream()
+    if endpointer is None or not endpointer.in_speech:
+        endpointer = Endpointer(get_voice_activity_detector(), microphone.frame_ms)
+        microphone.clear()
+    logging.info("Listening...")
+
+    deadline = time.monotonic() + timeout
+    pause_reported = False
+    while True:
+        frame = microphone.read(timeout=1.0)
+        if frame is None:
+            continue
+        utterance = endpointer.process(frame)
+        if utterance is not None:
+            logging.info("End of speech detected")
+            return pcm_to_wav(utterance, microphone.sample_rate)
+        if on_pause is not None:
+            if endpointer.silence_ms == 0:
+                pause_reported = False
+            elif endpointer.silence_ms >= Config.SPECULATION_PAUSE_MS and not pause_reported:
+                pause_reported = True
+                on_pause(endpointer.partial_utterance(), microphone.sample_rate)
+        if not endpointer.in_speech and time.monotonic() > deadline:
+            logging.warning("No speech detected before the timeout")
+            return None